@@ -3,9 +3,11 @@ package main
 import (
 	"bytes"
 	"context"
+	crand "crypto/rand"
 	"database/sql"
 	"encoding/base64"
 	"encoding/binary"
+	"encoding/hex"
 	"encoding/json"
 	"fmt"
 	"log"
@@ -16,7 +18,9 @@ import (
 	"os/signal"
 	"path/filepath"
 	"reflect"
+	"strconv"
 	"strings"
+	"sync"
 	"syscall"
 	"time"
 
@@ -38,6 +42,33 @@ import (
 var currentQRString string // Will store base64 PNG of QR code
 var isWhatsappConnected bool
 
+// History sync settings: messages written per transaction, and whether to
+// log every synced message (very noisy on a first sync)
+var historySyncBatchSize = envInt("HISTORY_SYNC_BATCH_SIZE", 500)
+var historySyncDebug = os.Getenv("HISTORY_SYNC_DEBUG") == "1"
+
+// How long a messages.db write waits for the write lock before failing
+var messagesDBBusyTimeoutMs = envInt("MESSAGES_DB_BUSY_TIMEOUT_MS", 5000)
+
+// Write-lock waits longer than this are logged
+const slowLockWait = 100 * time.Millisecond
+
+// String setting from the environment, or def when unset
+func envString(name, def string) string {
+	if v := os.Getenv(name); v != "" {
+		return v
+	}
+	return def
+}
+
+// Positive integer setting from the environment, or def when unset or invalid
+func envInt(name string, def int) int {
+	if v, err := strconv.Atoi(os.Getenv(name)); err == nil && v > 0 {
+		return v
+	}
+	return def
+}
+
 // Message represents a chat message for our client
 type Message struct {
 	Time      time.Time
@@ -50,7 +81,46 @@ type Message struct {
 
 // Database handler for storing message history
 type MessageStore struct {
-	db *sql.DB
+	db            *sql.DB
+	lockWaits     lockWaitStats
+	checkpointing sync.Mutex
+}
+
+// lockWaitStats records how long write transactions waited for the
+// messages.db write lock, i.e. behind another writer or a checkpoint
+type lockWaitStats struct {
+	mu    sync.Mutex
+	count int64
+	total time.Duration
+	max   time.Duration
+	slow  int64
+}
+
+func (s *lockWaitStats) observe(wait time.Duration) {
+	s.mu.Lock()
+	s.count++
+	s.total += wait
+	if wait > s.max {
+		s.max = wait
+	}
+	if wait >= slowLockWait {
+		s.slow++
+	}
+	s.mu.Unlock()
+	if wait >= slowLockWait {
+		fmt.Printf("Waited %s for the messages.db write lock\n", wait.Round(time.Millisecond))
+	}
+}
+
+func (s *lockWaitStats) snapshot() map[string]interface{} {
+	s.mu.Lock()
+	defer s.mu.Unlock()
+	return map[string]interface{}{
+		"write_transactions":        s.count,
+		"write_lock_wait_ms_total":  float64(s.total.Microseconds()) / 1000,
+		"write_lock_wait_ms_max":    float64(s.max.Microseconds()) / 1000,
+		"write_lock_waits_over_100": s.slow,
+	}
 }
 
 // Initialize message store
@@ -60,8 +130,16 @@ func NewMessageStore() (*MessageStore, error) {
 		return nil, fmt.Errorf("failed to create store directory: %v", err)
 	}
 
-	// Open SQLite database for messages
-	db, err := sql.Open("sqlite3", "file:store/messages.db?_foreign_keys=on")
+	// Open SQLite database for messages. WAL lets the Python readers run
+	// alongside the bridge's writes; synchronous=NORMAL is durable across
+	// crashes of the bridge (not of the OS) and avoids an fsync per commit.
+	// Transactions start with BEGIN IMMEDIATE, so a writer waits for the
+	// lock up front (and that wait can be timed) instead of failing when
+	// it tries to upgrade a read lock.
+	db, err := sql.Open("sqlite3", fmt.Sprintf(
+		"file:store/messages.db?_foreign_keys=on&_journal_mode=WAL&_synchronous=NORMAL&_busy_timeout=%d&_txlock=immediate",
+		messagesDBBusyTimeoutMs,
+	))
 	if err != nil {
 		return nil, fmt.Errorf("failed to open message database: %v", err)
 	}
@@ -97,21 +175,887 @@ func NewMessageStore() (*MessageStore, error) {
 		return nil, fmt.Errorf("failed to create tables: %v", err)
 	}
 
+	if err := migrateSchema(db); err != nil {
+		db.Close()
+		return nil, err
+	}
+
 	return &MessageStore{db: db}, nil
 }
 
+// Schema migrations, applied in order on startup. PRAGMA user_version
+// records how many have run, so each runs once per database. Append new
+// migrations at the end; never edit or reorder existing ones. Keep
+// bench/generate_messages_db.py in sync.
+var schemaMigrations = []string{
+	// 1: chat_summary holds each chat's last message and counters so chat
+	// listings don't join messages. Every chat has a row, and triggers keep
+	// it current; unread_count is the number of incoming messages since our
+	// last outgoing one, as read receipts aren't stored.
+	`
+	CREATE TABLE chat_summary (
+		chat_jid TEXT PRIMARY KEY,
+		last_message_id TEXT,
+		last_message_time TIMESTAMP,
+		last_sender TEXT,
+		last_content TEXT,
+		last_is_from_me BOOLEAN,
+		last_media_type TEXT,
+		last_from_me_time TIMESTAMP,
+		message_count INTEGER NOT NULL DEFAULT 0,
+		unread_count INTEGER NOT NULL DEFAULT 0
+	);
+	CREATE INDEX idx_chat_summary_last_message_time ON chat_summary(last_message_time);
+	CREATE INDEX idx_messages_chat_timestamp ON messages(chat_jid, timestamp);
+	CREATE INDEX idx_chats_name ON chats(name);
+
+	INSERT INTO chat_summary (chat_jid, message_count, last_from_me_time)
+	SELECT chat_jid, COUNT(*), MAX(CASE WHEN is_from_me THEN timestamp END)
+	FROM messages GROUP BY chat_jid;
+
+	INSERT INTO chat_summary (chat_jid) SELECT jid FROM chats WHERE true
+	ON CONFLICT(chat_jid) DO NOTHING;
+
+	UPDATE chat_summary SET
+		(last_message_id, last_message_time, last_sender, last_content, last_is_from_me, last_media_type) = (
+			SELECT id, timestamp, sender, content, is_from_me, media_type FROM messages m
+			WHERE m.chat_jid = chat_summary.chat_jid
+			ORDER BY timestamp DESC, rowid DESC LIMIT 1
+		),
+		unread_count = (
+			SELECT COUNT(*) FROM messages m
+			WHERE m.chat_jid = chat_summary.chat_jid AND NOT m.is_from_me
+			AND m.timestamp > COALESCE(chat_summary.last_from_me_time, '')
+		);
+
+	CREATE TRIGGER chat_summary_after_chat_insert AFTER INSERT ON chats BEGIN
+		INSERT INTO chat_summary (chat_jid) VALUES (NEW.jid)
+		ON CONFLICT(chat_jid) DO NOTHING;
+	END;
+
+	CREATE TRIGGER chat_summary_after_insert AFTER INSERT ON messages BEGIN
+		INSERT INTO chat_summary (chat_jid) VALUES (NEW.chat_jid)
+		ON CONFLICT(chat_jid) DO NOTHING;
+
+		UPDATE chat_summary SET
+			message_count = message_count + 1,
+			last_message_id = CASE WHEN last_message_time IS NULL OR NEW.timestamp >= last_message_time THEN NEW.id ELSE last_message_id END,
+			last_sender = CASE WHEN last_message_time IS NULL OR NEW.timestamp >= last_message_time THEN NEW.sender ELSE last_sender END,
+			last_content = CASE WHEN last_message_time IS NULL OR NEW.timestamp >= last_message_time THEN NEW.content ELSE last_content END,
+			last_is_from_me = CASE WHEN last_message_time IS NULL OR NEW.timestamp >= last_message_time THEN NEW.is_from_me ELSE last_is_from_me END,
+			last_media_type = CASE WHEN last_message_time IS NULL OR NEW.timestamp >= last_message_time THEN NEW.media_type ELSE last_media_type END,
+			last_message_time = CASE WHEN last_message_time IS NULL OR NEW.timestamp >= last_message_time THEN NEW.timestamp ELSE last_message_time END
+		WHERE chat_jid = NEW.chat_jid;
+
+		UPDATE chat_summary SET unread_count = unread_count + 1
+		WHERE chat_jid = NEW.chat_jid AND NOT NEW.is_from_me
+		AND NEW.timestamp > COALESCE(last_from_me_time, '');
+
+		-- An outgoing message marks everything before it as read
+		UPDATE chat_summary SET
+			last_from_me_time = NEW.timestamp,
+			unread_count = (
+				SELECT COUNT(*) FROM messages m
+				WHERE m.chat_jid = NEW.chat_jid AND NOT m.is_from_me AND m.timestamp > NEW.timestamp
+			)
+		WHERE chat_jid = NEW.chat_jid AND NEW.is_from_me
+		AND NEW.timestamp > COALESCE(last_from_me_time, '');
+	END;
+
+	CREATE TRIGGER chat_summary_after_update AFTER UPDATE OF content, sender, media_type ON messages BEGIN
+		UPDATE chat_summary SET
+			last_content = NEW.content,
+			last_sender = NEW.sender,
+			last_media_type = NEW.media_type
+		WHERE chat_jid = NEW.chat_jid AND last_message_id = NEW.id;
+	END;
+
+	CREATE TRIGGER chat_summary_after_delete AFTER DELETE ON messages BEGIN
+		UPDATE chat_summary SET
+			message_count = message_count - 1,
+			unread_count = unread_count - (NOT OLD.is_from_me AND OLD.timestamp > COALESCE(last_from_me_time, ''))
+		WHERE chat_jid = OLD.chat_jid;
+
+		UPDATE chat_summary SET
+			(last_message_id, last_message_time, last_sender, last_content, last_is_from_me, last_media_type) = (
+				SELECT id, timestamp, sender, content, is_from_me, media_type FROM messages m
+				WHERE m.chat_jid = OLD.chat_jid
+				ORDER BY timestamp DESC, rowid DESC LIMIT 1
+			)
+		WHERE chat_jid = OLD.chat_jid AND last_message_id = OLD.id;
+
+		UPDATE chat_summary SET
+			(last_from_me_time, unread_count) = (
+				SELECT t, (
+					SELECT COUNT(*) FROM messages m
+					WHERE m.chat_jid = OLD.chat_jid AND NOT m.is_from_me AND m.timestamp > COALESCE(t, '')
+				)
+				FROM (SELECT MAX(timestamp) AS t FROM messages WHERE chat_jid = OLD.chat_jid AND is_from_me)
+			)
+		WHERE chat_jid = OLD.chat_jid AND OLD.is_from_me AND OLD.timestamp = last_from_me_time;
+	END;
+	`,
+
+	// 2: chats.phone is the E.164 number of a direct chat (digits only,
+	// no '+'), NULL for groups, so phone lookups are exact index matches
+	// instead of LIKE scans over jid.
+	`
+	ALTER TABLE chats ADD COLUMN phone TEXT;
+	UPDATE chats SET phone = substr(jid, 1, instr(jid, '@') - 1)
+	WHERE jid LIKE '%@s.whatsapp.net';
+	CREATE INDEX idx_chats_phone ON chats(phone);
+	`,
+
+	// 3: retention. Old messages move to an archive database (see
+	// archiveOldMessages); retention_state.archived_through is the newest
+	// timestamp archived so far, so readers know when a date range needs
+	// the archive. The timestamp index finds the oldest messages.
+	`
+	CREATE TABLE retention_state (
+		id INTEGER PRIMARY KEY CHECK (id = 1),
+		archived_through TIMESTAMP
+	);
+	INSERT INTO retention_state (id) VALUES (1);
+	CREATE INDEX idx_messages_timestamp ON messages(timestamp);
+	`,
+
+	// 4: messages.ts is the timestamp in Unix seconds, written alongside
+	// the text column. Range filters and sorting use it instead of
+	// comparing go-sqlite3's text timestamps, whose UTC offsets make
+	// string order differ from time order. idx_messages_ts replaces the
+	// text index used by the archiver.
+	`
+	ALTER TABLE messages ADD COLUMN ts INTEGER;
+	UPDATE messages SET ts = unixepoch(timestamp);
+	CREATE INDEX idx_messages_chat_ts ON messages(chat_jid, ts);
+	CREATE INDEX idx_messages_ts ON messages(ts);
+	DROP INDEX idx_messages_timestamp;
+
+	ALTER TABLE retention_state ADD COLUMN archived_through_ts INTEGER;
+	UPDATE retention_state SET archived_through_ts = unixepoch(archived_through);
+	`,
+
+	// 5: chat_participants maps a contact to every chat they took part in:
+	// chats where they sent a message, plus their direct chat. Senders
+	// are stored as bare users or full JIDs depending on the path that
+	// wrote them, so both are keyed by JID. A trigger keeps it current;
+	// archiving leaves it alone, so it also covers archived history.
+	`
+	CREATE TABLE chat_participants (
+		contact_jid TEXT NOT NULL,
+		chat_jid TEXT NOT NULL,
+		first_ts INTEGER,
+		last_ts INTEGER,
+		last_message_id TEXT,
+		message_count INTEGER NOT NULL DEFAULT 0,
+		PRIMARY KEY (contact_jid, chat_jid)
+	) WITHOUT ROWID;
+	CREATE INDEX idx_chat_participants_contact_last ON chat_participants(contact_jid, last_ts);
+
+	WITH m AS (
+		SELECT chat_jid, ts,
+			CASE WHEN sender = '' THEN NULL WHEN instr(sender, '@') THEN sender ELSE sender || '@s.whatsapp.net' END AS sender_jid
+		FROM messages
+	)
+	INSERT INTO chat_participants (contact_jid, chat_jid, first_ts, last_ts, message_count)
+	SELECT contact_jid, chat_jid, MIN(ts), MAX(ts), COUNT(*) FROM (
+		SELECT sender_jid AS contact_jid, chat_jid, ts FROM m WHERE sender_jid IS NOT NULL
+		UNION ALL
+		SELECT chat_jid, chat_jid, ts FROM m WHERE chat_jid NOT LIKE '%@g.us' AND sender_jid IS NOT chat_jid
+	)
+	GROUP BY contact_jid, chat_jid;
+
+	UPDATE chat_participants SET last_message_id = (
+		SELECT id FROM messages m
+		WHERE m.chat_jid = chat_participants.chat_jid AND m.ts = chat_participants.last_ts
+		AND (chat_participants.chat_jid = chat_participants.contact_jid
+			OR CASE WHEN instr(m.sender, '@') THEN m.sender ELSE m.sender || '@s.whatsapp.net' END = chat_participants.contact_jid)
+		ORDER BY m.rowid DESC LIMIT 1
+	);
+
+	CREATE TRIGGER chat_participants_after_insert AFTER INSERT ON messages BEGIN
+		INSERT INTO chat_participants (contact_jid, chat_jid, first_ts, last_ts, last_message_id, message_count)
+		SELECT contact_jid, NEW.chat_jid, NEW.ts, NEW.ts, NEW.id, 1 FROM (
+			SELECT CASE WHEN instr(NEW.sender, '@') THEN NEW.sender ELSE NEW.sender || '@s.whatsapp.net' END AS contact_jid
+			WHERE NEW.sender != ''
+			UNION
+			SELECT NEW.chat_jid WHERE NEW.chat_jid NOT LIKE '%@g.us'
+		) WHERE true
+		ON CONFLICT (contact_jid, chat_jid) DO UPDATE SET
+			first_ts = MIN(first_ts, excluded.first_ts),
+			last_message_id = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_message_id ELSE last_message_id END,
+			last_ts = MAX(last_ts, excluded.last_ts),
+			message_count = message_count + 1;
+	END;
+	`,
+
+	// 6: activity rollups. Message, media and outgoing counts with first
+	// and last activity, per chat and per sender, by UTC day and in total.
+	// They are filled in batches by rollupActivity from
+	// rollup_state.last_rowid rather than by triggers, and readers add the
+	// few messages above that mark themselves.
+	`
+	CREATE TABLE chat_activity_daily (
+		chat_jid TEXT NOT NULL,
+		day TEXT NOT NULL,
+		messages INTEGER NOT NULL,
+		media INTEGER NOT NULL,
+		from_me INTEGER NOT NULL,
+		first_ts INTEGER,
+		last_ts INTEGER,
+		PRIMARY KEY (chat_jid, day)
+	) WITHOUT ROWID;
+
+	CREATE TABLE chat_activity (
+		chat_jid TEXT PRIMARY KEY,
+		messages INTEGER NOT NULL,
+		media INTEGER NOT NULL,
+		from_me INTEGER NOT NULL,
+		first_ts INTEGER,
+		last_ts INTEGER
+	) WITHOUT ROWID;
+
+	CREATE TABLE sender_activity_daily (
+		chat_jid TEXT NOT NULL,
+		sender TEXT NOT NULL,
+		day TEXT NOT NULL,
+		messages INTEGER NOT NULL,
+		media INTEGER NOT NULL,
+		first_ts INTEGER,
+		last_ts INTEGER,
+		PRIMARY KEY (chat_jid, day, sender)
+	) WITHOUT ROWID;
+
+	CREATE TABLE sender_activity (
+		chat_jid TEXT NOT NULL,
+		sender TEXT NOT NULL,
+		messages INTEGER NOT NULL,
+		media INTEGER NOT NULL,
+		first_ts INTEGER,
+		last_ts INTEGER,
+		PRIMARY KEY (chat_jid, sender)
+	) WITHOUT ROWID;
+	CREATE INDEX idx_sender_activity_top ON sender_activity(chat_jid, messages);
+
+	CREATE TABLE rollup_state (
+		id INTEGER PRIMARY KEY CHECK (id = 1),
+		last_rowid INTEGER NOT NULL
+	);
+	INSERT INTO rollup_state (id, last_rowid) VALUES (1, 0);
+	`,
+
+	// 7: chat_summary.last_ts is the last message's time in Unix seconds,
+	// like messages.ts. Chat listings sort on it, and the triggers use
+	// messages.ts to pick a chat's latest message instead of comparing
+	// text timestamps. The last message is re-picked by ts, as the text
+	// comparison could have chosen the wrong one.
+	`
+	ALTER TABLE chat_summary ADD COLUMN last_ts INTEGER;
+	UPDATE chat_summary SET
+		(last_message_id, last_message_time, last_ts, last_sender, last_content, last_is_from_me, last_media_type) = (
+			SELECT id, timestamp, ts, sender, content, is_from_me, media_type FROM messages m
+			WHERE m.chat_jid = chat_summary.chat_jid
+			ORDER BY ts DESC, rowid DESC LIMIT 1
+		);
+	CREATE INDEX idx_chat_summary_last_ts ON chat_summary(last_ts);
+	DROP INDEX idx_chat_summary_last_message_time;
+
+	DROP TRIGGER chat_summary_after_insert;
+	CREATE TRIGGER chat_summary_after_insert AFTER INSERT ON messages BEGIN
+		INSERT INTO chat_summary (chat_jid) VALUES (NEW.chat_jid)
+		ON CONFLICT(chat_jid) DO NOTHING;
+
+		UPDATE chat_summary SET
+			message_count = message_count + 1,
+			last_message_id = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.id ELSE last_message_id END,
+			last_sender = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.sender ELSE last_sender END,
+			last_content = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.content ELSE last_content END,
+			last_is_from_me = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.is_from_me ELSE last_is_from_me END,
+			last_media_type = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.media_type ELSE last_media_type END,
+			last_message_time = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.timestamp ELSE last_message_time END,
+			last_ts = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.ts ELSE last_ts END
+		WHERE chat_jid = NEW.chat_jid;
+
+		UPDATE chat_summary SET unread_count = unread_count + 1
+		WHERE chat_jid = NEW.chat_jid AND NOT NEW.is_from_me
+		AND NEW.timestamp > COALESCE(last_from_me_time, '');
+
+		-- An outgoing message marks everything before it as read
+		UPDATE chat_summary SET
+			last_from_me_time = NEW.timestamp,
+			unread_count = (
+				SELECT COUNT(*) FROM messages m
+				WHERE m.chat_jid = NEW.chat_jid AND NOT m.is_from_me AND m.timestamp > NEW.timestamp
+			)
+		WHERE chat_jid = NEW.chat_jid AND NEW.is_from_me
+		AND NEW.timestamp > COALESCE(last_from_me_time, '');
+	END;
+
+	DROP TRIGGER chat_summary_after_delete;
+	CREATE TRIGGER chat_summary_after_delete AFTER DELETE ON messages BEGIN
+		UPDATE chat_summary SET
+			message_count = message_count - 1,
+			unread_count = unread_count - (NOT OLD.is_from_me AND OLD.timestamp > COALESCE(last_from_me_time, ''))
+		WHERE chat_jid = OLD.chat_jid;
+
+		UPDATE chat_summary SET
+			(last_message_id, last_message_time, last_ts, last_sender, last_content, last_is_from_me, last_media_type) = (
+				SELECT id, timestamp, ts, sender, content, is_from_me, media_type FROM messages m
+				WHERE m.chat_jid = OLD.chat_jid
+				ORDER BY ts DESC, rowid DESC LIMIT 1
+			)
+		WHERE chat_jid = OLD.chat_jid AND last_message_id = OLD.id;
+
+		UPDATE chat_summary SET
+			(last_from_me_time, unread_count) = (
+				SELECT t, (
+					SELECT COUNT(*) FROM messages m
+					WHERE m.chat_jid = OLD.chat_jid AND NOT m.is_from_me AND m.timestamp > COALESCE(t, '')
+				)
+				FROM (SELECT MAX(timestamp) AS t FROM messages WHERE chat_jid = OLD.chat_jid AND is_from_me)
+			)
+		WHERE chat_jid = OLD.chat_jid AND OLD.is_from_me AND OLD.timestamp = last_from_me_time;
+	END;
+	`,
+}
+
+// Bring the database schema up to date, one transaction per migration
+func migrateSchema(db *sql.DB) error {
+	var version int
+	if err := db.QueryRow("PRAGMA user_version").Scan(&version); err != nil {
+		return fmt.Errorf("failed to read schema version: %v", err)
+	}
+
+	for i := version; i < len(schemaMigrations); i++ {
+		tx, err := db.Begin()
+		if err != nil {
+			return fmt.Errorf("failed to start migration %d: %v", i+1, err)
+		}
+		if _, err := tx.Exec(schemaMigrations[i]); err != nil {
+			tx.Rollback()
+			return fmt.Errorf("migration %d failed: %v", i+1, err)
+		}
+		if _, err := tx.Exec(fmt.Sprintf("PRAGMA user_version = %d", i+1)); err != nil {
+			tx.Rollback()
+			return fmt.Errorf("failed to record migration %d: %v", i+1, err)
+		}
+		if err := tx.Commit(); err != nil {
+			return fmt.Errorf("failed to commit migration %d: %v", i+1, err)
+		}
+		fmt.Printf("Applied database migration %d\n", i+1)
+	}
+	return nil
+}
+
+// Retention settings: messages older than messageRetentionDays (0 keeps
+// everything) are moved to the archive database every retentionInterval,
+// retentionBatchSize per transaction
+var (
+	messageRetentionDays = envInt("MESSAGE_RETENTION_DAYS", 0)
+	retentionInterval    = time.Duration(envInt("RETENTION_INTERVAL_MINUTES", 60)) * time.Minute
+	retentionBatchSize   = envInt("RETENTION_BATCH_SIZE", 2000)
+	archiveDBPath        = envString("MESSAGES_ARCHIVE_DB", "store/messages_archive.db")
+)
+
+// Pages freed per incremental_vacuum step, so each step holds the write
+// lock briefly
+const vacuumStepPages = 2000
+
+// The archive keeps the hot table's columns, minus the foreign key: chats
+// stay in the hot database
+const archiveSchemaSQL = `
+	CREATE TABLE IF NOT EXISTS archive.messages (
+		id TEXT,
+		chat_jid TEXT,
+		sender TEXT,
+		content TEXT,
+		timestamp TIMESTAMP,
+		is_from_me BOOLEAN,
+		media_type TEXT,
+		filename TEXT,
+		url TEXT,
+		media_key BLOB,
+		file_sha256 BLOB,
+		file_enc_sha256 BLOB,
+		file_length INTEGER,
+		ts INTEGER,
+		PRIMARY KEY (id, chat_jid)
+	);
+	CREATE INDEX IF NOT EXISTS archive.idx_archive_messages_chat_ts ON messages(chat_jid, ts);
+	CREATE INDEX IF NOT EXISTS archive.idx_archive_messages_ts ON messages(ts);
+`
+
+// Archives created before messages.ts existed
+const archiveAddTsSQL = `
+	ALTER TABLE archive.messages ADD COLUMN ts INTEGER;
+	UPDATE archive.messages SET ts = unixepoch(timestamp);
+	DROP INDEX IF EXISTS archive.idx_archive_messages_chat_timestamp;
+	DROP INDEX IF EXISTS archive.idx_archive_messages_timestamp;
+`
+
+const archivedColumns = "id, chat_jid, sender, content, timestamp, is_from_me, media_type, filename, url, media_key, file_sha256, file_enc_sha256, file_length, ts"
+
+// Archive old messages now and then every retentionInterval
+func (store *MessageStore) runRetention() {
+	if err := store.enableIncrementalVacuum(); err != nil {
+		fmt.Printf("Retention: %v\n", err)
+		return
+	}
+	for {
+		cutoff := time.Now().AddDate(0, 0, -messageRetentionDays)
+		if err := store.archiveOldMessages(cutoff, retentionBatchSize); err != nil {
+			fmt.Printf("Retention: %v\n", err)
+		}
+		time.Sleep(retentionInterval)
+	}
+}
+
+// auto_vacuum can only be switched on by rebuilding the file, so this
+// runs a full VACUUM once; afterwards freed pages are reclaimed in steps
+func (store *MessageStore) enableIncrementalVacuum() error {
+	var mode int
+	if err := store.db.QueryRow("PRAGMA auto_vacuum").Scan(&mode); err != nil {
+		return fmt.Errorf("failed to read auto_vacuum: %v", err)
+	}
+	if mode == 2 {
+		return nil
+	}
+	conn, err := store.db.Conn(context.Background())
+	if err != nil {
+		return err
+	}
+	defer conn.Close()
+	fmt.Println("Rebuilding messages.db for incremental vacuum (one-time)...")
+	start := time.Now()
+	if _, err := conn.ExecContext(context.Background(), "PRAGMA auto_vacuum = INCREMENTAL"); err != nil {
+		return fmt.Errorf("failed to set auto_vacuum: %v", err)
+	}
+	if _, err := conn.ExecContext(context.Background(), "VACUUM"); err != nil {
+		return fmt.Errorf("failed to vacuum messages.db: %v", err)
+	}
+	fmt.Printf("Rebuilt messages.db in %s\n", time.Since(start).Round(time.Millisecond))
+	return nil
+}
+
+// Move messages older than cutoff to the archive database, batchSize per
+// transaction, then give the freed pages back to the filesystem.
+//
+// Archiving is a move, not a deletion, so the chat_summary rows of the
+// affected chats are restored after the delete trigger has run: counts,
+// unread state and last message keep describing the whole history.
+func (store *MessageStore) archiveOldMessages(cutoff time.Time, batchSize int) error {
+	ctx := context.Background()
+	conn, err := store.db.Conn(ctx)
+	if err != nil {
+		return err
+	}
+	defer conn.Close()
+
+	if _, err := conn.ExecContext(ctx, "ATTACH DATABASE ? AS archive", archiveDBPath); err != nil {
+		return fmt.Errorf("failed to attach archive: %v", err)
+	}
+	defer conn.ExecContext(ctx, "DETACH DATABASE archive")
+	var hasTs bool
+	if err := conn.QueryRowContext(ctx,
+		"SELECT COUNT(*) > 0 FROM pragma_table_info('messages', 'archive') WHERE name = 'ts'",
+	).Scan(&hasTs); err != nil {
+		return fmt.Errorf("failed to inspect archive: %v", err)
+	}
+	if !hasTs {
+		// A no-op for a new archive: the table doesn't exist yet
+		conn.ExecContext(ctx, archiveAddTsSQL)
+	}
+	if _, err := conn.ExecContext(ctx, archiveSchemaSQL); err != nil {
+		return fmt.Errorf("failed to create archive schema: %v", err)
+	}
+
+	// Only rolled-up messages are archived, so the rollups cover archived history
+	if _, err := store.rollupActivity(); err != nil {
+		return fmt.Errorf("failed to roll up activity before archiving: %v", err)
+	}
+
+	start := time.Now()
+	var archived int64
+	for {
+		n, err := store.archiveBatch(ctx, conn, cutoff, batchSize)
+		if err != nil {
+			return err
+		}
+		archived += n
+		if n < int64(batchSize) {
+			break
+		}
+	}
+	if archived == 0 {
+		return nil
+	}
+
+	freed, err := store.incrementalVacuum(ctx, conn)
+	if err != nil {
+		return err
+	}
+	fmt.Printf("Archived %d messages older than %s in %s, freed %d pages\n",
+		archived, cutoff.Format("2006-01-02"), time.Since(start).Round(time.Millisecond), freed)
+	return nil
+}
+
+func (store *MessageStore) archiveBatch(ctx context.Context, conn *sql.Conn, cutoff time.Time, batchSize int) (int64, error) {
+	waitStart := time.Now()
+	tx, err := conn.BeginTx(ctx, nil)
+	store.lockWaits.observe(time.Since(waitStart))
+	if err != nil {
+		return 0, err
+	}
+	// messages has no AUTOINCREMENT: a new row gets max(rowid)+1, so
+	// moving the row holding max(rowid) would hand its rowid out again.
+	// The rollups, the message feed and reply correlation all take rowids
+	// above their mark as new, so that row always stays, keeping rowids
+	// increasing. History sync stores the oldest messages last, so it is
+	// often an old one.
+	steps := []struct {
+		query string
+		args  []interface{}
+	}{
+		{"CREATE TEMP TABLE archive_batch (rid INTEGER PRIMARY KEY, chat_jid TEXT)", nil},
+		{"INSERT INTO archive_batch SELECT rowid, chat_jid FROM main.messages " +
+			"WHERE ts < ? AND rowid <= (SELECT last_rowid FROM main.rollup_state) " +
+			"AND rowid < (SELECT MAX(rowid) FROM main.messages) ORDER BY ts LIMIT ?", []interface{}{cutoff.Unix(), batchSize}},
+		{"INSERT OR REPLACE INTO archive.messages (" + archivedColumns + ") SELECT " + archivedColumns +
+			" FROM main.messages WHERE rowid IN (SELECT rid FROM archive_batch)", nil},
+		{"CREATE TEMP TABLE archive_summary AS SELECT * FROM main.chat_summary WHERE chat_jid IN (SELECT chat_jid FROM archive_batch)", nil},
+		{"DELETE FROM main.messages WHERE rowid IN (SELECT rid FROM archive_batch)", nil},
+		{"INSERT OR REPLACE INTO main.chat_summary SELECT * FROM archive_summary", nil},
+		{"UPDATE main.retention_state SET (archived_through, archived_through_ts) = " +
+			"(SELECT timestamp, ts FROM archive.messages ORDER BY ts DESC LIMIT 1)", nil},
+		{"DROP TABLE archive_summary", nil},
+	}
+	var moved int64
+	for i, step := range steps {
+		result, err := tx.ExecContext(ctx, step.query, step.args...)
+		if err != nil {
+			tx.Rollback()
+			conn.ExecContext(ctx, "DROP TABLE IF EXISTS temp.archive_batch")
+			conn.ExecContext(ctx, "DROP TABLE IF EXISTS temp.archive_summary")
+			return 0, fmt.Errorf("archive step %d failed: %v", i+1, err)
+		}
+		if i == 1 {
+			moved, _ = result.RowsAffected()
+		}
+	}
+	if _, err := tx.ExecContext(ctx, "DROP TABLE archive_batch"); err != nil {
+		tx.Rollback()
+		return 0, err
+	}
+	if err := tx.Commit(); err != nil {
+		return 0, fmt.Errorf("failed to commit archive batch: %v", err)
+	}
+	return moved, nil
+}
+
+// Release free pages in small steps; returns how many were freed
+func (store *MessageStore) incrementalVacuum(ctx context.Context, conn *sql.Conn) (int, error) {
+	freed, last := 0, -1
+	for {
+		var free int
+		if err := conn.QueryRowContext(ctx, "PRAGMA main.freelist_count").Scan(&free); err != nil {
+			return freed, err
+		}
+		// Stop when nothing is left, or nothing moved (auto_vacuum is off)
+		if free == 0 || free == last {
+			return freed, nil
+		}
+		last = free
+		if _, err := conn.ExecContext(ctx, fmt.Sprintf("PRAGMA main.incremental_vacuum(%d)", vacuumStepPages)); err != nil {
+			return freed, fmt.Errorf("incremental vacuum failed: %v", err)
+		}
+		freed += minInt(free, vacuumStepPages)
+	}
+}
+
+// Activity rollups are brought up to date every rollupInterval,
+// rollupBatchSize messages per transaction
+var (
+	rollupInterval  = time.Duration(envInt("ACTIVITY_ROLLUP_INTERVAL_SECONDS", 60)) * time.Second
+	rollupBatchSize = envInt("ACTIVITY_ROLLUP_BATCH_SIZE", 20000)
+)
+
+// Upserts folding messages with rowid in (?1, ?2] into the rollups.
+// Senders are keyed by JID, as in chat_participants.
+var rollupSQL = []string{
+	`INSERT INTO chat_activity_daily (chat_jid, day, messages, media, from_me, first_ts, last_ts)
+	SELECT chat_jid, date(ts, 'unixepoch'), COUNT(*), COUNT(NULLIF(media_type, '')), SUM(is_from_me), MIN(ts), MAX(ts)
+	FROM messages WHERE rowid > ?1 AND rowid <= ?2 AND ts IS NOT NULL
+	GROUP BY chat_jid, date(ts, 'unixepoch')
+	ON CONFLICT (chat_jid, day) DO UPDATE SET
+		messages = messages + excluded.messages, media = media + excluded.media, from_me = from_me + excluded.from_me,
+		first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts)`,
+
+	`INSERT INTO chat_activity (chat_jid, messages, media, from_me, first_ts, last_ts)
+	SELECT chat_jid, COUNT(*), COUNT(NULLIF(media_type, '')), SUM(is_from_me), MIN(ts), MAX(ts)
+	FROM messages WHERE rowid > ?1 AND rowid <= ?2 AND ts IS NOT NULL
+	GROUP BY chat_jid
+	ON CONFLICT (chat_jid) DO UPDATE SET
+		messages = messages + excluded.messages, media = media + excluded.media, from_me = from_me + excluded.from_me,
+		first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts)`,
+
+	`INSERT INTO sender_activity_daily (chat_jid, sender, day, messages, media, first_ts, last_ts)
+	SELECT chat_jid, CASE WHEN instr(sender, '@') THEN sender ELSE sender || '@s.whatsapp.net' END AS sender_jid,
+		date(ts, 'unixepoch'), COUNT(*), COUNT(NULLIF(media_type, '')), MIN(ts), MAX(ts)
+	FROM messages WHERE rowid > ?1 AND rowid <= ?2 AND ts IS NOT NULL AND sender != ''
+	GROUP BY chat_jid, sender_jid, date(ts, 'unixepoch')
+	ON CONFLICT (chat_jid, day, sender) DO UPDATE SET
+		messages = messages + excluded.messages, media = media + excluded.media,
+		first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts)`,
+
+	`INSERT INTO sender_activity (chat_jid, sender, messages, media, first_ts, last_ts)
+	SELECT chat_jid, CASE WHEN instr(sender, '@') THEN sender ELSE sender || '@s.whatsapp.net' END AS sender_jid,
+		COUNT(*), COUNT(NULLIF(media_type, '')), MIN(ts), MAX(ts)
+	FROM messages WHERE rowid > ?1 AND rowid <= ?2 AND ts IS NOT NULL AND sender != ''
+	GROUP BY chat_jid, sender_jid
+	ON CONFLICT (chat_jid, sender) DO UPDATE SET
+		messages = messages + excluded.messages, media = media + excluded.media,
+		first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts)`,
+}
+
+// Keep the activity rollups current
+func (store *MessageStore) runActivityRollups() {
+	for {
+		start := time.Now()
+		n, err := store.rollupActivity()
+		if err != nil {
+			fmt.Printf("Activity rollup: %v\n", err)
+		} else if n > int64(rollupBatchSize) {
+			// Only a backlog (first run, history sync) is worth reporting
+			fmt.Printf("Rolled up activity for %d messages in %s\n", n, time.Since(start).Round(time.Millisecond))
+		}
+		time.Sleep(rollupInterval)
+	}
+}
+
+// Fold every message stored since the last run into the rollups; returns
+// how many were added
+func (store *MessageStore) rollupActivity() (int64, error) {
+	if err := store.checkRollupMark(); err != nil {
+		return 0, err
+	}
+	var total int64
+	for {
+		n, err := store.rollupBatch()
+		total += n
+		if err != nil || n < int64(rollupBatchSize) {
+			return total, err
+		}
+	}
+}
+
+// The rollups cover rowids up to rollup_state.last_rowid. Before
+// archiveBatch kept the top rowid, archiving could leave max(rowid) below
+// that mark, and the rowids SQLite then reused were never rolled up. Such
+// a database has its rollups rebuilt.
+func (store *MessageStore) checkRollupMark() error {
+	var mark, top int64
+	if err := store.db.QueryRow(
+		"SELECT (SELECT last_rowid FROM rollup_state), (SELECT COALESCE(MAX(rowid), 0) FROM messages)",
+	).Scan(&mark, &top); err != nil {
+		return fmt.Errorf("failed to read rollup state: %v", err)
+	}
+	if top >= mark {
+		return nil
+	}
+	fmt.Printf("Activity rollups are marked up to rowid %d but messages end at %d; rebuilding them\n", mark, top)
+	return store.rebuildRollups()
+}
+
+// Refill the rollups from the archive and start over on messages, which
+// rollupBatch then folds in as usual
+func (store *MessageStore) rebuildRollups() error {
+	ctx := context.Background()
+	conn, err := store.db.Conn(ctx)
+	if err != nil {
+		return err
+	}
+	defer conn.Close()
+
+	var archived bool
+	if _, err := os.Stat(archiveDBPath); err == nil {
+		if _, err := conn.ExecContext(ctx, "ATTACH DATABASE ? AS archive", archiveDBPath); err != nil {
+			return fmt.Errorf("failed to attach archive: %v", err)
+		}
+		defer conn.ExecContext(ctx, "DETACH DATABASE archive")
+		if err := conn.QueryRowContext(ctx,
+			"SELECT COUNT(*) > 0 FROM pragma_table_info('messages', 'archive') WHERE name = 'ts'",
+		).Scan(&archived); err != nil {
+			return fmt.Errorf("failed to inspect archive: %v", err)
+		}
+	}
+
+	tx, err := conn.BeginTx(ctx, nil)
+	if err != nil {
+		return err
+	}
+	for _, table := range []string{"chat_activity_daily", "chat_activity", "sender_activity_daily", "sender_activity"} {
+		if _, err := tx.ExecContext(ctx, "DELETE FROM main."+table); err != nil {
+			tx.Rollback()
+			return fmt.Errorf("failed to clear %s: %v", table, err)
+		}
+	}
+	if archived {
+		// Archive rowids are unrelated to the hot table's; take them all
+		for i, query := range rollupSQL {
+			query = strings.Replace(query, "FROM messages", "FROM archive.messages", 1)
+			if _, err := tx.ExecContext(ctx, query, int64(math.MinInt64), int64(math.MaxInt64)); err != nil {
+				tx.Rollback()
+				return fmt.Errorf("rollup step %d over the archive failed: %v", i+1, err)
+			}
+		}
+	}
+	if _, err := tx.ExecContext(ctx, "UPDATE main.rollup_state SET last_rowid = 0"); err != nil {
+		tx.Rollback()
+		return err
+	}
+	if err := tx.Commit(); err != nil {
+		return fmt.Errorf("failed to commit rollup rebuild: %v", err)
+	}
+	return nil
+}
+
+func (store *MessageStore) rollupBatch() (int64, error) {
+	tx, err := store.begin()
+	if err != nil {
+		return 0, err
+	}
+	var after, upto, n int64
+	if err := tx.QueryRow("SELECT last_rowid FROM rollup_state").Scan(&after); err != nil {
+		tx.Rollback()
+		return 0, fmt.Errorf("failed to read rollup state: %v", err)
+	}
+	if err := tx.QueryRow(
+		"SELECT COUNT(*), COALESCE(MAX(rowid), ?1) FROM (SELECT rowid FROM messages WHERE rowid > ?1 ORDER BY rowid LIMIT ?2)",
+		after, rollupBatchSize,
+	).Scan(&n, &upto); err != nil {
+		tx.Rollback()
+		return 0, fmt.Errorf("failed to find messages to roll up: %v", err)
+	}
+	if n == 0 {
+		tx.Rollback()
+		return 0, nil
+	}
+	for i, query := range rollupSQL {
+		if _, err := tx.Exec(query, after, upto); err != nil {
+			tx.Rollback()
+			return 0, fmt.Errorf("rollup step %d failed: %v", i+1, err)
+		}
+	}
+	if _, err := tx.Exec("UPDATE rollup_state SET last_rowid = ?", upto); err != nil {
+		tx.Rollback()
+		return 0, err
+	}
+	if err := tx.Commit(); err != nil {
+		return 0, fmt.Errorf("failed to commit rollup: %v", err)
+	}
+	return n, nil
+}
+
 // Close the database connection
 func (store *MessageStore) Close() error {
 	return store.db.Close()
 }
 
+// Start a write transaction, recording how long it waited for the lock
+func (store *MessageStore) begin() (*sql.Tx, error) {
+	start := time.Now()
+	tx, err := store.db.Begin()
+	store.lockWaits.observe(time.Since(start))
+	return tx, err
+}
+
+// Run a single write statement in its own transaction
+func (store *MessageStore) exec(query string, args ...interface{}) error {
+	tx, err := store.begin()
+	if err != nil {
+		return err
+	}
+	if _, err := tx.Exec(query, args...); err != nil {
+		tx.Rollback()
+		return err
+	}
+	return tx.Commit()
+}
+
+// Fold the WAL back into the database and truncate it. Automatic
+// checkpoints keep up with normal traffic but never shrink the WAL file,
+// which a large history sync can grow to hundreds of megabytes.
+//
+// Truncating has to wait for readers, and the backend's and MCP server's
+// long-polls keep read transactions open, so this runs in the background
+// rather than on the event goroutine, one at a time. The truncating step
+// also runs without a busy handler: with readers active it gives up at
+// once instead of holding up writers while it waits, and a later sync
+// tries again.
+func (store *MessageStore) checkpoint() {
+	if !store.checkpointing.TryLock() {
+		return
+	}
+	go func() {
+		defer store.checkpointing.Unlock()
+		ctx := context.Background()
+		conn, err := store.db.Conn(ctx)
+		if err != nil {
+			fmt.Printf("WAL checkpoint failed: %v\n", err)
+			return
+		}
+		defer conn.Close()
+
+		var busy, logPages, checkpointed int
+		// Copy what can be copied without waiting on anyone first
+		if err := conn.QueryRowContext(ctx, "PRAGMA wal_checkpoint(PASSIVE)").Scan(&busy, &logPages, &checkpointed); err != nil {
+			fmt.Printf("WAL checkpoint failed: %v\n", err)
+			return
+		}
+		if _, err := conn.ExecContext(ctx, "PRAGMA busy_timeout = 0"); err != nil {
+			fmt.Printf("WAL checkpoint failed: %v\n", err)
+			return
+		}
+		defer conn.ExecContext(ctx, fmt.Sprintf("PRAGMA busy_timeout = %d", messagesDBBusyTimeoutMs))
+		err = conn.QueryRowContext(ctx, "PRAGMA wal_checkpoint(TRUNCATE)").Scan(&busy, &logPages, &checkpointed)
+		if err != nil {
+			fmt.Printf("WAL checkpoint failed: %v\n", err)
+		} else if busy != 0 {
+			fmt.Printf("WAL checkpoint incomplete (readers active): %d of %d pages\n", checkpointed, logPages)
+		}
+	}()
+}
+
+// Phone number of a direct chat JID, or nil (stored as NULL) for groups
+// and other non-user JIDs
+func phoneFromJID(jid string) interface{} {
+	user, server, found := strings.Cut(jid, "@")
+	if !found || server != types.DefaultUserServer {
+		return nil
+	}
+	// Drop any agent/device suffix (user.agent:device)
+	if i := strings.IndexAny(user, ".:"); i >= 0 {
+		user = user[:i]
+	}
+	return user
+}
+
+const storeChatSQL = "INSERT OR REPLACE INTO chats (jid, name, last_message_time, phone) VALUES (?, ?, ?, ?)"
+
+// An upsert rather than INSERT OR REPLACE: a replace deletes and
+// re-inserts the row, which would count it twice in chat_summary
+const storeMessageSQL = `INSERT INTO messages 
+	(id, chat_jid, sender, content, timestamp, ts, is_from_me, media_type, filename, url, media_key, file_sha256, file_enc_sha256, file_length) 
+	VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+	ON CONFLICT(id, chat_jid) DO UPDATE SET
+		sender = excluded.sender, content = excluded.content, timestamp = excluded.timestamp, ts = excluded.ts,
+		is_from_me = excluded.is_from_me, media_type = excluded.media_type, filename = excluded.filename,
+		url = excluded.url, media_key = excluded.media_key, file_sha256 = excluded.file_sha256,
+		file_enc_sha256 = excluded.file_enc_sha256, file_length = excluded.file_length`
+
 // Store a chat in the database
 func (store *MessageStore) StoreChat(jid, name string, lastMessageTime time.Time) error {
-	_, err := store.db.Exec(
-		"INSERT OR REPLACE INTO chats (jid, name, last_message_time) VALUES (?, ?, ?)",
-		jid, name, lastMessageTime,
-	)
-	return err
+	return store.exec(storeChatSQL, jid, name, lastMessageTime, phoneFromJID(jid))
 }
 
 // Store a message in the database
@@ -122,12 +1066,111 @@ func (store *MessageStore) StoreMessage(id, chatJID, sender, content string, tim
 		return nil
 	}
 
-	_, err := store.db.Exec(
-		`INSERT OR REPLACE INTO messages 
-		(id, chat_jid, sender, content, timestamp, is_from_me, media_type, filename, url, media_key, file_sha256, file_enc_sha256, file_length) 
-		VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)`,
-		id, chatJID, sender, content, timestamp, isFromMe, mediaType, filename, url, mediaKey, fileSHA256, fileEncSHA256, fileLength,
+	return store.exec(storeMessageSQL,
+		id, chatJID, sender, content, timestamp, timestamp.Unix(), isFromMe, mediaType, filename, url, mediaKey, fileSHA256, fileEncSHA256, fileLength,
 	)
+}
+
+// historyWriter writes history-sync chats and messages through prepared
+// statements in transactions of up to batchSize messages. One transaction
+// per row made a first sync take minutes and kept readers waiting; batches
+// keep each write-lock hold short so readers get in between them.
+type historyWriter struct {
+	store     *MessageStore
+	batchSize int
+	chatStmt  *sql.Stmt
+	msgStmt   *sql.Stmt
+
+	tx      *sql.Tx
+	txChat  *sql.Stmt
+	txMsg   *sql.Stmt
+	txStart time.Time
+	pending int
+
+	stored      int
+	batches     int
+	longestHold time.Duration
+}
+
+func (store *MessageStore) newHistoryWriter(batchSize int) (*historyWriter, error) {
+	chatStmt, err := store.db.Prepare(storeChatSQL)
+	if err != nil {
+		return nil, fmt.Errorf("failed to prepare chat insert: %v", err)
+	}
+	msgStmt, err := store.db.Prepare(storeMessageSQL)
+	if err != nil {
+		chatStmt.Close()
+		return nil, fmt.Errorf("failed to prepare message insert: %v", err)
+	}
+	return &historyWriter{store: store, batchSize: batchSize, chatStmt: chatStmt, msgStmt: msgStmt}, nil
+}
+
+func (w *historyWriter) begin() error {
+	if w.tx != nil {
+		return nil
+	}
+	tx, err := w.store.begin()
+	if err != nil {
+		return err
+	}
+	w.tx = tx
+	w.txChat = tx.Stmt(w.chatStmt)
+	w.txMsg = tx.Stmt(w.msgStmt)
+	w.txStart = time.Now()
+	w.pending = 0
+	return nil
+}
+
+func (w *historyWriter) StoreChat(jid, name string, lastMessageTime time.Time) error {
+	if err := w.begin(); err != nil {
+		return err
+	}
+	_, err := w.txChat.Exec(jid, name, lastMessageTime, phoneFromJID(jid))
+	return err
+}
+
+func (w *historyWriter) StoreMessage(id, chatJID, sender, content string, timestamp time.Time, isFromMe bool,
+	mediaType, filename, url string, mediaKey, fileSHA256, fileEncSHA256 []byte, fileLength uint64) error {
+	if content == "" && mediaType == "" {
+		return nil
+	}
+	if err := w.begin(); err != nil {
+		return err
+	}
+	if _, err := w.txMsg.Exec(id, chatJID, sender, content, timestamp, timestamp.Unix(), isFromMe, mediaType, filename, url, mediaKey, fileSHA256, fileEncSHA256, fileLength); err != nil {
+		return err
+	}
+	w.pending++
+	if w.pending >= w.batchSize {
+		return w.Flush()
+	}
+	return nil
+}
+
+// Commit the open batch, if any
+func (w *historyWriter) Flush() error {
+	if w.tx == nil {
+		return nil
+	}
+	tx, pending := w.tx, w.pending
+	w.tx, w.txChat, w.txMsg, w.pending = nil, nil, nil, 0
+	if err := tx.Commit(); err != nil {
+		tx.Rollback()
+		return fmt.Errorf("failed to commit batch of %d history messages: %v", pending, err)
+	}
+	if hold := time.Since(w.txStart); hold > w.longestHold {
+		w.longestHold = hold
+	}
+	w.stored += pending
+	w.batches++
+	return nil
+}
+
+// Commit what is left and release the prepared statements
+func (w *historyWriter) Close() error {
+	err := w.Flush()
+	w.chatStmt.Close()
+	w.msgStmt.Close()
 	return err
 }
 
@@ -207,6 +1250,119 @@ type SendMessageRequest struct {
 	Recipient string `json:"recipient"`
 	Message   string `json:"message"`
 	MediaPath string `json:"media_path,omitempty"`
+	// Queue the send and return a job ID instead of waiting for it
+	Async bool `json:"async,omitempty"`
+}
+
+// Send queue settings: jobs waiting before /api/send refuses new ones,
+// concurrent senders, and finished jobs kept for status queries
+var (
+	sendQueueSize    = envInt("SEND_QUEUE_SIZE", 1000)
+	sendWorkers      = envInt("SEND_WORKERS", 4)
+	sendJobRetention = envInt("SEND_JOB_RETENTION", 10000)
+)
+
+// Send job states
+const (
+	jobQueued  = "queued"
+	jobSending = "sending"
+	jobSent    = "sent"
+	jobFailed  = "failed"
+)
+
+// sendJob is one queued send and, once finished, its outcome
+type sendJob struct {
+	ID         string     `json:"job_id"`
+	Recipient  string     `json:"recipient"`
+	Status     string     `json:"status"`
+	Success    bool       `json:"success"`
+	Message    string     `json:"message,omitempty"`
+	QueuedAt   time.Time  `json:"queued_at"`
+	FinishedAt *time.Time `json:"finished_at,omitempty"`
+
+	request SendMessageRequest
+}
+
+// sendQueue runs async sends on a fixed pool of workers so callers don't
+// hold a connection open for the upload and send
+type sendQueue struct {
+	client   *whatsmeow.Client
+	pending  chan *sendJob
+	mu       sync.Mutex
+	jobs     map[string]*sendJob
+	finished []string // IDs of finished jobs, oldest first, for pruning
+}
+
+func newSendQueue(client *whatsmeow.Client, size, workers int) *sendQueue {
+	q := &sendQueue{
+		client:  client,
+		pending: make(chan *sendJob, size),
+		jobs:    make(map[string]*sendJob),
+	}
+	for i := 0; i < workers; i++ {
+		go q.work()
+	}
+	return q
+}
+
+func newJobID() string {
+	b := make([]byte, 12)
+	if _, err := crand.Read(b); err != nil {
+		return fmt.Sprintf("%x", time.Now().UnixNano())
+	}
+	return hex.EncodeToString(b)
+}
+
+// Queue a send; false if the queue is full
+func (q *sendQueue) submit(req SendMessageRequest) (sendJob, bool) {
+	job := &sendJob{ID: newJobID(), Recipient: req.Recipient, Status: jobQueued, QueuedAt: time.Now(), request: req}
+	q.mu.Lock()
+	defer q.mu.Unlock()
+	select {
+	case q.pending <- job:
+		q.jobs[job.ID] = job
+		return *job, true
+	default:
+		return sendJob{}, false
+	}
+}
+
+func (q *sendQueue) work() {
+	for job := range q.pending {
+		q.mu.Lock()
+		job.Status = jobSending
+		q.mu.Unlock()
+
+		success, message := sendWhatsAppMessage(q.client, job.request.Recipient, job.request.Message, job.request.MediaPath)
+
+		now := time.Now()
+		q.mu.Lock()
+		job.Success, job.Message, job.FinishedAt = success, message, &now
+		if success {
+			job.Status = jobSent
+		} else {
+			job.Status = jobFailed
+		}
+		q.finished = append(q.finished, job.ID)
+		for len(q.finished) > sendJobRetention {
+			delete(q.jobs, q.finished[0])
+			q.finished = q.finished[1:]
+		}
+		q.mu.Unlock()
+	}
+}
+
+// Copies of the given jobs, keyed by ID; unknown (or pruned) IDs are left out
+func (q *sendQueue) status(ids []string) map[string]sendJob {
+	q.mu.Lock()
+	defer q.mu.Unlock()
+	result := make(map[string]sendJob, len(ids))
+	for _, id := range ids {
+		if job, ok := q.jobs[id]; ok {
+			result[id] = *job
+		}
+	}
+	return result
 }
 
 // Function to send a WhatsApp message
@@ -378,6 +1534,88 @@ func sendWhatsAppMessage(client *whatsmeow.Client, recipient string, message str
 	return true, fmt.Sprintf("Message sent to %s", recipient)
 }
 
+// CheckRecipientsRequest represents the request body for the check recipients API
+type CheckRecipientsRequest struct {
+	Recipients []string `json:"recipients"`
+}
+
+// RecipientStatus reports whether a single recipient can receive WhatsApp messages
+type RecipientStatus struct {
+	Recipient    string `json:"recipient"`
+	JID          string `json:"jid,omitempty"`
+	IsOnWhatsApp bool   `json:"is_on_whatsapp"`
+}
+
+// CheckRecipientsResponse represents the response for the check recipients API
+type CheckRecipientsResponse struct {
+	Success bool              `json:"success"`
+	Message string            `json:"message,omitempty"`
+	Results []RecipientStatus `json:"results,omitempty"`
+}
+
+// Check in one round trip which recipients (phone numbers or JIDs) are registered on WhatsApp
+func checkRecipients(client *whatsmeow.Client, recipients []string) ([]RecipientStatus, error) {
+	if !client.IsConnected() {
+		return nil, fmt.Errorf("not connected to WhatsApp")
+	}
+
+	results := make([]RecipientStatus, len(recipients))
+	var phones []string
+	indexes := make(map[string][]int)
+
+	for i, recipient := range recipients {
+		results[i].Recipient = recipient
+		user := recipient
+
+		if strings.Contains(recipient, "@") {
+			jid, err := types.ParseJID(recipient)
+			if err != nil {
+				// Malformed JIDs are reported as not on WhatsApp
+				continue
+			}
+			if jid.Server == types.GroupServer {
+				// Groups can't be looked up this way; assume they are reachable
+				results[i].JID = jid.String()
+				results[i].IsOnWhatsApp = true
+				continue
+			}
+			if jid.Server != types.DefaultUserServer {
+				continue
+			}
+			user = jid.User
+		}
+
+		if user == "" {
+			continue
+		}
+		query := "+" + user
+		if _, seen := indexes[query]; !seen {
+			phones = append(phones, query)
+		}
+		indexes[query] = append(indexes[query], i)
+	}
+
+	if len(phones) == 0 {
+		return results, nil
+	}
+
+	responses, err := client.IsOnWhatsApp(phones)
+	if err != nil {
+		return nil, fmt.Errorf("failed to check recipients: %v", err)
+	}
+
+	for _, resp := range responses {
+		for _, i := range indexes[resp.Query] {
+			results[i].IsOnWhatsApp = resp.IsIn
+			if resp.IsIn {
+				results[i].JID = resp.JID.String()
+			}
+		}
+	}
+
+	return results, nil
+}
+
 // Extract media info from a message
 func extractMediaInfo(msg *waProto.Message) (mediaType string, filename string, url string, mediaKey []byte, fileSHA256 []byte, fileEncSHA256 []byte, fileLength uint64) {
 	if msg == nil {
@@ -493,11 +1731,10 @@ type DownloadMediaResponse struct {
 
 // Store additional media info in the database
 func (store *MessageStore) StoreMediaInfo(id, chatJID, url string, mediaKey, fileSHA256, fileEncSHA256 []byte, fileLength uint64) error {
-	_, err := store.db.Exec(
+	return store.exec(
 		"UPDATE messages SET url = ?, media_key = ?, file_sha256 = ?, file_enc_sha256 = ?, file_length = ? WHERE id = ? AND chat_jid = ?",
 		url, mediaKey, fileSHA256, fileEncSHA256, fileLength, id, chatJID,
 	)
-	return err
 }
 
 // Get media info from the database
@@ -684,6 +1921,8 @@ func extractDirectPathFromURL(url string) string {
 
 // Start a REST API server to expose the WhatsApp client functionality
 func startRESTServer(client *whatsmeow.Client, messageStore *MessageStore, port int) {
+	sends := newSendQueue(client, sendQueueSize, sendWorkers)
+
 	// Handler for WhatsApp connection status
 	http.HandleFunc("/status", func(w http.ResponseWriter, r *http.Request) {
 		w.Header().Set("Content-Type", "application/json")
@@ -694,6 +1933,15 @@ func startRESTServer(client *whatsmeow.Client, messageStore *MessageStore, port
 		}
 	})
 
+	// Handler for messages.db write-lock statistics
+	http.HandleFunc("/api/dbstats", func(w http.ResponseWriter, r *http.Request) {
+		w.Header().Set("Content-Type", "application/json")
+		if err := json.NewEncoder(w).Encode(messageStore.lockWaits.snapshot()); err != nil {
+			log.Printf("Error encoding dbstats response: %v", err)
+			http.Error(w, "Failed to encode response", http.StatusInternalServerError)
+		}
+	})
+
 	// Handler for WhatsApp QR code
 	http.HandleFunc("/qr", func(w http.ResponseWriter, r *http.Request) {
 		// Diagnostic log
@@ -740,6 +1988,19 @@ func startRESTServer(client *whatsmeow.Client, messageStore *MessageStore, port
 			return
 		}
 
+		if req.Async {
+			job, ok := sends.submit(req)
+			w.Header().Set("Content-Type", "application/json")
+			if !ok {
+				w.WriteHeader(http.StatusServiceUnavailable)
+				json.NewEncoder(w).Encode(SendMessageResponse{Success: false, Message: "Send queue is full"})
+				return
+			}
+			w.WriteHeader(http.StatusAccepted)
+			json.NewEncoder(w).Encode(job)
+			return
+		}
+
 		fmt.Println("Received request to send message", req.Message, req.MediaPath)
 
 		// Send the message
@@ -760,6 +2021,81 @@ func startRESTServer(client *whatsmeow.Client, messageStore *MessageStore, port
 		})
 	})
 
+	// Handler for the status of one async send: GET /api/jobs/<id>
+	http.HandleFunc("/api/jobs/", func(w http.ResponseWriter, r *http.Request) {
+		if r.Method != http.MethodGet {
+			http.Error(w, "Method not allowed", http.StatusMethodNotAllowed)
+			return
+		}
+		id := strings.TrimPrefix(r.URL.Path, "/api/jobs/")
+		job, ok := sends.status([]string{id})[id]
+		w.Header().Set("Content-Type", "application/json")
+		if !ok {
+			w.WriteHeader(http.StatusNotFound)
+			json.NewEncoder(w).Encode(SendMessageResponse{Success: false, Message: "Unknown job ID"})
+			return
+		}
+		json.NewEncoder(w).Encode(job)
+	})
+
+	// Handler for the status of many async sends: POST {"job_ids": [...]}
+	http.HandleFunc("/api/jobs", func(w http.ResponseWriter, r *http.Request) {
+		if r.Method != http.MethodPost {
+			http.Error(w, "Method not allowed", http.StatusMethodNotAllowed)
+			return
+		}
+		var req struct {
+			JobIDs []string `json:"job_ids"`
+		}
+		if err := json.NewDecoder(r.Body).Decode(&req); err != nil {
+			http.Error(w, "Invalid request format", http.StatusBadRequest)
+			return
+		}
+		w.Header().Set("Content-Type", "application/json")
+		json.NewEncoder(w).Encode(map[string]interface{}{"success": true, "jobs": sends.status(req.JobIDs)})
+	})
+
+	// Handler for checking which recipients are registered on WhatsApp
+	http.HandleFunc("/api/check", func(w http.ResponseWriter, r *http.Request) {
+		// Only allow POST requests
+		if r.Method != http.MethodPost {
+			http.Error(w, "Method not allowed", http.StatusMethodNotAllowed)
+			return
+		}
+
+		// Parse the request body
+		var req CheckRecipientsRequest
+		if err := json.NewDecoder(r.Body).Decode(&req); err != nil {
+			http.Error(w, "Invalid request format", http.StatusBadRequest)
+			return
+		}
+
+		// Validate request
+		if len(req.Recipients) == 0 {
+			http.Error(w, "Recipients are required", http.StatusBadRequest)
+			return
+		}
+
+		results, err := checkRecipients(client, req.Recipients)
+
+		// Set response headers
+		w.Header().Set("Content-Type", "application/json")
+
+		if err != nil {
+			w.WriteHeader(http.StatusInternalServerError)
+			json.NewEncoder(w).Encode(CheckRecipientsResponse{
+				Success: false,
+				Message: err.Error(),
+			})
+			return
+		}
+
+		json.NewEncoder(w).Encode(CheckRecipientsResponse{
+			Success: true,
+			Results: results,
+		})
+	})
+
 	// Handler for downloading media
 	http.HandleFunc("/api/download", func(w http.ResponseWriter, r *http.Request) {
 		// Only allow POST requests
@@ -885,6 +2221,11 @@ func main() {
 	}
 	defer messageStore.Close()
 
+	go messageStore.runActivityRollups()
+	if messageRetentionDays > 0 {
+		go messageStore.runRetention()
+	}
+
 	// Start the REST API server
 	go startRESTServer(client, messageStore, 8082)
 
@@ -940,6 +2281,18 @@ func main() {
 			handleMessage(client, messageStore, v, logger)
 		case *events.HistorySync:
 			handleHistorySync(client, messageStore, v, logger)
+		case *events.GroupInfo:
+			if v.Name != nil && v.Name.Name != "" {
+				if err := messageStore.RenameChat(v.JID.String(), v.Name.Name); err != nil {
+					logger.Warnf("Failed to store new name of group %s: %v", v.JID, err)
+				}
+			}
+		case *events.JoinedGroup:
+			if v.GroupName.Name != "" {
+				if err := messageStore.RenameChat(v.JID.String(), v.GroupName.Name); err != nil {
+					logger.Warnf("Failed to store name of joined group %s: %v", v.JID, err)
+				}
+			}
 		case *events.QR:
 			logger.Infof("[*events.QR NOTIFICATION] Received *events.QR notification. QR string should be updated via qrChan handler if a new code is issued.")
 			isWhatsappConnected = false
@@ -987,13 +2340,23 @@ func main() {
 
 // GetChatName determines the appropriate name for a chat based on JID and other info
 func GetChatName(client *whatsmeow.Client, messageStore *MessageStore, jid types.JID, chatJID string, conversation interface{}, sender string, logger waLog.Logger) string {
-	// First, check if chat already exists in database with a name
-	var existingName string
-	err := messageStore.db.QueryRow("SELECT name FROM chats WHERE jid = ?", chatJID).Scan(&existingName)
-	if err == nil && existingName != "" {
-		// Chat exists with a name, use that
-		logger.Infof("Using existing chat name for %s: %s", chatJID, existingName)
-		return existingName
+	cached, fresh, fallback := chatNames.get(chatJID)
+	if fresh {
+		return cached
+	}
+
+	// First, check if chat already exists in database with a name. Skip
+	// this when retrying a failed group lookup: the database only has the
+	// fallback name stored last time.
+	if !fallback {
+		var existingName string
+		err := messageStore.db.QueryRow("SELECT name FROM chats WHERE jid = ?", chatJID).Scan(&existingName)
+		if err == nil && existingName != "" {
+			// Chat exists with a name, use that
+			logger.Debugf("Using existing chat name for %s: %s", chatJID, existingName)
+			chatNames.set(chatJID, existingName, false)
+			return existingName
+		}
 	}
 
 	// Need to determine chat name
@@ -1001,7 +2364,7 @@ func GetChatName(client *whatsmeow.Client, messageStore *MessageStore, jid types
 
 	if jid.Server == "g.us" {
 		// This is a group chat
-		logger.Infof("Getting name for group: %s", chatJID)
+		logger.Debugf("Getting name for group: %s", chatJID)
 
 		// Use conversation data if provided (from history sync)
 		if conversation != nil {
@@ -1040,15 +2403,19 @@ func GetChatName(client *whatsmeow.Client, messageStore *MessageStore, jid types
 			if err == nil && groupInfo.Name != "" {
 				name = groupInfo.Name
 			} else {
-				// Fallback name for groups
+				// Fallback name for groups, kept only briefly so the
+				// lookup is retried
 				name = fmt.Sprintf("Group %s", jid.User)
+				logger.Debugf("Using group name: %s", name)
+				chatNames.set(chatJID, name, true)
+				return name
 			}
 		}
 
-		logger.Infof("Using group name: %s", name)
+		logger.Debugf("Using group name: %s", name)
 	} else {
 		// This is an individual contact
-		logger.Infof("Getting name for contact: %s", chatJID)
+		logger.Debugf("Getting name for contact: %s", chatJID)
 
 		// Just use contact info (full name)
 		contact, err := client.Store.Contacts.GetContact(context.Background(), jid)
@@ -1062,20 +2429,84 @@ func GetChatName(client *whatsmeow.Client, messageStore *MessageStore, jid types
 			name = jid.User
 		}
 
-		logger.Infof("Using contact name: %s", name)
+		logger.Debugf("Using contact name: %s", name)
 	}
 
+	chatNames.set(chatJID, name, false)
 	return name
 }
 
+// Default lifetimes of chat-name cache entries, in seconds
+const (
+	defaultChatNameTTL         = 3600
+	defaultChatNameFallbackTTL = 300
+)
+
+var chatNames = &chatNameCache{
+	entries:     make(map[string]chatNameEntry),
+	ttl:         time.Duration(envInt("CHAT_NAME_CACHE_TTL", defaultChatNameTTL)) * time.Second,
+	fallbackTTL: time.Duration(envInt("CHAT_NAME_FALLBACK_TTL", defaultChatNameFallbackTTL)) * time.Second,
+}
+
+// chatNameCache remembers resolved chat names, so GetChatName doesn't
+// query the chats table (or, for unnamed groups, the server) on every
+// message. Names that came from a failed group lookup are kept for
+// fallbackTTL and then looked up again. There is one entry per chat, so
+// the cache is bounded by the number of chats.
+type chatNameCache struct {
+	mu          sync.Mutex
+	entries     map[string]chatNameEntry
+	ttl         time.Duration
+	fallbackTTL time.Duration
+}
+
+type chatNameEntry struct {
+	name     string
+	expires  time.Time
+	fallback bool
+}
+
+// Cached name for a chat, whether it is still fresh, and whether it is a
+// fallback from a failed lookup
+func (c *chatNameCache) get(chatJID string) (name string, fresh bool, fallback bool) {
+	c.mu.Lock()
+	defer c.mu.Unlock()
+	entry, ok := c.entries[chatJID]
+	if !ok {
+		return "", false, false
+	}
+	return entry.name, time.Now().Before(entry.expires), entry.fallback
+}
+
+func (c *chatNameCache) set(chatJID, name string, fallback bool) {
+	ttl := c.ttl
+	if fallback {
+		ttl = c.fallbackTTL
+	}
+	c.mu.Lock()
+	c.entries[chatJID] = chatNameEntry{name: name, expires: time.Now().Add(ttl), fallback: fallback}
+	c.mu.Unlock()
+}
+
+// Record a group's new name, e.g. from a group-info change event, in the
+// cache and the chats table
+func (store *MessageStore) RenameChat(chatJID, name string) error {
+	chatNames.set(chatJID, name, false)
+	return store.exec("UPDATE chats SET name = ? WHERE jid = ?", name, chatJID)
+}
+
 // Handle history sync events
 func handleHistorySync(client *whatsmeow.Client, messageStore *MessageStore, historySync *events.HistorySync, logger waLog.Logger) {
 	fmt.Printf("Received history sync event with %d conversations\n", len(historySync.Data.Conversations))
+	start := time.Now()
 
-	syncedCount := 0
+	// Resolve chat names before the first batch is opened: GetChatName
+	// may ask the server for group info, and the write transaction must
+	// not be held across network calls
+	names := make(map[string]string)
 	for _, conversation := range historySync.Data.Conversations {
 		// Parse JID from the conversation
-		if conversation.ID == nil {
+		if conversation.ID == nil || len(conversation.Messages) == 0 {
 			continue
 		}
 
@@ -1089,7 +2520,25 @@ func handleHistorySync(client *whatsmeow.Client, messageStore *MessageStore, his
 		}
 
 		// Get appropriate chat name by passing the history sync conversation directly
-		name := GetChatName(client, messageStore, jid, chatJID, conversation, "", logger)
+		names[chatJID] = GetChatName(client, messageStore, jid, chatJID, conversation, "", logger)
+	}
+
+	writer, err := messageStore.newHistoryWriter(historySyncBatchSize)
+	if err != nil {
+		logger.Errorf("History sync: %v", err)
+		return
+	}
+
+	for _, conversation := range historySync.Data.Conversations {
+		if conversation.ID == nil {
+			continue
+		}
+		chatJID := *conversation.ID
+		name, ok := names[chatJID]
+		if !ok {
+			continue
+		}
+		jid, _ := types.ParseJID(chatJID)
 
 		// Process messages
 		messages := conversation.Messages
@@ -1108,7 +2557,9 @@ func handleHistorySync(client *whatsmeow.Client, messageStore *MessageStore, his
 				continue
 			}
 
-			messageStore.StoreChat(chatJID, name, timestamp)
+			if err := writer.StoreChat(chatJID, name, timestamp); err != nil {
+				logger.Warnf("Failed to store history chat %s: %v", chatJID, err)
+			}
 
 			// Store messages
 			for _, msg := range messages {
@@ -1135,9 +2586,6 @@ func handleHistorySync(client *whatsmeow.Client, messageStore *MessageStore, his
 					mediaType, filename, url, mediaKey, fileSHA256, fileEncSHA256, fileLength = extractMediaInfo(msg.Message.Message)
 				}
 
-				// Log the message content for debugging
-				logger.Infof("Message content: %v, Media Type: %v", content, mediaType)
-
 				// Skip messages with no content and no media
 				if content == "" && mediaType == "" {
 					continue
@@ -1175,7 +2623,7 @@ func handleHistorySync(client *whatsmeow.Client, messageStore *MessageStore, his
 					continue
 				}
 
-				err = messageStore.StoreMessage(
+				err = writer.StoreMessage(
 					msgID,
 					chatJID,
 					sender,
@@ -1192,9 +2640,7 @@ func handleHistorySync(client *whatsmeow.Client, messageStore *MessageStore, his
 				)
 				if err != nil {
 					logger.Warnf("Failed to store history message: %v", err)
-				} else {
-					syncedCount++
-					// Log successful message storage
+				} else if historySyncDebug {
 					if mediaType != "" {
 						logger.Infof("Stored message: [%s] %s -> %s: [%s: %s] %s",
 							timestamp.Format("2006-01-02 15:04:05"), sender, chatJID, mediaType, filename, content)
@@ -1207,7 +2653,15 @@ func handleHistorySync(client *whatsmeow.Client, messageStore *MessageStore, his
 		}
 	}
 
-	fmt.Printf("History sync complete. Stored %d messages.\n", syncedCount)
+	if err := writer.Close(); err != nil {
+		logger.Warnf("History sync: %v", err)
+	}
+	messageStore.checkpoint()
+
+	elapsed := time.Since(start)
+	rate := float64(writer.stored) / math.Max(elapsed.Seconds(), 0.001)
+	fmt.Printf("History sync complete. Stored %d messages in %s (%.0f msg/s, %d batches, longest write transaction %s).\n",
+		writer.stored, elapsed.Round(time.Millisecond), rate, writer.batches, writer.longestHold.Round(time.Millisecond))
 }
 
 // Request history sync from the server
@@ -0,0 +1,134 @@
+package main
+
+import (
+	"context"
+	"fmt"
+	"os"
+	"path/filepath"
+	"testing"
+	"time"
+)
+
+const testChatJID = "123456789@s.whatsapp.net"
+
+// Open a MessageStore in a temporary directory, with its archive next to it
+func newTestStore(t *testing.T) *MessageStore {
+	t.Helper()
+	dir := t.TempDir()
+	wd, err := os.Getwd()
+	if err != nil {
+		t.Fatal(err)
+	}
+	if err := os.Chdir(dir); err != nil {
+		t.Fatal(err)
+	}
+	t.Cleanup(func() { os.Chdir(wd) })
+	previousArchive := archiveDBPath
+	archiveDBPath = filepath.Join(dir, "store", "messages_archive.db")
+	t.Cleanup(func() { archiveDBPath = previousArchive })
+
+	store, err := NewMessageStore()
+	if err != nil {
+		t.Fatal(err)
+	}
+	t.Cleanup(func() { store.Close() })
+	return store
+}
+
+// Store count hourly messages ending at newest the way history sync does,
+// newest first, so the oldest messages get the highest rowids
+func storeHistory(t *testing.T, store *MessageStore, count int, newest time.Time) {
+	t.Helper()
+	if err := store.StoreChat(testChatJID, "Test", newest); err != nil {
+		t.Fatal(err)
+	}
+	for i := 0; i < count; i++ {
+		timestamp := newest.Add(-time.Duration(i) * time.Hour)
+		if err := store.StoreMessage(fmt.Sprintf("history-%d", i), testChatJID, "123456789", "hello", timestamp, false,
+			"", "", "", nil, nil, nil, 0); err != nil {
+			t.Fatal(err)
+		}
+	}
+}
+
+func queryInt(t *testing.T, store *MessageStore, query string, args ...interface{}) int64 {
+	t.Helper()
+	var n int64
+	if err := store.db.QueryRow(query, args...).Scan(&n); err != nil {
+		t.Fatalf("%s: %v", query, err)
+	}
+	return n
+}
+
+func TestArchiveKeepsRowidsIncreasing(t *testing.T) {
+	store := newTestStore(t)
+	storeHistory(t, store, 5, time.Now().AddDate(0, 0, -30))
+	top := queryInt(t, store, "SELECT MAX(rowid) FROM messages")
+
+	// Every message is past the cutoff; archiving rolls them up first
+	if err := store.archiveOldMessages(time.Now().AddDate(0, 0, -7), 100); err != nil {
+		t.Fatal(err)
+	}
+	if n := queryInt(t, store, "SELECT COUNT(*) FROM messages"); n != 1 {
+		t.Fatalf("%d messages left after archiving, want the one holding the top rowid", n)
+	}
+
+	if err := store.StoreMessage("live", testChatJID, "123456789", "new", time.Now(), false,
+		"", "", "", nil, nil, nil, 0); err != nil {
+		t.Fatal(err)
+	}
+	if rowid := queryInt(t, store, "SELECT rowid FROM messages WHERE id = 'live'"); rowid <= top {
+		t.Fatalf("new message got rowid %d, want one above %d", rowid, top)
+	}
+	if _, err := store.rollupActivity(); err != nil {
+		t.Fatal(err)
+	}
+	if n := queryInt(t, store, "SELECT messages FROM chat_activity WHERE chat_jid = ?", testChatJID); n != 6 {
+		t.Fatalf("chat_activity counts %d messages, want 6", n)
+	}
+}
+
+func TestRollupsRebuiltAfterRowidReuse(t *testing.T) {
+	store := newTestStore(t)
+	storeHistory(t, store, 5, time.Now().AddDate(0, 0, -30))
+	if err := store.archiveOldMessages(time.Now().AddDate(0, 0, -7), 100); err != nil {
+		t.Fatal(err)
+	}
+
+	// Move the remaining message too, as archiving did before it kept the
+	// top rowid, leaving rollup_state.last_rowid above max(rowid)
+	conn, err := store.db.Conn(context.Background())
+	if err != nil {
+		t.Fatal(err)
+	}
+	for _, query := range []string{
+		"ATTACH DATABASE '" + archiveDBPath + "' AS archive",
+		"INSERT INTO archive.messages (" + archivedColumns + ") SELECT " + archivedColumns + " FROM main.messages",
+		"DELETE FROM main.messages",
+		"DETACH DATABASE archive",
+	} {
+		if _, err := conn.ExecContext(context.Background(), query); err != nil {
+			t.Fatalf("%s: %v", query, err)
+		}
+	}
+	conn.Close()
+
+	if err := store.StoreMessage("live", testChatJID, "123456789", "new", time.Now(), false,
+		"", "", "", nil, nil, nil, 0); err != nil {
+		t.Fatal(err)
+	}
+	if rowid, mark := queryInt(t, store, "SELECT rowid FROM messages WHERE id = 'live'"),
+		queryInt(t, store, "SELECT last_rowid FROM rollup_state"); rowid > mark {
+		t.Fatalf("new message got rowid %d above the rollup mark %d; nothing to rebuild", rowid, mark)
+	}
+
+	if _, err := store.rollupActivity(); err != nil {
+		t.Fatal(err)
+	}
+	if n := queryInt(t, store, "SELECT messages FROM chat_activity WHERE chat_jid = ?", testChatJID); n != 6 {
+		t.Fatalf("chat_activity counts %d messages after the rebuild, want 6", n)
+	}
+	if n := queryInt(t, store, "SELECT SUM(messages) FROM sender_activity WHERE chat_jid = ?", testChatJID); n != 6 {
+		t.Fatalf("sender_activity counts %d messages after the rebuild, want 6", n)
+	}
+}
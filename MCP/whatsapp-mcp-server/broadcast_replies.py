@@ -0,0 +1,217 @@
+"""Who replied to which broadcast, and how quickly.
+
+Every broadcast and its recipients are recorded in a small SQLite database
+of their own (BROADCAST_DB), next to, not inside, the bridge's messages.db.
+When a send goes out, its recipient row gets ``sent_at``.
+
+Replies are correlated incrementally. The store remembers the highest
+messages.db rowid it has looked at. Each pass only considers chats with
+inbound messages above that rowid, and for those recipients finds the first
+inbound message after the send with the (chat_jid, ts) index. A reply counts
+towards the latest broadcast sent to that chat before it, within
+BROADCAST_REPLY_WINDOW_HOURS.
+"""
+import os
+import sqlite3
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        broadcast_id TEXT PRIMARY KEY,
+        created_at INTEGER NOT NULL,
+        message TEXT,
+        recipients INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_broadcasts_created_at ON broadcasts(created_at);
+
+    CREATE TABLE IF NOT EXISTS broadcast_recipients (
+        broadcast_id TEXT NOT NULL,
+        jid TEXT NOT NULL,
+        segment TEXT,
+        sent_at INTEGER,
+        first_reply_at INTEGER,
+        first_reply_id TEXT,
+        PRIMARY KEY (broadcast_id, jid)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_broadcast_recipients_jid ON broadcast_recipients(jid, sent_at);
+
+    CREATE TABLE IF NOT EXISTS correlation_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        messages_rowid INTEGER NOT NULL
+    );
+"""
+
+# Recipients whose chats received new inbound messages get their first reply
+# after the send, within the window and before the next broadcast to them
+CORRELATE_SQL = """
+    UPDATE broadcast_recipients AS r SET (first_reply_at, first_reply_id) = (
+        SELECT m.ts, m.id FROM msgs.messages m
+        WHERE m.chat_jid = r.jid AND NOT m.is_from_me
+        AND m.ts >= r.sent_at AND m.ts < r.sent_at + :window
+        AND NOT EXISTS (
+            SELECT 1 FROM broadcast_recipients n
+            WHERE n.jid = r.jid AND n.sent_at > r.sent_at AND n.sent_at <= m.ts
+        )
+        ORDER BY m.ts LIMIT 1
+    )
+    WHERE r.jid IN (
+        SELECT chat_jid FROM msgs.messages
+        WHERE rowid > :after AND rowid <= :upto AND NOT is_from_me
+    )
+    AND r.first_reply_at IS NULL AND r.sent_at IS NOT NULL
+"""
+
+
+class BroadcastReplies:
+    def __init__(self, db_path: str, messages_db_path: Callable[[], str], reply_window: int):
+        self.db_path = db_path
+        self.messages_db_path = messages_db_path
+        self.reply_window = reply_window
+        self._schema_ready = False
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE serialises correlation passes between the Flask app
+        # and the MCP server, which share the database
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, uri=True)
+        try:
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready = True
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def _attach_messages(self, conn: sqlite3.Connection) -> None:
+        path = os.path.abspath(self.messages_db_path())
+        conn.execute("ATTACH DATABASE ? AS msgs", (f"file:{path}?mode=ro",))
+
+    def record_broadcast(self, broadcast_id: str, message: str, recipients: Iterable[Tuple[str, Optional[str]]]) -> None:
+        """Record a broadcast and its (jid, segment) recipients before anything is sent."""
+        rows = [(broadcast_id, jid, segment) for jid, segment in recipients]
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO broadcasts (broadcast_id, created_at, message, recipients) VALUES (?, ?, ?, ?)",
+                (broadcast_id, int(time.time()), message, len(rows))
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO broadcast_recipients (broadcast_id, jid, segment) VALUES (?, ?, ?)",
+                rows
+            )
+            row = conn.execute("SELECT 1 FROM correlation_state").fetchone()
+            if row is None:
+                # Messages stored before the first broadcast can't be replies to it
+                self._attach_messages(conn)
+                upto = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM msgs.messages").fetchone()[0]
+                conn.execute("INSERT INTO correlation_state (id, messages_rowid) VALUES (1, ?)", (upto,))
+
+    def forget_broadcast(self, broadcast_id: str) -> None:
+        """Remove a broadcast that was recorded but never went out."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM broadcast_recipients WHERE broadcast_id = ?", (broadcast_id,))
+            conn.execute("DELETE FROM broadcasts WHERE broadcast_id = ?", (broadcast_id,))
+
+    def record_sent(self, broadcast_id: str, jid: str, sent_at: Optional[float] = None) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE broadcast_recipients SET sent_at = ? WHERE broadcast_id = ? AND jid = ?",
+                (int(sent_at if sent_at is not None else time.time()), broadcast_id, jid)
+            )
+
+    def correlate(self) -> int:
+        """Match inbound messages stored since the last pass; returns how many recipients were re-checked."""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT messages_rowid FROM correlation_state").fetchone()
+            if row is None:
+                # Nothing has been broadcast yet
+                return 0
+            after = row[0]
+            self._attach_messages(conn)
+            upto = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM msgs.messages").fetchone()[0]
+            if upto < after:
+                # messages.db was replaced; start over from its beginning
+                after = 0
+            if upto == after:
+                return 0
+            found = conn.execute(CORRELATE_SQL, {"after": after, "upto": upto, "window": self.reply_window}).rowcount
+            conn.execute("UPDATE correlation_state SET messages_rowid = ?", (upto,))
+            return found
+
+    def engagement(self, broadcast_id: Optional[str] = None, limit: int = 20, by_segment: bool = False) -> List[Dict[str, Any]]:
+        """Reply rate and time to first reply for one broadcast, or the ``limit`` most recent."""
+        self.correlate()
+        with self._transaction() as conn:
+            if broadcast_id:
+                broadcasts = conn.execute(
+                    "SELECT broadcast_id, created_at, message, recipients FROM broadcasts WHERE broadcast_id = ?",
+                    (broadcast_id,)
+                ).fetchall()
+            else:
+                broadcasts = conn.execute(
+                    "SELECT broadcast_id, created_at, message, recipients FROM broadcasts ORDER BY created_at DESC LIMIT ?",
+                    (limit,)
+                ).fetchall()
+            ids = [b[0] for b in broadcasts]
+            if not ids:
+                return []
+            placeholders = ",".join("?" * len(ids))
+            counts = conn.execute(f"""
+                SELECT broadcast_id, segment, COUNT(sent_at), COUNT(first_reply_at)
+                FROM broadcast_recipients WHERE broadcast_id IN ({placeholders})
+                GROUP BY broadcast_id, segment
+            """, ids).fetchall()
+            delays = conn.execute(f"""
+                SELECT broadcast_id, segment, first_reply_at - sent_at
+                FROM broadcast_recipients
+                WHERE broadcast_id IN ({placeholders}) AND first_reply_at IS NOT NULL
+            """, ids).fetchall()
+
+        # Totals and reply delays per broadcast, and per (broadcast, segment)
+        totals: Dict[tuple, List[int]] = {}
+        waits: Dict[tuple, List[int]] = {}
+        for bid, segment, sent, replied in counts:
+            for key in ((bid,), (bid, segment)):
+                total = totals.setdefault(key, [0, 0])
+                total[0] += sent
+                total[1] += replied
+        for bid, segment, delay in delays:
+            waits.setdefault((bid,), []).append(delay)
+            waits.setdefault((bid, segment), []).append(delay)
+
+        def stats(key: tuple) -> Dict[str, Any]:
+            sent, replied = totals.get(key, (0, 0))
+            delays = waits.get(key)
+            return {
+                "sent": sent,
+                "replied": replied,
+                "reply_rate": replied / sent if sent else None,
+                "median_reply_seconds": statistics.median(delays) if delays else None,
+                "mean_reply_seconds": statistics.fmean(delays) if delays else None,
+            }
+
+        result = []
+        for bid, created_at, message, recipients in broadcasts:
+            entry = {
+                "broadcast_id": bid,
+                "created_at": datetime.fromtimestamp(created_at).astimezone().isoformat(),
+                "message": message,
+                "recipients": recipients,
+                **stats((bid,)),
+            }
+            if by_segment:
+                entry["segments"] = [
+                    {"segment": key[1], **stats(key)}
+                    for key in sorted((k for k in totals if len(k) == 2 and k[0] == bid), key=lambda k: k[1] or "")
+                ]
+            result.append(entry)
+        return result
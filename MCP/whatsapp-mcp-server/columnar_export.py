@@ -0,0 +1,288 @@
+"""Bulk export of messages and chats to columnar files for analysis.
+
+list_messages renders messages as text for reading. This writes them with
+typed columns instead: timestamps as timestamps, flags as booleans, and
+JIDs and media types as categoricals, so activity stats over the whole
+history are vectorized operations in pandas, Polars or NumPy.
+
+Rows are streamed out of SQLite ``chunk_size`` at a time. With pyarrow
+installed the output is Parquet, written one row group per chunk. Without
+it, NumPy ``.npz`` archives are written instead (built in memory and saved
+at the end). Categorical columns are stored as ``<name>_codes`` (int32, -1
+for NULL) plus ``<name>_categories``. Other strings are stored as
+``<name>_data`` (UTF-8 bytes) plus ``<name>_offsets``, so they load without
+pickling. Messages already moved to the archive database are included.
+
+    python columnar_export.py --out exports/ [--db PATH] [--format parquet|npz] [--chat JID] [--after ISO] [--before ISO]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import whatsapp
+from whatsapp import _messages_source, _to_epoch, connect
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Directory the export_history MCP tool may write under
+EXPORT_ROOT = os.environ.get("MCP_EXPORT_ROOT", "exports")
+
+# (column, SQL expression, kind)
+MESSAGE_FIELDS = [
+    ("id", "messages.id", "string"),
+    ("chat_jid", "messages.chat_jid", "category"),
+    ("sender", "messages.sender", "category"),
+    ("timestamp", "messages.ts", "timestamp"),
+    ("is_from_me", "messages.is_from_me", "bool"),
+    ("content", "messages.content", "string"),
+    ("media_type", "messages.media_type", "category"),
+    ("filename", "messages.filename", "string"),
+    ("file_length", "messages.file_length", "int"),
+]
+
+CHAT_FIELDS = [
+    ("jid", "c.jid", "string"),
+    ("name", "c.name", "string"),
+    ("phone", "c.phone", "string"),
+    ("is_group", "c.jid LIKE '%@g.us'", "bool"),
+    ("last_message_time", "COALESCE(s.last_ts, unixepoch(c.last_message_time))", "timestamp"),
+    ("message_count", "COALESCE(s.message_count, 0)", "int"),
+    ("unread_count", "COALESCE(s.unread_count, 0)", "int"),
+]
+
+Field = Tuple[str, str, str]
+
+
+class ExportError(ValueError):
+    """Raised when an export can't be written in the requested format."""
+
+
+class ParquetSink:
+    def __init__(self, path: str, fields: List[Field]):
+        self.fields = fields
+        self.schema = pa.schema([(name, self._arrow_type(kind)) for name, _, kind in fields])
+        self.writer = pq.ParquetWriter(path, self.schema, compression="zstd")
+
+    @staticmethod
+    def _arrow_type(kind: str):
+        return {
+            "string": pa.string(),
+            "category": pa.dictionary(pa.int32(), pa.string()),
+            "timestamp": pa.timestamp("s", tz="UTC"),
+            "bool": pa.bool_(),
+            "int": pa.int64(),
+        }[kind]
+
+    def write(self, columns: List[tuple]) -> None:
+        arrays = []
+        for (_, _, kind), values in zip(self.fields, columns):
+            if kind == "category":
+                arrays.append(pa.array(values, pa.string()).dictionary_encode())
+            elif kind == "bool":
+                # SQLite hands booleans back as 0/1
+                arrays.append(pa.array(values, pa.int8()).cast(pa.bool_()))
+            else:
+                arrays.append(pa.array(values, self._arrow_type(kind)))
+        self.writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class NpzSink:
+    def __init__(self, path: str, fields: List[Field]):
+        self.path = path
+        self.fields = fields
+        self.chunks: Dict[str, list] = {name: [] for name, _, _ in fields}
+        self.categories: Dict[str, Dict[str, int]] = {name: {} for name, _, kind in fields if kind == "category"}
+
+    def write(self, columns: List[tuple]) -> None:
+        for (name, _, kind), values in zip(self.fields, columns):
+            if kind == "category":
+                index = self.categories[name]
+                codes = [-1 if v is None else index.setdefault(v, len(index)) for v in values]
+                self.chunks[name].append(np.array(codes, dtype=np.int32))
+            elif kind == "string":
+                self.chunks[name].append([(v or "").encode("utf-8") for v in values])
+            elif kind == "timestamp":
+                # The smallest int64 is NaT once viewed as datetime64
+                self.chunks[name].append(np.array([np.iinfo(np.int64).min if v is None else v for v in values], dtype=np.int64))
+            elif kind == "bool":
+                self.chunks[name].append(np.array([bool(v) for v in values], dtype=bool))
+            else:
+                self.chunks[name].append(np.array([v or 0 for v in values], dtype=np.int64))
+
+    def close(self) -> None:
+        arrays = {}
+        for name, _, kind in self.fields:
+            chunks = self.chunks[name]
+            if kind == "category":
+                arrays[f"{name}_codes"] = np.concatenate(chunks) if chunks else np.empty(0, np.int32)
+                arrays[f"{name}_categories"] = np.array(list(self.categories[name]), dtype=str)
+            elif kind == "string":
+                encoded = [value for chunk in chunks for value in chunk]
+                offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+                np.cumsum([len(value) for value in encoded], out=offsets[1:])
+                arrays[f"{name}_offsets"] = offsets
+                arrays[f"{name}_data"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+            elif kind == "timestamp":
+                arrays[name] = (np.concatenate(chunks) if chunks else np.empty(0, np.int64)).view("datetime64[s]")
+            else:
+                arrays[name] = np.concatenate(chunks) if chunks else np.empty(0, bool if kind == "bool" else np.int64)
+        with open(self.path, "wb") as f:
+            np.savez(f, **arrays)
+
+
+def _resolve_format(fmt: str) -> str:
+    if fmt == "auto":
+        if pa is not None:
+            return "parquet"
+        if np is not None:
+            return "npz"
+        raise ExportError("Exporting needs pyarrow (Parquet) or numpy (.npz); neither is installed")
+    if fmt == "parquet" and pa is None:
+        raise ExportError("Parquet export needs pyarrow (pip install pyarrow)")
+    if fmt == "npz" and np is None:
+        raise ExportError(".npz export needs numpy (pip install numpy)")
+    if fmt not in ("parquet", "npz"):
+        raise ExportError(f"Unknown export format '{fmt}'; use parquet, npz or auto")
+    return fmt
+
+
+def _parse_time(name: str, value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return _to_epoch(datetime.fromisoformat(value))
+    except ValueError:
+        raise ExportError(f"Invalid date format for '{name}': {value}. Please use ISO-8601 format.")
+
+
+def _export_query(conn: sqlite3.Connection, sql: str, params: list, path: str, fmt: str,
+                  fields: List[Field], chunk_size: int) -> int:
+    # Written beside the destination and moved into place once complete
+    tmp_path = f"{path}.tmp"
+    sink = ParquetSink(tmp_path, fields) if fmt == "parquet" else NpzSink(tmp_path, fields)
+    rows = 0
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            sink.write(list(zip(*chunk)))
+            rows += len(chunk)
+        sink.close()
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return rows
+
+
+def resolve_out_dir(out_dir: str, root: str = EXPORT_ROOT) -> str:
+    """``out_dir`` taken relative to ``root``; raises ExportError if it would end up outside it."""
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, out_dir))
+    if os.path.commonpath([root, path]) != root:
+        raise ExportError(f"out_dir must be inside the export directory {root}")
+    return path
+
+
+def export_history(
+    out_dir: str,
+    fmt: str = "auto",
+    chat_jid: Optional[str] = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Dict[str, Any]:
+    """Write messages and chats under ``out_dir``; returns the files written and their row counts."""
+    fmt = _resolve_format(fmt)
+    after_ts = _parse_time("after", after)
+    before_ts = _parse_time("before", before)
+    os.makedirs(out_dir, exist_ok=True)
+    extension = "parquet" if fmt == "parquet" else "npz"
+    start = time.perf_counter()
+
+    conn = connect()
+    try:
+        where, params = [], []
+        if chat_jid:
+            where.append("messages.chat_jid = ?")
+            params.append(chat_jid)
+        if after_ts is not None:
+            where.append("messages.ts > ?")
+            params.append(after_ts)
+        if before_ts is not None:
+            where.append("messages.ts < ?")
+            params.append(before_ts)
+        messages_sql = (
+            f"SELECT {', '.join(expr for _, expr, _ in MESSAGE_FIELDS)} FROM {_messages_source(conn, after_ts)}"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + " ORDER BY messages.ts"
+        )
+        messages_path = os.path.join(out_dir, f"messages.{extension}")
+        message_rows = _export_query(conn, messages_sql, params, messages_path, fmt, MESSAGE_FIELDS, chunk_size)
+
+        chats_sql = (
+            f"SELECT {', '.join(expr for _, expr, _ in CHAT_FIELDS)} FROM chats c"
+            " LEFT JOIN chat_summary s ON s.chat_jid = c.jid"
+            + (" WHERE c.jid = ?" if chat_jid else "")
+            + " ORDER BY c.jid"
+        )
+        chats_path = os.path.join(out_dir, f"chats.{extension}")
+        chat_rows = _export_query(conn, chats_sql, [chat_jid] if chat_jid else [], chats_path, fmt, CHAT_FIELDS, chunk_size)
+    finally:
+        conn.close()
+
+    return {
+        "format": fmt,
+        "messages": {"path": os.path.abspath(messages_path), "rows": message_rows},
+        "chats": {"path": os.path.abspath(chats_path), "rows": chat_rows},
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export WhatsApp messages and chats to columnar files.")
+    parser.add_argument("--db", default=None, help="messages.db to export (defaults to the bridge's)")
+    parser.add_argument("--out", required=True, help="Directory to write messages.* and chats.* to")
+    parser.add_argument("--format", default="auto", choices=["auto", "parquet", "npz"],
+                        help="Parquet needs pyarrow, npz needs numpy; auto prefers Parquet")
+    parser.add_argument("--chat", default=None, help="Only export this chat JID")
+    parser.add_argument("--after", default=None, help="Only messages after this ISO-8601 time")
+    parser.add_argument("--before", default=None, help="Only messages before this ISO-8601 time")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows read from SQLite at a time")
+    args = parser.parse_args()
+    if args.db:
+        whatsapp.MESSAGES_DB_PATH = args.db
+
+    try:
+        result = export_history(args.out, args.format, args.chat, args.after, args.before, args.chunk_size)
+    except (ExportError, sqlite3.Error) as e:
+        print(f"Export failed: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""In-memory fuzzy index of contacts for search_contacts and autocomplete.
+
+Names are Unicode-folded (accents stripped, case-folded) and split into
+word-anchored trigrams, so "jorg", "Jörg" and "joerg"-style typos still
+share most trigrams with the stored name. Phone numbers are kept in a sorted
+list and matched by prefix with bisect.
+
+The index is built once from the chats table and then refreshed
+incrementally: the bridge writes chats with INSERT OR REPLACE, which gives a
+new or renamed chat a new rowid, so only rows above the last rowid seen are
+read again. Refreshes only happen after PRAGMA data_version changes.
+
+Trigram postings point at distinct folded names rather than contacts, so
+the many chats that share a name are scored once.
+"""
+import bisect
+import heapq
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from data_version import watcher_for
+from instrumentation import connect
+
+# Fraction of a query's trigrams a name must share to count as a match
+MIN_SIMILARITY = 0.4
+
+
+def fold(text: str) -> str:
+    """Lowercase, strip accents and reduce everything but letters and digits to spaces."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in stripped.casefold()).split())
+
+
+def name_trigrams(folded: str) -> Set[str]:
+    # Each word is padded at the start, so prefixes of any word match
+    grams = set()
+    for word in folded.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def query_trigrams(folded: str) -> Set[str]:
+    # No trailing pad: the last word may still be being typed
+    grams = set()
+    for word in folded.split():
+        padded = f"  {word}"
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+@dataclass
+class IndexedContact:
+    jid: str
+    name: Optional[str]
+    phone: Optional[str]
+    folded: str
+    grams: Set[str]
+
+
+class ContactIndex:
+    def __init__(self, db_path: Callable[[], str]):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, path: Optional[str]) -> None:
+        self._path = path
+        self._version: Optional[int] = None
+        self._last_rowid = 0
+        self._contacts: Dict[str, IndexedContact] = {}
+        self._by_name: Dict[str, Set[str]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._phones: List[Tuple[str, str]] = []
+
+    def _remove(self, jid: str) -> None:
+        contact = self._contacts.pop(jid, None)
+        if contact is None:
+            return
+        jids = self._by_name.get(contact.folded)
+        if jids is not None:
+            jids.discard(jid)
+            if not jids:
+                del self._by_name[contact.folded]
+                for gram in contact.grams:
+                    posting = self._postings.get(gram)
+                    if posting is not None:
+                        posting.discard(contact.folded)
+                        if not posting:
+                            del self._postings[gram]
+        if contact.phone:
+            i = bisect.bisect_left(self._phones, (contact.phone, jid))
+            if i < len(self._phones) and self._phones[i] == (contact.phone, jid):
+                del self._phones[i]
+
+    def _add(self, jid: str, name: Optional[str], phone: Optional[str]) -> None:
+        folded = fold(name)
+        contact = IndexedContact(jid, name, phone, folded, name_trigrams(folded))
+        self._contacts[jid] = contact
+        if folded not in self._by_name:
+            self._by_name[folded] = set()
+            for gram in contact.grams:
+                self._postings.setdefault(gram, set()).add(folded)
+        self._by_name[folded].add(jid)
+        if phone:
+            bisect.insort(self._phones, (phone, jid))
+
+    def refresh(self) -> None:
+        """Load chats written since the last refresh, if the database changed."""
+        path = self.db_path()
+        watcher = watcher_for(path)
+        with self._lock:
+            if path != self._path:
+                self._reset(path)
+            version = watcher.version()
+            if version == self._version:
+                return
+            conn = connect(path)
+            try:
+                rows = conn.execute("""
+                    SELECT rowid, jid, name, phone FROM chats
+                    WHERE rowid > ? AND jid NOT LIKE '%@g.us'
+                    ORDER BY rowid
+                """, (self._last_rowid,)).fetchall()
+            finally:
+                conn.close()
+            for rowid, jid, name, phone in rows:
+                self._remove(jid)
+                self._add(jid, name, phone)
+                self._last_rowid = rowid
+            self._version = version
+
+    def search(self, query: str, limit: int = 50) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        """Return up to ``limit`` (jid, name, phone) tuples, best match first."""
+        try:
+            self.refresh()
+        except sqlite3.Error as e:
+            # Serve what is already indexed
+            print(f"Database error while refreshing contact index: {e}")
+
+        folded = fold(query)
+        if not folded:
+            return []
+        digits = folded.replace(" ", "")
+        scores: Counter = Counter()
+
+        with self._lock:
+            if digits.isdigit():
+                # Numbers match by prefix, country code first
+                # An exact match sorts first, so the first ``limit`` will do
+                start = bisect.bisect_left(self._phones, (digits, ""))
+                for phone, jid in self._phones[start:start + limit]:
+                    if not phone.startswith(digits):
+                        break
+                    scores[jid] = 2.0 if phone == digits else 1.5
+
+            grams = query_trigrams(folded)
+            if grams:
+                shared: Counter = Counter()
+                for gram in grams:
+                    shared.update(self._postings.get(gram, ()))
+                # One or two letters are too short to be a typo of anything
+                needed = len(grams) if len(grams) <= 2 else MIN_SIMILARITY * len(grams)
+                name_scores: Dict[str, float] = {}
+                for name, count in shared.items():
+                    if count < needed:
+                        continue
+                    similarity = count / len(grams)
+                    # Whole-name and word-prefix matches rank above fuzzy ones
+                    if name.startswith(folded):
+                        similarity += 0.5
+                    elif f" {folded}" in f" {name}":
+                        similarity += 0.25
+                    name_scores[name] = similarity
+                # Rank names before expanding them to their (possibly many) chats
+                for name, similarity in heapq.nsmallest(limit, name_scores.items(), key=lambda item: (-item[1], item[0])):
+                    for jid in sorted(self._by_name[name])[:limit]:
+                        scores[jid] = max(scores[jid], similarity)
+
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], self._contacts[item[0]].folded, item[0]))
+            return [
+                (jid, self._contacts[jid].name, self._contacts[jid].phone)
+                for jid, _ in ranked[:limit]
+            ]
@@ -0,0 +1,61 @@
+"""Cheap change detection for messages.db.
+
+``PRAGMA data_version`` on a long-lived connection changes whenever another
+connection (the bridge) commits to the database, and reading it touches no
+table pages. A watcher keeps one such connection per database file so
+callers can tell whether anything was written without re-running queries.
+
+The connection is read-only, so watching a database the bridge hasn't
+created yet fails (with sqlite3.OperationalError, until the file appears)
+instead of creating an empty one in its place.
+"""
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from typing import Dict, Optional
+
+
+class DataVersionWatcher:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def version(self) -> int:
+        with self._lock:
+            try:
+                if self._conn is None:
+                    uri = f"file:{urllib.parse.quote(os.path.abspath(self.path))}?mode=ro"
+                    self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+                return self._conn.execute("PRAGMA data_version").fetchone()[0]
+            except sqlite3.Error:
+                # Reopen on the next call, e.g. after the file was replaced
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+                raise
+
+    def wait_for_change(self, since: int, timeout: float, poll_interval: float = 0.2) -> bool:
+        """Block until the version differs from ``since``; False on timeout."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.version() != since:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(poll_interval, remaining))
+
+
+_watchers: Dict[str, DataVersionWatcher] = {}
+_watchers_lock = threading.Lock()
+
+
+def watcher_for(path: str) -> DataVersionWatcher:
+    key = os.path.abspath(path)
+    with _watchers_lock:
+        if key not in _watchers:
+            _watchers[key] = DataVersionWatcher(key)
+        return _watchers[key]
@@ -0,0 +1,346 @@
+"""Timing, SQL tracing and profiling for the MCP tools.
+
+Every tool in main.py is wrapped with ``@instrumented``. While a tool runs,
+connections opened through ``connect()`` record each SQL statement with its
+duration and the rows it returned, and bridge calls made with
+``BRIDGE_HOOKS`` record their latency. When a call is slower than
+MCP_SLOW_TOOL_MS, or one of its statements is slower than
+MCP_SLOW_QUERY_MS, a JSON line describing it is appended to MCP_SLOW_LOG.
+Only numeric and boolean arguments are logged as given; the others are
+reduced to their length.
+
+Profiling is opt-in with MCP_PROFILE:
+
+- ``cprofile`` dumps a pstats file per call
+  (load with ``python -m pstats <file>`` or snakeviz)
+- ``sample`` samples the tool's stack every MCP_PROFILE_INTERVAL_MS and
+  dumps folded stacks per call (feed to flamegraph.pl or speedscope)
+
+Profiles go to MCP_PROFILE_DIR. Nothing is written to stdout, which
+carries the MCP protocol.
+
+Statements that find messages.db locked (a checkpoint, or a bridge still
+using a rollback journal) are retried with backoff for up to
+MESSAGES_DB_BUSY_TIMEOUT_MS. The time spent waiting is recorded per
+statement and passed to ``lock_wait_listeners``.
+"""
+import contextvars
+import cProfile
+import functools
+import inspect
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+SLOW_TOOL_MS = float(os.environ.get("MCP_SLOW_TOOL_MS", 500))
+SLOW_QUERY_MS = float(os.environ.get("MCP_SLOW_QUERY_MS", 100))
+SLOW_LOG_PATH = os.environ.get("MCP_SLOW_LOG", "slow_queries.log")
+PROFILE_MODE = os.environ.get("MCP_PROFILE", "").lower()
+PROFILE_DIR = os.environ.get("MCP_PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.environ.get("MCP_PROFILE_INTERVAL_MS", 5)) / 1000
+BUSY_TIMEOUT = float(os.environ.get("MESSAGES_DB_BUSY_TIMEOUT_MS", 5000)) / 1000
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class Statement:
+    sql: str
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    rows: int = 0
+    lock_wait_ms: float = 0.0
+
+
+@dataclass
+class ToolCall:
+    tool: str
+    statements: Dict[str, Statement] = field(default_factory=dict)
+    bridge_calls: List[Dict[str, Any]] = field(default_factory=list)
+
+    def statement(self, sql: str) -> Statement:
+        # Statements are grouped by text, so the per-row lookups of a
+        # N+1 pattern show up as one entry with a high call count
+        key = _WHITESPACE.sub(" ", sql).strip()
+        if key not in self.statements:
+            self.statements[key] = Statement(key)
+        return self.statements[key]
+
+
+_current_call: contextvars.ContextVar[Optional[ToolCall]] = contextvars.ContextVar("mcp_tool_call", default=None)
+_slow_log_lock = threading.Lock()
+
+# Called with the seconds a statement waited for a lock (e.g. to feed a metric)
+lock_wait_listeners: List[Callable[[float], None]] = []
+
+
+def _is_locked(error: sqlite3.OperationalError) -> bool:
+    message = str(error)
+    return "locked" in message or "busy" in message
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor that charges execute and fetch time to the current tool call.
+
+    SQLite does most of its work while rows are stepped through, so the
+    fetch time is added to the statement that produced the rows.
+    """
+
+    _statement: Optional[Statement] = None
+    _lock_wait = 0.0
+
+    def execute(self, sql, parameters=()):
+        call = _current_call.get()
+        if call is None:
+            return self._execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return self._execute(sql, parameters)
+        finally:
+            self._statement = call.statement(sql)
+            self._statement.calls += 1
+            self._statement.lock_wait_ms += self._lock_wait * 1000
+            self._charge(start, 0)
+
+    def _execute(self, sql, parameters):
+        # Retry while the database is locked, recording the wait in _lock_wait
+        self._lock_wait = 0.0
+        first_failure = None
+        delay = 0.005
+        try:
+            while True:
+                try:
+                    return super().execute(sql, parameters)
+                except sqlite3.OperationalError as e:
+                    if not _is_locked(e):
+                        raise
+                    now = time.perf_counter()
+                    if first_failure is None:
+                        first_failure = now
+                    if now - first_failure >= BUSY_TIMEOUT:
+                        raise
+                    time.sleep(min(delay, BUSY_TIMEOUT - (now - first_failure)))
+                    delay = min(delay * 2, 0.1)
+        finally:
+            if first_failure is not None:
+                self._lock_wait = time.perf_counter() - first_failure
+                for listener in lock_wait_listeners:
+                    listener(self._lock_wait)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._charge(start, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._charge(start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._charge(start, len(rows))
+        return rows
+
+    def _charge(self, start: float, rows: int) -> None:
+        statement = self._statement
+        if statement is None:
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        statement.total_ms += elapsed
+        statement.max_ms = max(statement.max_ms, elapsed)
+        statement.rows += rows
+
+
+class TracedConnection(sqlite3.Connection):
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    # No busy handler: TracedCursor retries itself so the wait can be measured
+    return sqlite3.connect(path, timeout=0, factory=TracedConnection)
+
+
+def _record_bridge_response(response, *args, **kwargs):
+    call = _current_call.get()
+    if call is not None:
+        call.bridge_calls.append({
+            "url": response.url,
+            "status": response.status_code,
+            "ms": round(response.elapsed.total_seconds() * 1000, 3),
+        })
+    return response
+
+
+# Pass as ``hooks=`` to requests calls made to the bridge
+BRIDGE_HOOKS = {"response": _record_bridge_response}
+
+
+def _rows_returned(result: Any) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 1
+
+
+def _loggable_arguments(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    # Numbers and flags (limits, pages, timeouts) are kept. Anything else
+    # may be message text, a search term, a phone number or a path, so the
+    # slow log gets only its length.
+    return {
+        name: value if value is None or isinstance(value, (bool, int, float))
+        else f"<redacted {len(str(value))} chars>"
+        for name, value in kwargs.items()
+    }
+
+
+def _write_slow_log(entry: Dict[str, Any]) -> None:
+    try:
+        with _slow_log_lock, open(SLOW_LOG_PATH, "a") as f:
+            f.write(json.dumps(entry, default=str) + "\n")
+    except OSError as e:
+        print(f"Could not write slow query log: {e}", file=sys.stderr)
+
+
+def _profile_path(tool: str, suffix: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return os.path.join(PROFILE_DIR, f"{tool}-{datetime.now():%Y%m%d-%H%M%S-%f}.{suffix}")
+
+
+class _StackSampler:
+    """Samples one thread's stack on a timer and counts folded stacks."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _run_profiled(tool: str, fn: Callable, args, kwargs) -> Any:
+    if PROFILE_MODE == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(fn, *args, **kwargs)
+        finally:
+            profiler.dump_stats(_profile_path(tool, "prof"))
+    if PROFILE_MODE == "sample":
+        with _StackSampler(threading.get_ident(), PROFILE_INTERVAL) as sampler:
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                sampler.dump(_profile_path(tool, "folded"))
+    return fn(*args, **kwargs)
+
+
+def _finish(call: ToolCall, start: float, kwargs: Dict[str, Any], result: Any, error: Optional[str],
+            check_wall_time: bool = True) -> None:
+    wall_ms = (time.perf_counter() - start) * 1000
+    slowest_ms = max((s.max_ms for s in call.statements.values()), default=0.0)
+    if (not check_wall_time or wall_ms < SLOW_TOOL_MS) and slowest_ms < SLOW_QUERY_MS:
+        return
+    _write_slow_log({
+        "time": datetime.now().isoformat(timespec="milliseconds"),
+        "tool": call.tool,
+        "arguments": _loggable_arguments(kwargs),
+        "wall_ms": round(wall_ms, 3),
+        "sql_ms": round(sum(s.total_ms for s in call.statements.values()), 3),
+        "bridge_ms": round(sum(b["ms"] for b in call.bridge_calls), 3),
+        "lock_wait_ms": round(sum(s.lock_wait_ms for s in call.statements.values()), 3),
+        "rows_returned": _rows_returned(result),
+        "error": error,
+        "statements": [
+            {"sql": s.sql, "calls": s.calls, "total_ms": round(s.total_ms, 3),
+             "max_ms": round(s.max_ms, 3), "rows": s.rows, "lock_wait_ms": round(s.lock_wait_ms, 3)}
+            for s in sorted(call.statements.values(), key=lambda s: s.total_ms, reverse=True)
+        ],
+        "bridge_calls": call.bridge_calls,
+    })
+
+
+def instrumented(fn: Optional[Callable] = None, *, long_poll: bool = False) -> Callable:
+    """Time a tool call, trace its SQL and bridge calls, and log it if slow.
+
+    Async tools are timed and traced too (work they hand to
+    ``asyncio.to_thread`` inherits the call context) but not profiled.
+    Tools that wait on purpose pass ``long_poll=True`` so only their
+    statements, not their wall time, count as slow.
+    """
+    if fn is None:
+        return functools.partial(instrumented, long_poll=long_poll)
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            call = ToolCall(fn.__name__)
+            token = _current_call.set(call)
+            start = time.perf_counter()
+            result = error = None
+            try:
+                result = await fn(*args, **kwargs)
+                return result
+            except Exception as e:
+                error = repr(e)
+                raise
+            finally:
+                _current_call.reset(token)
+                _finish(call, start, kwargs, result, error, check_wall_time=not long_poll)
+
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        call = ToolCall(fn.__name__)
+        token = _current_call.set(call)
+        start = time.perf_counter()
+        result = error = None
+        try:
+            result = _run_profiled(fn.__name__, fn, args, kwargs)
+            return result
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            _current_call.reset(token)
+            _finish(call, start, kwargs, result, error, check_wall_time=not long_poll)
+
+    return wrapper
@@ -1,5 +1,8 @@
+import asyncio
 from typing import List, Dict, Any, Optional
 from mcp.server.fastmcp import FastMCP
+from instrumentation import instrumented
+from columnar_export import ExportError, export_history as columnar_export_history, resolve_out_dir
 from whatsapp import (
     search_contacts as whatsapp_search_contacts,
     list_messages as whatsapp_list_messages,
@@ -8,7 +11,12 @@ from whatsapp import (
     get_direct_chat_by_contact as whatsapp_get_direct_chat_by_contact,
     get_contact_chats as whatsapp_get_contact_chats,
     get_last_interaction as whatsapp_get_last_interaction,
+    get_chat_stats as whatsapp_get_chat_stats,
     get_message_context as whatsapp_get_message_context,
+    get_new_messages as whatsapp_get_new_messages,
+    wait_for_messages as whatsapp_wait_for_messages,
+    get_broadcast_engagement as whatsapp_get_broadcast_engagement,
+    query_cache,
     send_message as whatsapp_send_message,
     send_file as whatsapp_send_file,
     send_audio_message as whatsapp_audio_voice_message,
@@ -19,16 +27,22 @@ from whatsapp import (
 mcp = FastMCP("whatsapp")
 
 @mcp.tool()
-def search_contacts(query: str) -> List[Dict[str, Any]]:
-    """Search WhatsApp contacts by name or phone number.
+@instrumented
+def search_contacts(query: str, limit: int = 50) -> List[Dict[str, Any]]:
+    """Search WhatsApp contacts by name or phone number, best matches first.
+    
+    Names match despite accents and small typos; numbers match from the start
+    (country code first).
     
     Args:
         query: Search term to match against contact names or phone numbers
+        limit: Maximum number of contacts to return (default 50)
     """
-    contacts = whatsapp_search_contacts(query)
+    contacts = whatsapp_search_contacts(query, limit)
     return contacts
 
 @mcp.tool()
+@instrumented
 def list_messages(
     after: Optional[str] = None,
     before: Optional[str] = None,
@@ -70,6 +84,7 @@ def list_messages(
     return messages
 
 @mcp.tool()
+@instrumented
 def list_chats(
     query: Optional[str] = None,
     limit: int = 20,
@@ -96,6 +111,7 @@ def list_chats(
     return chats
 
 @mcp.tool()
+@instrumented
 def get_chat(chat_jid: str, include_last_message: bool = True) -> Dict[str, Any]:
     """Get WhatsApp chat metadata by JID.
     
@@ -107,6 +123,7 @@ def get_chat(chat_jid: str, include_last_message: bool = True) -> Dict[str, Any]
     return chat
 
 @mcp.tool()
+@instrumented
 def get_direct_chat_by_contact(sender_phone_number: str) -> Dict[str, Any]:
     """Get WhatsApp chat metadata by sender phone number.
     
@@ -117,6 +134,7 @@ def get_direct_chat_by_contact(sender_phone_number: str) -> Dict[str, Any]:
     return chat
 
 @mcp.tool()
+@instrumented
 def get_contact_chats(jid: str, limit: int = 20, page: int = 0) -> List[Dict[str, Any]]:
     """Get all WhatsApp chats involving the contact.
     
@@ -129,6 +147,20 @@ def get_contact_chats(jid: str, limit: int = 20, page: int = 0) -> List[Dict[str
     return chats
 
 @mcp.tool()
+@instrumented
+def get_chat_stats(chat_jid: str, days: Optional[int] = 30, top_senders: int = 10) -> Optional[Dict[str, Any]]:
+    """Get activity stats for a WhatsApp chat: message and media counts, first and last activity, and its most active senders.
+    
+    Args:
+        chat_jid: The JID of the chat
+        days: Only count the last N days (UTC, today included) and add a per-day breakdown; None or 0 for all time (default 30)
+        top_senders: Number of most active senders to return (default 10)
+    """
+    stats = whatsapp_get_chat_stats(chat_jid, days, top_senders)
+    return stats
+
+@mcp.tool()
+@instrumented
 def get_last_interaction(jid: str) -> str:
     """Get most recent WhatsApp message involving the contact.
     
@@ -139,6 +171,7 @@ def get_last_interaction(jid: str) -> str:
     return message
 
 @mcp.tool()
+@instrumented
 def get_message_context(
     message_id: str,
     before: int = 5,
@@ -155,6 +188,102 @@ def get_message_context(
     return context
 
 @mcp.tool()
+@instrumented
+def get_new_messages(
+    cursor: Optional[int] = None,
+    chat_jid: Optional[str] = None,
+    limit: int = 100
+) -> Dict[str, Any]:
+    """Get WhatsApp messages received since a cursor, oldest first.
+
+    Call without a cursor to get the current position, then pass the returned
+    cursor back on each call to receive only messages stored since.
+
+    Args:
+        cursor: Cursor returned by a previous call (omit to start from now)
+        chat_jid: Optional chat JID to only return messages from that chat
+        limit: Maximum number of messages to return (default 100)
+    """
+    feed = whatsapp_get_new_messages(cursor, chat_jid, limit)
+    return feed
+
+@mcp.tool()
+@instrumented(long_poll=True)
+async def wait_for_messages(
+    cursor: Optional[int] = None,
+    chat_jid: Optional[str] = None,
+    timeout: float = 30,
+    limit: int = 100
+) -> Dict[str, Any]:
+    """Wait for new WhatsApp messages after a cursor, e.g. to watch for replies.
+
+    Returns as soon as at least one new message is stored, or with an empty
+    list when the timeout expires. Pass the returned cursor to the next call.
+
+    Args:
+        cursor: Cursor returned by a previous call (omit to start from now)
+        chat_jid: Optional chat JID to only wait for messages from that chat
+        timeout: Maximum seconds to wait, capped at 300 (default 30)
+        limit: Maximum number of messages to return (default 100)
+    """
+    feed = await asyncio.to_thread(whatsapp_wait_for_messages, cursor, chat_jid, min(timeout, 300), limit)
+    return feed
+
+@mcp.tool()
+@instrumented
+def get_broadcast_engagement(
+    broadcast_id: Optional[str] = None,
+    limit: int = 20,
+    by_segment: bool = False
+) -> List[Dict[str, Any]]:
+    """Get reply rates and time to first reply for club broadcasts.
+
+    A recipient counts as replying when they message back within the reply
+    window and before the next broadcast to them.
+
+    Args:
+        broadcast_id: Optional broadcast ID to report on (omit for the most recent broadcasts)
+        limit: Maximum number of broadcasts to report on when no ID is given (default 20)
+        by_segment: Whether to also break each broadcast down by member segment (default False)
+    """
+    return whatsapp_get_broadcast_engagement(broadcast_id, limit, by_segment)
+
+@mcp.tool()
+@instrumented
+async def export_history(
+    out_dir: str = ".",
+    format: str = "auto",
+    chat_jid: Optional[str] = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None
+) -> Dict[str, Any]:
+    """Export WhatsApp messages and chats to columnar files for bulk analysis.
+
+    Writes messages.<ext> and chats.<ext> with typed columns (timestamps,
+    booleans, categorical JIDs) instead of formatted text. Use this rather
+    than paging through list_messages when computing stats over history.
+
+    Args:
+        out_dir: Directory to write the files to, relative to the server's export directory (default: that directory)
+        format: "parquet" (needs pyarrow), "npz" (needs numpy) or "auto" (default)
+        chat_jid: Optional chat JID to only export that chat
+        after: Optional ISO-8601 formatted string to only export messages after this date
+        before: Optional ISO-8601 formatted string to only export messages before this date
+    """
+    try:
+        out_dir = resolve_out_dir(out_dir)
+        result = await asyncio.to_thread(columnar_export_history, out_dir, format, chat_jid, after, before)
+    except ExportError as e:
+        return {"success": False, "message": str(e)}
+    return {"success": True, **result}
+
+@mcp.tool()
+def get_query_cache_stats() -> Dict[str, Any]:
+    """Get hit/miss statistics for the in-memory cache of WhatsApp read queries."""
+    return query_cache.stats()
+
+@mcp.tool()
+@instrumented
 def send_message(
     recipient: str,
     message: str
@@ -184,6 +313,7 @@ def send_message(
     }
 
 @mcp.tool()
+@instrumented
 def send_file(recipient: str, media_path: str) -> Dict[str, Any]:
     """Send a file such as a picture, raw audio, video or document via WhatsApp to the specified recipient. For group messages use the JID.
     
@@ -204,6 +334,7 @@ def send_file(recipient: str, media_path: str) -> Dict[str, Any]:
     }
 
 @mcp.tool()
+@instrumented
 def send_audio_message(recipient: str, media_path: str) -> Dict[str, Any]:
     """Send any audio file as a WhatsApp audio message to the specified recipient. For group messages use the JID. If it errors due to ffmpeg not being installed, use send_file instead.
     
@@ -222,6 +353,7 @@ def send_audio_message(recipient: str, media_path: str) -> Dict[str, Any]:
     }
 
 @mcp.tool()
+@instrumented
 def download_media(message_id: str, chat_jid: str) -> Dict[str, Any]:
     """Download media from a WhatsApp message and get the local file path.
     
@@ -0,0 +1,107 @@
+"""In-memory LRU cache for the read functions in whatsapp.py.
+
+Entries are keyed by function and arguments and are valid for one
+``PRAGMA data_version`` of messages.db: as soon as the bridge commits a
+write, the next lookup sees a new version and drops every entry. Entries
+also expire after ``ttl`` seconds, so an error result (the read functions
+return an empty list on database errors) isn't served for long.
+
+Cached values are shared between callers and must not be mutated.
+"""
+import functools
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from data_version import watcher_for
+
+_MISSING = object()
+
+
+class QueryCache:
+    def __init__(self, db_path: Callable[[], str], max_entries: int, ttl: float, max_result_items: int):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # Very large results would pin memory for little benefit
+        self.max_result_items = max_result_items
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._version: Optional[Tuple[str, int]] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _current_version(self) -> Optional[Tuple[str, int]]:
+        path = self.db_path()
+        try:
+            return path, watcher_for(path).version()
+        except sqlite3.Error:
+            return None
+
+    def _get(self, key: Hashable, version: Tuple[str, int]) -> Any:
+        with self._lock:
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _put(self, key: Hashable, version: Tuple[str, int], value: Any) -> None:
+        if isinstance(value, (list, tuple)) and len(value) > self.max_result_items:
+            return
+        with self._lock:
+            # A write landed while the query ran; the result may already be stale
+            if version != self._version:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def cached(self, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if self.max_entries <= 0:
+                return fn(*args, **kwargs)
+            version = self._current_version()
+            if version is None:
+                return fn(*args, **kwargs)
+            try:
+                key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+                hash(key)
+            except TypeError:
+                return fn(*args, **kwargs)
+            value = self._get(key, version)
+            if value is _MISSING:
+                value = fn(*args, **kwargs)
+                self._put(key, version, value)
+            return value
+
+        return wrapper
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
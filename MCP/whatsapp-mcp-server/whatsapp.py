@@ -1,15 +1,45 @@
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from dataclasses import dataclass
-from typing import Optional, List, Tuple
+from typing import Any, Optional, List, Tuple, Dict
 import os.path
 import requests
 import json
+import time
 import audio
+from data_version import watcher_for
+from query_cache import QueryCache
+from contact_index import ContactIndex
+from broadcast_replies import BroadcastReplies
+from instrumentation import BRIDGE_HOOKS, connect as traced_connect
 
 MESSAGES_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'whatsapp-bridge', 'store', 'messages.db')
 WHATSAPP_API_BASE_URL = "http://localhost:8082/api"
 
+# (connect, read) timeouts for bridge API calls. Recipient checks run inside
+# the broadcast request, so they get a shorter read timeout of their own.
+BRIDGE_CONNECT_TIMEOUT = float(os.environ.get("BRIDGE_CONNECT_TIMEOUT", 5))
+BRIDGE_TIMEOUT = (BRIDGE_CONNECT_TIMEOUT, float(os.environ.get("BRIDGE_READ_TIMEOUT", 60)))
+RECIPIENT_CHECK_TIMEOUT = (BRIDGE_CONNECT_TIMEOUT, float(os.environ.get("RECIPIENT_CHECK_TIMEOUT", 15)))
+
+# Read results are served from memory until the bridge writes to the database
+query_cache = QueryCache(
+    lambda: MESSAGES_DB_PATH,
+    max_entries=int(os.environ.get("QUERY_CACHE_SIZE", 256)),
+    ttl=float(os.environ.get("QUERY_CACHE_TTL", 60)),
+    max_result_items=int(os.environ.get("QUERY_CACHE_MAX_RESULT_ITEMS", 1000))
+)
+
+# Contacts are searched in memory; the index follows writes to the chats table
+contact_index = ContactIndex(lambda: MESSAGES_DB_PATH)
+
+# Broadcast recipients and who replied, shared with the Flask app that sends them
+broadcast_replies = BroadcastReplies(
+    os.environ.get("BROADCAST_DB") or os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'broadcasts.db'),
+    lambda: MESSAGES_DB_PATH,
+    reply_window=int(float(os.environ.get("BROADCAST_REPLY_WINDOW_HOURS", 72)) * 3600)
+)
+
 @dataclass
 class Message:
     timestamp: datetime
@@ -29,6 +59,8 @@ class Chat:
     last_message: Optional[str] = None
     last_sender: Optional[str] = None
     last_is_from_me: Optional[bool] = None
+    message_count: Optional[int] = None
+    unread_count: Optional[int] = None
 
     @property
     def is_group(self) -> bool:
@@ -47,9 +79,85 @@ class MessageContext:
     before: List[Message]
     after: List[Message]
 
+@dataclass
+class MessageFeed:
+    cursor: int
+    messages: List[Message]
+
+def normalize_phone(value: str) -> Optional[str]:
+    """Reduce a phone number or user JID to the digits stored in chats.phone.
+
+    Accepts "+34 600-123-456", "0034600123456", "34600123456@s.whatsapp.net"
+    and device JIDs ("34600123456:12@s.whatsapp.net"); returns None when
+    there are no digits.
+    """
+    if not value:
+        return None
+    user = value.split('@')[0].split(':')[0].split('.')[0].strip()
+    if user.startswith('00'):
+        user = user[2:]
+    digits = ''.join(ch for ch in user if ch.isdigit())
+    return digits or None
+
+def _phone_prefix_range(prefix: str) -> Tuple[str, str]:
+    # ':' sorts right after '9', so [prefix, prefix + ':') covers every
+    # number starting with prefix and can use idx_chats_phone
+    return prefix, prefix + ':'
+
+def connect() -> sqlite3.Connection:
+    """Open the messages database; statements are traced while a tool runs."""
+    return traced_connect(MESSAGES_DB_PATH)
+
+# Columns shared by the hot and archived messages tables
+MESSAGE_COLUMNS = "id, chat_jid, sender, content, timestamp, is_from_me, media_type, filename, url, media_key, file_sha256, file_enc_sha256, file_length, ts"
+
+def _to_epoch(value: datetime) -> int:
+    # Naive datetimes are local time, like the bridge's own timestamps
+    return int(value.timestamp())
+
+def _from_epoch(ts: int) -> datetime:
+    return datetime.fromtimestamp(ts).astimezone()
+
+def archive_db_path() -> str:
+    """Where the bridge moves messages past MESSAGE_RETENTION_DAYS."""
+    return os.environ.get("MESSAGES_ARCHIVE_DB") or os.path.join(os.path.dirname(MESSAGES_DB_PATH), 'messages_archive.db')
+
+def _contact_jid(jid: str) -> str:
+    # chat_participants keys contacts by JID; accept a bare user as well
+    return jid if '@' in jid else f"{jid}@s.whatsapp.net"
+
+def _archived_through(conn: sqlite3.Connection) -> Optional[int]:
+    # Newest archived timestamp (Unix seconds), or None when nothing has been archived
+    try:
+        row = conn.execute("SELECT archived_through_ts FROM retention_state").fetchone()
+    except sqlite3.OperationalError:
+        # Database from before the retention migration
+        return None
+    return row[0] if row else None
+
+def _messages_source(conn: sqlite3.Connection, after: Optional[int] = None, alias: str = "messages") -> str:
+    """Table expression, named ``alias``, to select messages newer than ``after`` (Unix seconds) from.
+
+    The hot table alone, unless the range reaches into the archive: then the
+    archive database is attached to ``conn`` and unioned in, so callers'
+    queries work unchanged.
+    """
+    hot = "messages" if alias == "messages" else f"messages AS {alias}"
+    archived_through = _archived_through(conn)
+    if archived_through is None or (after is not None and after > archived_through):
+        return hot
+    path = archive_db_path()
+    if not os.path.isfile(path):
+        return hot
+    if "archive" not in [row[1] for row in conn.execute("PRAGMA database_list")]:
+        conn.execute("ATTACH DATABASE ? AS archive", (path,))
+    return (f"(SELECT {MESSAGE_COLUMNS} FROM main.messages "
+            f"UNION ALL SELECT {MESSAGE_COLUMNS} FROM archive.messages) AS {alias}")
+
+@query_cache.cached
 def get_sender_name(sender_jid: str) -> str:
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = connect()
         cursor = conn.cursor()
         
         # First try matching by exact JID
@@ -62,22 +170,18 @@ def get_sender_name(sender_jid: str) -> str:
         
         result = cursor.fetchone()
         
-        # If no result, try looking for the number within JIDs
+        # Senders are usually stored as bare numbers; match the contact's number exactly
         if not result:
-            # Extract the phone number part if it's a JID
-            if '@' in sender_jid:
-                phone_part = sender_jid.split('@')[0]
-            else:
-                phone_part = sender_jid
+            phone = normalize_phone(sender_jid)
+            if phone:
+                cursor.execute("""
+                    SELECT name
+                    FROM chats
+                    WHERE phone = ?
+                    LIMIT 1
+                """, (phone,))
                 
-            cursor.execute("""
-                SELECT name
-                FROM chats
-                WHERE jid LIKE ?
-                LIMIT 1
-            """, (f"%{phone_part}%",))
-            
-            result = cursor.fetchone()
+                result = cursor.fetchone()
         
         if result and result[0]:
             return result[0]
@@ -121,6 +225,7 @@ def format_messages_list(messages: List[Message], show_chat_info: bool = True) -
         output += format_message(message, show_chat_info)
     return output
 
+@query_cache.cached
 def list_messages(
     after: Optional[str] = None,
     before: Optional[str] = None,
@@ -135,12 +240,9 @@ def list_messages(
 ) -> List[Message]:
     """Get messages matching the specified criteria with optional context."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = connect()
         cursor = conn.cursor()
         
-        # Build base query
-        query_parts = ["SELECT messages.timestamp, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type FROM messages"]
-        query_parts.append("JOIN chats ON messages.chat_jid = chats.jid")
         where_clauses = []
         params = []
         
@@ -151,7 +253,8 @@ def list_messages(
             except ValueError:
                 raise ValueError(f"Invalid date format for 'after': {after}. Please use ISO-8601 format.")
             
-            where_clauses.append("messages.timestamp > ?")
+            after = _to_epoch(after)
+            where_clauses.append("messages.ts > ?")
             params.append(after)
 
         if before:
@@ -160,12 +263,12 @@ def list_messages(
             except ValueError:
                 raise ValueError(f"Invalid date format for 'before': {before}. Please use ISO-8601 format.")
             
-            where_clauses.append("messages.timestamp < ?")
-            params.append(before)
+            where_clauses.append("messages.ts < ?")
+            params.append(_to_epoch(before))
 
         if sender_phone_number:
             where_clauses.append("messages.sender = ?")
-            params.append(sender_phone_number)
+            params.append(normalize_phone(sender_phone_number) or sender_phone_number)
             
         if chat_jid:
             where_clauses.append("messages.chat_jid = ?")
@@ -174,13 +277,17 @@ def list_messages(
         if query:
             where_clauses.append("LOWER(messages.content) LIKE LOWER(?)")
             params.append(f"%{query}%")
+        
+        # Build base query; old messages may be in the archive
+        query_parts = [f"SELECT messages.ts, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type FROM {_messages_source(conn, after)}"]
+        query_parts.append("JOIN chats ON messages.chat_jid = chats.jid")
             
         if where_clauses:
             query_parts.append("WHERE " + " AND ".join(where_clauses))
             
         # Add pagination
         offset = page * limit
-        query_parts.append("ORDER BY messages.timestamp DESC")
+        query_parts.append("ORDER BY messages.ts DESC")
         query_parts.append("LIMIT ? OFFSET ?")
         params.extend([limit, offset])
         
@@ -190,7 +297,7 @@ def list_messages(
         result = []
         for msg in messages:
             message = Message(
-                timestamp=datetime.fromisoformat(msg[0]),
+                timestamp=_from_epoch(msg[0]),
                 sender=msg[1],
                 chat_name=msg[2],
                 content=msg[3],
@@ -223,6 +330,7 @@ def list_messages(
             conn.close()
 
 
+@query_cache.cached
 def get_message_context(
     message_id: str,
     before: int = 5,
@@ -230,23 +338,29 @@ def get_message_context(
 ) -> MessageContext:
     """Get context around a specific message."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = connect()
         cursor = conn.cursor()
         
-        # Get the target message first
-        cursor.execute("""
-            SELECT messages.timestamp, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.chat_jid, messages.media_type
-            FROM messages
+        # Get the target message first, from the archive if it isn't hot
+        target_query = """
+            SELECT messages.ts, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.chat_jid, messages.media_type
+            FROM {source}
             JOIN chats ON messages.chat_jid = chats.jid
             WHERE messages.id = ?
-        """, (message_id,))
+        """
+        cursor.execute(target_query.format(source="messages"), (message_id,))
         msg_data = cursor.fetchone()
+        if not msg_data:
+            source = _messages_source(conn)
+            if source != "messages":
+                cursor.execute(target_query.format(source=source), (message_id,))
+                msg_data = cursor.fetchone()
         
         if not msg_data:
             raise ValueError(f"Message with ID {message_id} not found")
             
         target_message = Message(
-            timestamp=datetime.fromisoformat(msg_data[0]),
+            timestamp=_from_epoch(msg_data[0]),
             sender=msg_data[1],
             chat_name=msg_data[2],
             content=msg_data[3],
@@ -256,20 +370,27 @@ def get_message_context(
             media_type=msg_data[8]
         )
         
-        # Get messages before
-        cursor.execute("""
-            SELECT messages.timestamp, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type
-            FROM messages
+        # Get messages before, reaching into the archive if the hot table runs out
+        before_query = """
+            SELECT messages.ts, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type
+            FROM {source}
             JOIN chats ON messages.chat_jid = chats.jid
-            WHERE messages.chat_jid = ? AND messages.timestamp < ?
-            ORDER BY messages.timestamp DESC
+            WHERE messages.chat_jid = ? AND messages.ts < ?
+            ORDER BY messages.ts DESC
             LIMIT ?
-        """, (msg_data[7], msg_data[0], before))
+        """
+        cursor.execute(before_query.format(source="messages"), (msg_data[7], msg_data[0], before))
+        rows = cursor.fetchall()
+        if len(rows) < before:
+            source = _messages_source(conn)
+            if source != "messages":
+                cursor.execute(before_query.format(source=source), (msg_data[7], msg_data[0], before))
+                rows = cursor.fetchall()
         
         before_messages = []
-        for msg in cursor.fetchall():
+        for msg in rows:
             before_messages.append(Message(
-                timestamp=datetime.fromisoformat(msg[0]),
+                timestamp=_from_epoch(msg[0]),
                 sender=msg[1],
                 chat_name=msg[2],
                 content=msg[3],
@@ -279,20 +400,20 @@ def get_message_context(
                 media_type=msg[7]
             ))
         
-        # Get messages after
-        cursor.execute("""
-            SELECT messages.timestamp, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type
-            FROM messages
+        # Get messages after; archived ones only matter when the target is old
+        cursor.execute(f"""
+            SELECT messages.ts, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type
+            FROM {_messages_source(conn, msg_data[0])}
             JOIN chats ON messages.chat_jid = chats.jid
-            WHERE messages.chat_jid = ? AND messages.timestamp > ?
-            ORDER BY messages.timestamp ASC
+            WHERE messages.chat_jid = ? AND messages.ts > ?
+            ORDER BY messages.ts ASC
             LIMIT ?
         """, (msg_data[7], msg_data[0], after))
         
         after_messages = []
         for msg in cursor.fetchall():
             after_messages.append(Message(
-                timestamp=datetime.fromisoformat(msg[0]),
+                timestamp=_from_epoch(msg[0]),
                 sender=msg[1],
                 chat_name=msg[2],
                 content=msg[3],
@@ -316,6 +437,20 @@ def get_message_context(
             conn.close()
 
 
+def _chat_from_summary_row(row: tuple, include_last_message: bool = True) -> Chat:
+    """Build a Chat from (jid, name, last time, last content, last sender, last is_from_me, counts...)."""
+    return Chat(
+        jid=row[0],
+        name=row[1],
+        last_message_time=datetime.fromisoformat(row[2]) if row[2] else None,
+        last_message=row[3] if include_last_message else None,
+        last_sender=row[4] if include_last_message else None,
+        last_is_from_me=row[5] if include_last_message else None,
+        message_count=row[6],
+        unread_count=row[7]
+    )
+
+@query_cache.cached
 def list_chats(
     query: Optional[str] = None,
     limit: int = 20,
@@ -325,26 +460,24 @@ def list_chats(
 ) -> List[Chat]:
     """Get chats matching the specified criteria."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = connect()
         cursor = conn.cursor()
         
-        # Build base query
+        # chat_summary has a row per chat with its last message, kept
+        # current by the bridge, so no join against messages is needed
         query_parts = ["""
             SELECT 
                 chats.jid,
                 chats.name,
-                chats.last_message_time,
-                messages.content as last_message,
-                messages.sender as last_sender,
-                messages.is_from_me as last_is_from_me
-            FROM chats
+                COALESCE(chat_summary.last_message_time, chats.last_message_time),
+                chat_summary.last_content as last_message,
+                chat_summary.last_sender as last_sender,
+                chat_summary.last_is_from_me as last_is_from_me,
+                chat_summary.message_count,
+                chat_summary.unread_count
+            FROM chat_summary
+            JOIN chats ON chats.jid = chat_summary.chat_jid
         """]
-        
-        if include_last_message:
-            query_parts.append("""
-                LEFT JOIN messages ON chats.jid = messages.chat_jid 
-                AND chats.last_message_time = messages.timestamp
-            """)
             
         where_clauses = []
         params = []
@@ -357,7 +490,7 @@ def list_chats(
             query_parts.append("WHERE " + " AND ".join(where_clauses))
             
         # Add sorting
-        order_by = "chats.last_message_time DESC" if sort_by == "last_active" else "chats.name"
+        order_by = "chat_summary.last_ts DESC" if sort_by == "last_active" else "chats.name"
         query_parts.append(f"ORDER BY {order_by}")
         
         # Add pagination
@@ -370,14 +503,7 @@ def list_chats(
         
         result = []
         for chat_data in chats:
-            chat = Chat(
-                jid=chat_data[0],
-                name=chat_data[1],
-                last_message_time=datetime.fromisoformat(chat_data[2]) if chat_data[2] else None,
-                last_message=chat_data[3],
-                last_sender=chat_data[4],
-                last_is_from_me=chat_data[5]
-            )
+            chat = _chat_from_summary_row(chat_data, include_last_message)
             result.append(chat)
             
         return result
@@ -390,48 +516,15 @@ def list_chats(
             conn.close()
 
 
-def search_contacts(query: str) -> List[Contact]:
-    """Search contacts by name or phone number."""
-    try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
-        cursor = conn.cursor()
-        
-        # Split query into characters to support partial matching
-        search_pattern = '%' +query + '%'
-        
-        cursor.execute("""
-            SELECT DISTINCT 
-                jid,
-                name
-            FROM chats
-            WHERE 
-                (LOWER(name) LIKE LOWER(?) OR LOWER(jid) LIKE LOWER(?))
-                AND jid NOT LIKE '%@g.us'
-            ORDER BY name, jid
-            LIMIT 50
-        """, (search_pattern, search_pattern))
-        
-        contacts = cursor.fetchall()
-        
-        result = []
-        for contact_data in contacts:
-            contact = Contact(
-                phone_number=contact_data[0].split('@')[0],
-                name=contact_data[1],
-                jid=contact_data[0]
-            )
-            result.append(contact)
-            
-        return result
-        
-    except sqlite3.Error as e:
-        print(f"Database error: {e}")
-        return []
-    finally:
-        if 'conn' in locals():
-            conn.close()
+def search_contacts(query: str, limit: int = 50) -> List[Contact]:
+    """Search contacts by name (typo- and accent-tolerant) or phone number prefix."""
+    return [
+        Contact(phone_number=phone or jid.split('@')[0], name=name, jid=jid)
+        for jid, name, phone in contact_index.search(query, limit)
+    ]
 
 
+@query_cache.cached
 def get_contact_chats(jid: str, limit: int = 20, page: int = 0) -> List[Chat]:
     """Get all chats involving the contact.
     
@@ -441,39 +534,28 @@ def get_contact_chats(jid: str, limit: int = 20, page: int = 0) -> List[Chat]:
         page: Page number for pagination (default 0)
     """
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = connect()
         cursor = conn.cursor()
         
         cursor.execute("""
-            SELECT DISTINCT
+            SELECT 
                 c.jid,
                 c.name,
-                c.last_message_time,
-                m.content as last_message,
-                m.sender as last_sender,
-                m.is_from_me as last_is_from_me
-            FROM chats c
-            JOIN messages m ON c.jid = m.chat_jid
-            WHERE m.sender = ? OR c.jid = ?
-            ORDER BY c.last_message_time DESC
+                COALESCE(s.last_message_time, c.last_message_time),
+                s.last_content as last_message,
+                s.last_sender as last_sender,
+                s.last_is_from_me as last_is_from_me,
+                s.message_count,
+                s.unread_count
+            FROM chat_participants p
+            JOIN chats c ON c.jid = p.chat_jid
+            LEFT JOIN chat_summary s ON s.chat_jid = c.jid
+            WHERE p.contact_jid = ?
+            ORDER BY COALESCE(s.last_ts, unixepoch(c.last_message_time)) DESC
             LIMIT ? OFFSET ?
-        """, (jid, jid, limit, page * limit))
+        """, (_contact_jid(jid), limit, page * limit))
         
-        chats = cursor.fetchall()
-        
-        result = []
-        for chat_data in chats:
-            chat = Chat(
-                jid=chat_data[0],
-                name=chat_data[1],
-                last_message_time=datetime.fromisoformat(chat_data[2]) if chat_data[2] else None,
-                last_message=chat_data[3],
-                last_sender=chat_data[4],
-                last_is_from_me=chat_data[5]
-            )
-            result.append(chat)
-            
-        return result
+        return [_chat_from_summary_row(row) for row in cursor.fetchall()]
         
     except sqlite3.Error as e:
         print(f"Database error: {e}")
@@ -483,15 +565,27 @@ def get_contact_chats(jid: str, limit: int = 20, page: int = 0) -> List[Chat]:
             conn.close()
 
 
+@query_cache.cached
 def get_last_interaction(jid: str) -> str:
     """Get most recent message involving the contact."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = connect()
         cursor = conn.cursor()
         
         cursor.execute("""
+            SELECT chat_jid, last_message_id FROM chat_participants
+            WHERE contact_jid = ?
+            ORDER BY last_ts DESC
+            LIMIT 1
+        """, (_contact_jid(jid),))
+        participation = cursor.fetchone()
+        
+        if not participation:
+            return None
+        
+        message_query = """
             SELECT 
-                m.timestamp,
+                m.ts,
                 m.sender,
                 c.name,
                 m.content,
@@ -499,20 +593,25 @@ def get_last_interaction(jid: str) -> str:
                 c.jid,
                 m.id,
                 m.media_type
-            FROM messages m
+            FROM {source}
             JOIN chats c ON m.chat_jid = c.jid
-            WHERE m.sender = ? OR c.jid = ?
-            ORDER BY m.timestamp DESC
-            LIMIT 1
-        """, (jid, jid))
-        
+            WHERE m.id = ? AND m.chat_jid = ?
+        """
+        cursor.execute(message_query.format(source="messages AS m"), (participation[1], participation[0]))
         msg_data = cursor.fetchone()
         
+        if not msg_data:
+            # The participation index outlives archiving
+            source = _messages_source(conn, alias="m")
+            if source != "messages AS m":
+                cursor.execute(message_query.format(source=source), (participation[1], participation[0]))
+                msg_data = cursor.fetchone()
+        
         if not msg_data:
             return None
             
         message = Message(
-            timestamp=datetime.fromisoformat(msg_data[0]),
+            timestamp=_from_epoch(msg_data[0]),
             sender=msg_data[1],
             chat_name=msg_data[2],
             content=msg_data[3],
@@ -532,45 +631,33 @@ def get_last_interaction(jid: str) -> str:
             conn.close()
 
 
+@query_cache.cached
 def get_chat(chat_jid: str, include_last_message: bool = True) -> Optional[Chat]:
     """Get chat metadata by JID."""
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = connect()
         cursor = conn.cursor()
         
-        query = """
+        cursor.execute("""
             SELECT 
                 c.jid,
                 c.name,
-                c.last_message_time,
-                m.content as last_message,
-                m.sender as last_sender,
-                m.is_from_me as last_is_from_me
+                COALESCE(s.last_message_time, c.last_message_time),
+                s.last_content as last_message,
+                s.last_sender as last_sender,
+                s.last_is_from_me as last_is_from_me,
+                s.message_count,
+                s.unread_count
             FROM chats c
-        """
-        
-        if include_last_message:
-            query += """
-                LEFT JOIN messages m ON c.jid = m.chat_jid 
-                AND c.last_message_time = m.timestamp
-            """
-            
-        query += " WHERE c.jid = ?"
-        
-        cursor.execute(query, (chat_jid,))
+            LEFT JOIN chat_summary s ON s.chat_jid = c.jid
+            WHERE c.jid = ?
+        """, (chat_jid,))
         chat_data = cursor.fetchone()
         
         if not chat_data:
             return None
             
-        return Chat(
-            jid=chat_data[0],
-            name=chat_data[1],
-            last_message_time=datetime.fromisoformat(chat_data[2]) if chat_data[2] else None,
-            last_message=chat_data[3],
-            last_sender=chat_data[4],
-            last_is_from_me=chat_data[5]
-        )
+        return _chat_from_summary_row(chat_data, include_last_message)
         
     except sqlite3.Error as e:
         print(f"Database error: {e}")
@@ -580,40 +667,41 @@ def get_chat(chat_jid: str, include_last_message: bool = True) -> Optional[Chat]
             conn.close()
 
 
+@query_cache.cached
 def get_direct_chat_by_contact(sender_phone_number: str) -> Optional[Chat]:
     """Get chat metadata by sender phone number."""
+    phone = normalize_phone(sender_phone_number)
+    if not phone:
+        return None
     try:
-        conn = sqlite3.connect(MESSAGES_DB_PATH)
+        conn = connect()
         cursor = conn.cursor()
         
         cursor.execute("""
             SELECT 
                 c.jid,
                 c.name,
-                c.last_message_time,
-                m.content as last_message,
-                m.sender as last_sender,
-                m.is_from_me as last_is_from_me
+                COALESCE(s.last_message_time, c.last_message_time),
+                s.last_content as last_message,
+                s.last_sender as last_sender,
+                s.last_is_from_me as last_is_from_me,
+                s.message_count,
+                s.unread_count
             FROM chats c
-            LEFT JOIN messages m ON c.jid = m.chat_jid 
-                AND c.last_message_time = m.timestamp
-            WHERE c.jid LIKE ? AND c.jid NOT LIKE '%@g.us'
-            LIMIT 1
-        """, (f"%{sender_phone_number}%",))
+            LEFT JOIN chat_summary s ON s.chat_jid = c.jid
+            WHERE c.phone >= ? AND c.phone < ?
+            ORDER BY c.phone
+            LIMIT 2
+        """, _phone_prefix_range(phone))
         
-        chat_data = cursor.fetchone()
+        rows = cursor.fetchall()
         
-        if not chat_data:
+        # An exact number sorts first; otherwise a prefix must identify a
+        # single contact rather than whichever one happens to match first
+        if not rows or (rows[0][0].split('@')[0] != phone and len(rows) > 1):
             return None
             
-        return Chat(
-            jid=chat_data[0],
-            name=chat_data[1],
-            last_message_time=datetime.fromisoformat(chat_data[2]) if chat_data[2] else None,
-            last_message=chat_data[3],
-            last_sender=chat_data[4],
-            last_is_from_me=chat_data[5]
-        )
+        return _chat_from_summary_row(rows[0])
         
     except sqlite3.Error as e:
         print(f"Database error: {e}")
@@ -622,19 +710,287 @@ def get_direct_chat_by_contact(sender_phone_number: str) -> Optional[Chat]:
         if 'conn' in locals():
             conn.close()
 
-def send_message(recipient: str, message: str) -> Tuple[bool, str]:
+def _add_activity(totals: Dict[Any, Dict[str, Any]], key: Any, messages: int, media: int,
+                  first_ts: Optional[int], last_ts: Optional[int], from_me: int = 0) -> None:
+    # Merge one rollup or tail row into ``totals[key]``
+    entry = totals.get(key)
+    if entry is None:
+        totals[key] = {"messages": messages, "media": media, "from_me": from_me or 0, "first_ts": first_ts, "last_ts": last_ts}
+        return
+    entry["messages"] += messages
+    entry["media"] += media
+    entry["from_me"] += from_me or 0
+    if first_ts is not None and (entry["first_ts"] is None or first_ts < entry["first_ts"]):
+        entry["first_ts"] = first_ts
+    if last_ts is not None and (entry["last_ts"] is None or last_ts > entry["last_ts"]):
+        entry["last_ts"] = last_ts
+
+def _activity_times(entry: Dict[str, Any]) -> Dict[str, Any]:
+    first_ts, last_ts = entry.pop("first_ts"), entry.pop("last_ts")
+    entry["first_activity"] = _from_epoch(first_ts).isoformat() if first_ts else None
+    entry["last_activity"] = _from_epoch(last_ts).isoformat() if last_ts else None
+    return entry
+
+@query_cache.cached
+def get_chat_stats(chat_jid: str, days: Optional[int] = 30, top_senders: int = 10) -> Optional[Dict[str, Any]]:
+    """Activity of a chat: message and media counts, first/last activity and its most active senders.
+
+    Reads the bridge's activity rollups plus the few messages stored since
+    they were last brought up to date, so the cost doesn't grow with the
+    chat's history. ``days`` limits the stats to the last N UTC days
+    (today included) and adds a per-day series; None or 0 covers all history.
+    Returns None for an unknown chat; database errors (such as a bridge that
+    hasn't created the rollup tables) are raised.
+    """
+    if days is not None and days < 0:
+        raise ValueError("days must be 0 or more")
+    if top_senders < 1:
+        raise ValueError("top_senders must be at least 1")
+    try:
+        conn = connect()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT name FROM chats WHERE jid = ?", (chat_jid,))
+        chat = cursor.fetchone()
+        if chat is None:
+            return None
+        
+        # Without a mark nothing has been rolled up yet; every message is tail
+        cursor.execute("SELECT last_rowid, (SELECT COALESCE(MAX(rowid), 0) FROM messages) FROM rollup_state")
+        row = cursor.fetchone()
+        rolled_up_to = row[0] if row else 0
+        if row and row[1] < rolled_up_to:
+            # Archiving by an older bridge let rowids be reused below the
+            # mark; the bridge rebuilds the rollups on its next run, and
+            # until then messages at or below the mark would go uncounted
+            raise sqlite3.DatabaseError("Activity rollups are out of step with messages and are being rebuilt")
+        since = (datetime.now(timezone.utc).date() - timedelta(days=days - 1)).isoformat() if days else None
+        
+        # Messages the bridge hasn't rolled up yet. "+chat_jid" keeps SQLite
+        # on the rowid range instead of walking the chat's whole history.
+        tail_filter = "rowid > ? AND +chat_jid = ? AND ts IS NOT NULL" + (" AND date(ts, 'unixepoch') >= ?" if since else "")
+        tail_params = (rolled_up_to, chat_jid) + ((since,) if since else ())
+        
+        daily: Dict[str, Dict[str, Any]] = {}
+        if since:
+            cursor.execute("""
+                SELECT day, messages, media, first_ts, last_ts, from_me FROM chat_activity_daily
+                WHERE chat_jid = ? AND day >= ?
+            """, (chat_jid, since))
+            for row in cursor.fetchall():
+                _add_activity(daily, *row)
+            cursor.execute(f"""
+                SELECT date(ts, 'unixepoch') AS day, COUNT(*), COUNT(NULLIF(media_type, '')), MIN(ts), MAX(ts), SUM(is_from_me)
+                FROM messages WHERE {tail_filter} GROUP BY day
+            """, tail_params)
+            for row in cursor.fetchall():
+                _add_activity(daily, *row)
+            total: Dict[str, Dict[str, Any]] = {}
+            for entry in daily.values():
+                _add_activity(total, chat_jid, entry["messages"], entry["media"], entry["first_ts"], entry["last_ts"], entry["from_me"])
+        else:
+            total = {}
+            cursor.execute("""
+                SELECT messages, media, first_ts, last_ts, from_me FROM chat_activity WHERE chat_jid = ?
+                UNION ALL
+                SELECT COUNT(*), COUNT(NULLIF(media_type, '')), MIN(ts), MAX(ts), SUM(is_from_me)
+                FROM messages WHERE rowid > ? AND +chat_jid = ? AND ts IS NOT NULL
+            """, (chat_jid, rolled_up_to, chat_jid))
+            for row in cursor.fetchall():
+                if row[0]:
+                    _add_activity(total, chat_jid, *row)
+        
+        senders: Dict[str, Dict[str, Any]] = {}
+        sender_jid = "CASE WHEN instr(sender, '@') THEN sender ELSE sender || '@s.whatsapp.net' END"
+        cursor.execute(f"""
+            SELECT {sender_jid} AS sender_jid, COUNT(*), COUNT(NULLIF(media_type, '')), MIN(ts), MAX(ts)
+            FROM messages WHERE {tail_filter} AND sender != '' GROUP BY sender_jid
+        """, tail_params)
+        tail_senders = cursor.fetchall()
+        if since:
+            cursor.execute("""
+                SELECT sender, SUM(messages), SUM(media), MIN(first_ts), MAX(last_ts) FROM sender_activity_daily
+                WHERE chat_jid = ? AND day >= ? GROUP BY sender
+            """, (chat_jid, since))
+            rolled_senders = cursor.fetchall()
+        else:
+            # A sender outside the rolled-up top N can only overtake it with
+            # messages in the tail, so the top N plus the tail's senders suffice
+            cursor.execute("""
+                SELECT sender, messages, media, first_ts, last_ts FROM sender_activity
+                WHERE chat_jid = ? ORDER BY messages DESC LIMIT ?
+            """, (chat_jid, top_senders))
+            rolled_senders = cursor.fetchall()
+            known = {row[0] for row in rolled_senders}
+            for row in tail_senders:
+                if row[0] not in known:
+                    cursor.execute("""
+                        SELECT sender, messages, media, first_ts, last_ts FROM sender_activity
+                        WHERE chat_jid = ? AND sender = ?
+                    """, (chat_jid, row[0]))
+                    rolled_senders.extend(cursor.fetchall())
+        for row in rolled_senders + tail_senders:
+            _add_activity(senders, *row)
+        ranked = sorted(senders.items(), key=lambda item: (-item[1]["messages"], item[0]))[:top_senders]
+        
+        stats = {"chat_jid": chat_jid, "chat_name": chat[0], "days": days, "since": since}
+        stats.update(_activity_times(total.get(chat_jid) or {"messages": 0, "media": 0, "from_me": 0, "first_ts": None, "last_ts": None}))
+        if since:
+            stats["daily"] = [{"day": day, **_activity_times(daily[day])} for day in sorted(daily)]
+        stats["top_senders"] = [
+            {"sender": jid, "name": get_sender_name(jid), **_activity_times(entry)}
+            for jid, entry in ranked
+        ]
+        for sender in stats["top_senders"]:
+            sender.pop("from_me")
+        return stats
+        
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        raise
+    finally:
+        if 'conn' in locals():
+            conn.close()
+
+def get_new_messages(
+    cursor: Optional[int] = None,
+    chat_jid: Optional[str] = None,
+    limit: int = 100
+) -> MessageFeed:
+    """Get messages stored after ``cursor`` (a messages rowid), oldest first.
+
+    Without a cursor no messages are returned, only the current position to
+    start following from. Pass the returned cursor to the next call.
+    """
+    try:
+        conn = connect()
+        db_cursor = conn.cursor()
+
+        # Fix the upper bound first so rows committed mid-call aren't skipped
+        db_cursor.execute("SELECT COALESCE(MAX(rowid), 0) FROM messages")
+        high_water = db_cursor.fetchone()[0]
+        if cursor is None:
+            return MessageFeed(cursor=high_water, messages=[])
+
+        query = """
+            SELECT messages.rowid, messages.ts, messages.sender, chats.name, messages.content, messages.is_from_me, chats.jid, messages.id, messages.media_type
+            FROM messages
+            JOIN chats ON messages.chat_jid = chats.jid
+            WHERE messages.rowid > ? AND messages.rowid <= ?
+        """
+        params = [cursor, high_water]
+        if chat_jid:
+            query += " AND messages.chat_jid = ?"
+            params.append(chat_jid)
+        query += " ORDER BY messages.rowid LIMIT ?"
+        params.append(limit)
+
+        db_cursor.execute(query, tuple(params))
+        rows = db_cursor.fetchall()
+
+        messages = [Message(
+            timestamp=_from_epoch(row[1]),
+            sender=row[2],
+            chat_name=row[3],
+            content=row[4],
+            is_from_me=row[5],
+            chat_jid=row[6],
+            id=row[7],
+            media_type=row[8]
+        ) for row in rows]
+
+        # A short page means everything up to the high-water mark was seen
+        next_cursor = rows[-1][0] if len(rows) == limit else high_water
+        return MessageFeed(cursor=next_cursor, messages=messages)
+
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return MessageFeed(cursor=cursor or 0, messages=[])
+    finally:
+        if 'conn' in locals():
+            conn.close()
+
+def wait_for_messages(
+    cursor: Optional[int] = None,
+    chat_jid: Optional[str] = None,
+    timeout: float = 30.0,
+    limit: int = 100
+) -> MessageFeed:
+    """Like get_new_messages, but block up to ``timeout`` seconds for one to arrive.
+
+    Between checks only ``PRAGMA data_version`` is polled, so waiting does
+    not re-run the message query until the bridge has written something.
+    """
+    if cursor is None:
+        cursor = get_new_messages().cursor
+    watcher = watcher_for(MESSAGES_DB_PATH)
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            # Read the version before querying so a write in between still wakes us
+            version = watcher.version()
+            feed = get_new_messages(cursor, chat_jid, limit)
+            if feed.messages:
+                return feed
+            cursor = feed.cursor
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not watcher.wait_for_change(version, remaining):
+                return feed
+    except sqlite3.Error as e:
+        # E.g. messages.db doesn't exist yet; wait out the timeout rather
+        # than have callers that loop retry at once
+        print(f"Database error: {e}")
+        time.sleep(max(0.0, deadline - time.monotonic()))
+        return MessageFeed(cursor=cursor, messages=[])
+
+def record_broadcast(broadcast_id: str, message: str, recipients: List[Tuple[str, Optional[str]]]) -> bool:
+    """Record a broadcast's (jid, segment) recipients so replies can be attributed to it."""
+    try:
+        broadcast_replies.record_broadcast(broadcast_id, message, recipients)
+        return True
+    except sqlite3.Error as e:
+        print(f"Database error while recording broadcast {broadcast_id}: {e}")
+        return False
+
+def forget_broadcast(broadcast_id: str) -> None:
+    """Drop a recorded broadcast that failed before anything was sent."""
+    try:
+        broadcast_replies.forget_broadcast(broadcast_id)
+    except sqlite3.Error as e:
+        print(f"Database error while removing broadcast {broadcast_id}: {e}")
+
+def record_broadcast_send(broadcast_id: str, jid: str) -> None:
+    """Mark a broadcast as sent to ``jid`` now."""
+    try:
+        broadcast_replies.record_sent(broadcast_id, jid)
+    except sqlite3.Error as e:
+        print(f"Database error while recording send to {jid}: {e}")
+
+def get_broadcast_engagement(broadcast_id: Optional[str] = None, limit: int = 20, by_segment: bool = False) -> List[Dict[str, Any]]:
+    """Reply rate and time to first reply for a broadcast, or the most recent ones.
+
+    Inbound messages stored since the previous report are matched to
+    recipients first; earlier history is not scanned again.
+    """
+    try:
+        return broadcast_replies.engagement(broadcast_id, limit, by_segment)
+    except sqlite3.Error as e:
+        print(f"Database error: {e}")
+        return []
+
+def send_message(recipient: str, message: str, api_base_url: Optional[str] = None) -> Tuple[bool, str]:
     try:
         # Validate input
         if not recipient:
             return False, "Recipient must be provided"
         
-        url = f"{WHATSAPP_API_BASE_URL}/send"
+        url = f"{api_base_url or WHATSAPP_API_BASE_URL}/send"
         payload = {
             "recipient": recipient,
             "message": message,
         }
         
-        response = requests.post(url, json=payload)
+        response = requests.post(url, json=payload, hooks=BRIDGE_HOOKS, timeout=BRIDGE_TIMEOUT)
         
         # Check if the request was successful
         if response.status_code == 200:
@@ -643,14 +999,18 @@ def send_message(recipient: str, message: str) -> Tuple[bool, str]:
         else:
             return False, f"Error: HTTP {response.status_code} - {response.text}"
             
-    except requests.RequestException as e:
+    except requests.ConnectionError as e:
+        # Nothing reached the bridge, so the send can safely be retried
         return False, f"Request error: {str(e)}"
+    except requests.RequestException as e:
+        # The bridge may already have sent it (e.g. a read timeout); don't retry
+        return False, f"Request failed: {str(e)}"
     except json.JSONDecodeError:
         return False, f"Error parsing response: {response.text}"
     except Exception as e:
         return False, f"Unexpected error: {str(e)}"
 
-def send_file(recipient: str, media_path: str) -> Tuple[bool, str]:
+def send_file(recipient: str, media_path: str, api_base_url: Optional[str] = None) -> Tuple[bool, str]:
     try:
         # Validate input
         if not recipient:
@@ -662,13 +1022,13 @@ def send_file(recipient: str, media_path: str) -> Tuple[bool, str]:
         if not os.path.isfile(media_path):
             return False, f"Media file not found: {media_path}"
         
-        url = f"{WHATSAPP_API_BASE_URL}/send"
+        url = f"{api_base_url or WHATSAPP_API_BASE_URL}/send"
         payload = {
             "recipient": recipient,
             "media_path": media_path
         }
         
-        response = requests.post(url, json=payload)
+        response = requests.post(url, json=payload, hooks=BRIDGE_HOOKS, timeout=BRIDGE_TIMEOUT)
         
         # Check if the request was successful
         if response.status_code == 200:
@@ -677,13 +1037,147 @@ def send_file(recipient: str, media_path: str) -> Tuple[bool, str]:
         else:
             return False, f"Error: HTTP {response.status_code} - {response.text}"
             
-    except requests.RequestException as e:
+    except requests.ConnectionError as e:
+        # Nothing reached the bridge, so the send can safely be retried
         return False, f"Request error: {str(e)}"
+    except requests.RequestException as e:
+        # The bridge may already have sent it (e.g. a read timeout); don't retry
+        return False, f"Request failed: {str(e)}"
     except json.JSONDecodeError:
         return False, f"Error parsing response: {response.text}"
     except Exception as e:
         return False, f"Unexpected error: {str(e)}"
 
+def submit_send(recipient: str, message: Optional[str] = None, media_path: Optional[str] = None,
+                api_base_url: Optional[str] = None) -> Tuple[bool, str]:
+    """Queue a text or file send on the bridge without waiting for it to go out.
+    
+    Args:
+        recipient: Phone number (country code, no +) or JID
+        message: Text to send
+        media_path: Absolute path of a file to send instead of, or with, the text
+        api_base_url: Bridge API to use instead of WHATSAPP_API_BASE_URL
+    
+    Returns:
+        (True, job ID) once the bridge has queued the send, or (False, error message).
+        Follow the job with get_send_jobs or wait_for_send_jobs.
+    """
+    try:
+        if not recipient:
+            return False, "Recipient must be provided"
+        if not message and not media_path:
+            return False, "Message or media path must be provided"
+        if media_path and not os.path.isfile(media_path):
+            return False, f"Media file not found: {media_path}"
+        
+        url = f"{api_base_url or WHATSAPP_API_BASE_URL}/send"
+        payload = {
+            "recipient": recipient,
+            "message": message or "",
+            "async": True,
+        }
+        if media_path:
+            payload["media_path"] = media_path
+        
+        response = requests.post(url, json=payload, hooks=BRIDGE_HOOKS, timeout=BRIDGE_TIMEOUT)
+        
+        if response.status_code == 202:
+            return True, response.json()["job_id"]
+        else:
+            return False, f"Error: HTTP {response.status_code} - {response.text}"
+            
+    except requests.ConnectionError as e:
+        # Nothing reached the bridge, so the submit can safely be retried
+        return False, f"Request error: {str(e)}"
+    except requests.RequestException as e:
+        # The bridge may already have queued the job (e.g. a read timeout); don't retry
+        return False, f"Request failed: {str(e)}"
+    except (json.JSONDecodeError, KeyError):
+        return False, f"Error parsing response: {response.text}"
+    except Exception as e:
+        return False, f"Unexpected error: {str(e)}"
+
+def get_send_jobs(job_ids: List[str], api_base_url: Optional[str] = None) -> Optional[Dict[str, Dict[str, Any]]]:
+    """Look up queued sends by job ID.
+    
+    Returns:
+        A mapping of job ID to its status ("queued", "sending", "sent" or "failed"),
+        success flag and bridge message, or None if the lookup failed. Jobs the
+        bridge no longer knows about are missing from the mapping.
+    """
+    try:
+        url = f"{api_base_url or WHATSAPP_API_BASE_URL}/jobs"
+        response = requests.post(url, json={"job_ids": job_ids}, hooks=BRIDGE_HOOKS, timeout=BRIDGE_TIMEOUT)
+        
+        if response.status_code == 200:
+            return response.json().get("jobs", {})
+        else:
+            print(f"Error: HTTP {response.status_code} - {response.text}")
+            return None
+            
+    except requests.RequestException as e:
+        print(f"Request error: {str(e)}")
+        return None
+    except json.JSONDecodeError:
+        print(f"Error parsing response: {response.text}")
+        return None
+
+def wait_for_send_jobs(job_ids: List[str], timeout: float = 60.0, poll_interval: float = 0.5,
+                       api_base_url: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Poll until every job has finished or ``timeout`` expires; returns the last status seen of each."""
+    deadline = time.monotonic() + timeout
+    jobs: Dict[str, Dict[str, Any]] = {}
+    remaining = list(job_ids)
+    while remaining:
+        found = get_send_jobs(remaining, api_base_url)
+        if found:
+            jobs.update(found)
+        remaining = [job_id for job_id in remaining
+                     if jobs.get(job_id, {}).get("status") not in ("sent", "failed")]
+        if not remaining or time.monotonic() >= deadline:
+            break
+        time.sleep(min(poll_interval, max(deadline - time.monotonic(), 0)))
+    return jobs
+
+def check_recipients(recipients: List[str], api_base_url: Optional[str] = None) -> Optional[Dict[str, bool]]:
+    """Check in bulk which recipients are registered on WhatsApp.
+    
+    Args:
+        recipients: Phone numbers (country code, no +) or JIDs to check
+        api_base_url: Bridge API to use instead of WHATSAPP_API_BASE_URL
+    
+    Returns:
+        A mapping of each recipient to whether it is on WhatsApp, or None if the check failed
+    """
+    try:
+        url = f"{api_base_url or WHATSAPP_API_BASE_URL}/check"
+        payload = {
+            "recipients": recipients
+        }
+        
+        response = requests.post(url, json=payload, hooks=BRIDGE_HOOKS, timeout=RECIPIENT_CHECK_TIMEOUT)
+        
+        if response.status_code == 200:
+            result = response.json()
+            if result.get("success", False):
+                return {item["recipient"]: item.get("is_on_whatsapp", False) for item in result.get("results", [])}
+            else:
+                print(f"Recipient check failed: {result.get('message', 'Unknown error')}")
+                return None
+        else:
+            print(f"Error: HTTP {response.status_code} - {response.text}")
+            return None
+            
+    except requests.RequestException as e:
+        print(f"Request error: {str(e)}")
+        return None
+    except json.JSONDecodeError:
+        print(f"Error parsing response: {response.text}")
+        return None
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        return None
+
 def send_audio_message(recipient: str, media_path: str) -> Tuple[bool, str]:
     try:
         # Validate input
@@ -708,7 +1202,7 @@ def send_audio_message(recipient: str, media_path: str) -> Tuple[bool, str]:
             "media_path": media_path
         }
         
-        response = requests.post(url, json=payload)
+        response = requests.post(url, json=payload, hooks=BRIDGE_HOOKS, timeout=BRIDGE_TIMEOUT)
         
         # Check if the request was successful
         if response.status_code == 200:
@@ -741,7 +1235,7 @@ def download_media(message_id: str, chat_jid: str) -> Optional[str]:
             "chat_jid": chat_jid
         }
         
-        response = requests.post(url, json=payload)
+        response = requests.post(url, json=payload, hooks=BRIDGE_HOOKS, timeout=BRIDGE_TIMEOUT)
         
         if response.status_code == 200:
             result = response.json()
@@ -0,0 +1,98 @@
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Optional
+
+# Assumed drain rate (sends/sec) before any send has completed, unless the
+# caller knows better; one bridge pausing 2-6 s between recipients
+DEFAULT_DRAIN_RATE = 0.25
+
+# Window over which the observed drain rate is measured
+DRAIN_WINDOW_SECONDS = 120
+
+MAX_RETRY_AFTER_SECONDS = 3600
+
+
+class AdmissionController:
+    """Bounds how many sends may be pending, overall and per client.
+
+    The enqueue route asks for admission before queueing a broadcast; the
+    worker reports each finished send so the pending counts and the
+    observed drain rate stay current.
+    """
+
+    def __init__(self, max_queue_depth: int, max_pending_per_client: int,
+                 default_drain_rate: Optional[float] = None):
+        self.max_queue_depth = max_queue_depth
+        self.max_pending_per_client = max_pending_per_client
+        self.default_drain_rate = default_drain_rate or DEFAULT_DRAIN_RATE
+        self._lock = threading.Lock()
+        self._pending_total = 0
+        self._pending_by_client = defaultdict(int)
+        self._completions = deque()
+
+    @property
+    def pending(self) -> int:
+        return self._pending_total
+
+    def capacity(self, client_id: str) -> int:
+        """How many more sends this client could enqueue right now."""
+        with self._lock:
+            return max(0, min(self.max_queue_depth - self._pending_total,
+                              self.max_pending_per_client - self._pending_by_client[client_id]))
+
+    def admit(self, client_id: str, count: int) -> Optional[int]:
+        """Reserve room for ``count`` sends.
+
+        Returns None if admitted, otherwise the number of seconds the client
+        should wait before retrying (for the Retry-After header).
+        """
+        with self._lock:
+            excess = max(self._pending_total + count - self.max_queue_depth,
+                         self._pending_by_client[client_id] + count - self.max_pending_per_client)
+            if excess > 0:
+                return self._retry_after(excess)
+            self._pending_total += count
+            self._pending_by_client[client_id] += count
+            return None
+
+    def reserve(self, client_id: str, count: int = 1) -> None:
+        """Count sends as pending without asking; for scheduled sends reaching the queue."""
+        with self._lock:
+            self._pending_total += count
+            self._pending_by_client[client_id] += count
+
+    def release(self, client_id: str, count: int = 1) -> None:
+        """Give back reservations for sends that finished or were never queued."""
+        with self._lock:
+            self._pending_total = max(0, self._pending_total - count)
+            remaining = self._pending_by_client[client_id] - count
+            if remaining > 0:
+                self._pending_by_client[client_id] = remaining
+            else:
+                self._pending_by_client.pop(client_id, None)
+
+    def complete(self, client_id: str) -> None:
+        """Record that one send finished, releasing its reservation."""
+        self.release(client_id)
+        with self._lock:
+            self._completions.append(time.monotonic())
+
+    def drain_rate(self) -> float:
+        """Observed sends per second over the recent window."""
+        with self._lock:
+            return self._drain_rate()
+
+    def _drain_rate(self) -> float:
+        now = time.monotonic()
+        while self._completions and now - self._completions[0] > DRAIN_WINDOW_SECONDS:
+            self._completions.popleft()
+        if len(self._completions) < 2:
+            return self.default_drain_rate
+        elapsed = now - self._completions[0]
+        return len(self._completions) / elapsed if elapsed > 0 else self.default_drain_rate
+
+    def _retry_after(self, excess: int) -> int:
+        seconds = math.ceil(excess / self._drain_rate())
+        return max(1, min(seconds, MAX_RETRY_AFTER_SECONDS))
@@ -1,13 +1,27 @@
-from flask import Flask, request, jsonify, send_from_directory, send_file
+from flask import Flask, Request, Response, g, request, jsonify, send_from_directory, send_file
 from flask_cors import CORS
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 import os
 import json
+import logging
+import sqlite3
 import sys
-import queue
 import threading
 import time
+import uuid
+from dataclasses import asdict
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
 import requests
-import random
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from admission import AdmissionController
+from bridge_pool import BridgePool, BridgeUnavailable, is_bridge_unavailable
+from broadcast_scheduler import BroadcastScheduler, QuietHours, ScheduleError, SchedulerFull, format_time, parse_time
+import metrics
+from structured_logging import configure_logging
+from recipients import RecipientsError, RegistrationCache, parse_recipients, validate_recipients
+from upload_store import UploadStore
 
 # Add MCP server directory to Python path to allow imports
 # Assuming app.py is in the root and MCP is a subdirectory
@@ -17,20 +31,55 @@ if mcp_server_path not in sys.path:
 
 # Now try to import from whatsapp.py
 try:
-    from whatsapp import send_message as mcp_send_message, send_file as mcp_send_file
+    from whatsapp import send_message as mcp_send_message, send_file as mcp_send_file, check_recipients as mcp_check_recipients
+    from whatsapp import get_new_messages as mcp_get_new_messages, wait_for_messages as mcp_wait_for_messages
+    from whatsapp import search_contacts as mcp_search_contacts
+    from whatsapp import record_broadcast as mcp_record_broadcast, record_broadcast_send as mcp_record_broadcast_send
+    from whatsapp import forget_broadcast as mcp_forget_broadcast
+    from whatsapp import get_broadcast_engagement as mcp_get_broadcast_engagement
+    from whatsapp import get_chat_stats as mcp_get_chat_stats
+    from instrumentation import lock_wait_listeners
+    lock_wait_listeners.append(metrics.DB_LOCK_WAIT_SECONDS.observe)
 except ImportError as e:
     print(f"Could not import from MCP whatsapp.py: {e}")
     # Define dummy functions if import fails, so app can still run for testing other parts
-    def mcp_send_file(recipient, file_path):
+    def mcp_send_file(recipient, file_path, api_base_url=None):
         print(f"[MCP DUMMY] Send file to {recipient}: {file_path}")
         return True, "File sent (dummy)"
-    def mcp_send_message(recipient, message):
+    def mcp_send_message(recipient, message, api_base_url=None):
         print(f"[MCP DUMMY] Send message to {recipient}: {message}")
         return True, "Message sent (dummy)"
+    def mcp_check_recipients(recipients, api_base_url=None):
+        print(f"[MCP DUMMY] Check {len(recipients)} recipients")
+        return None
+    def mcp_get_new_messages(cursor=None, chat_jid=None, limit=100):
+        return SimpleNamespace(cursor=cursor or 0, messages=[])
+    def mcp_wait_for_messages(cursor=None, chat_jid=None, timeout=30.0, limit=100):
+        time.sleep(timeout)
+        return SimpleNamespace(cursor=cursor or 0, messages=[])
+    def mcp_search_contacts(query, limit=50):
+        return []
+    def mcp_record_broadcast(broadcast_id, message, recipients):
+        return False
+    def mcp_record_broadcast_send(broadcast_id, jid):
+        pass
+    def mcp_forget_broadcast(broadcast_id):
+        pass
+    def mcp_get_broadcast_engagement(broadcast_id=None, limit=20, by_segment=False):
+        return []
+    def mcp_get_chat_stats(chat_jid, days=30, top_senders=10):
+        return None
     
 
+configure_logging()
+logger = logging.getLogger('clubchat.send')
+
 app = Flask(__name__, static_folder='dist', static_url_path='')
 CORS(app)
+# Trust X-Forwarded-For only as far as the proxies in front of the backend
+# (nginx in the shipped setup) wrote it, so remote_addr is the address the
+# outermost of them saw rather than whatever the client claims
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=int(os.environ.get('TRUSTED_PROXY_COUNT', 1)))
 
 # Define the Go WhatsApp Bridge base URL
 # IMPORTANT: Ensure this matches the actual address and port of your Go bridge's HTTP server
@@ -41,61 +90,173 @@ if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
-# Global message queue
-message_queue = queue.Queue()
+# Attachments are stored by content hash and reference-counted per pending send
+upload_store = UploadStore(UPLOAD_FOLDER)
 
-# Worker function to process messages from the queue
-def process_message_queue():
-    while True:
-        try:
-            task = message_queue.get()
-            task_type = task.get("type")
-
-            if task_type == 'send_message':
-                recipient_jid = task['recipient_jid']
-                first_text = task['first_text']
-                base_message_body = task['base_message_body']
-                absolute_saved_file_path = task.get('file_path')
-
-                personalized_message = f"Dear {first_text},\\n{base_message_body}"
-                
-                print(f"Worker: Processing message for {recipient_jid}")
-                print(f"Worker: Message content:\\n{personalized_message}")
-
-
-                if absolute_saved_file_path:
-                    print(f"Worker: Attempting to send file {absolute_saved_file_path} to {recipient_jid}")
-                    file_success, file_status_msg = mcp_send_file(recipient_jid, absolute_saved_file_path)
-                    print(f"Worker: File send status for {recipient_jid}: {file_status_msg} (Success: {file_success})")
-                
-                print(f"Worker: Attempting to send text message to {recipient_jid}")
-                text_success, text_status_msg = mcp_send_message(recipient_jid, personalized_message)
-                print(f"Worker: Text send status for {recipient_jid}: {text_status_msg} (Success: {text_success})")
-                
-                # Introduce a delay to avoid rate limiting
-                time.sleep(random.uniform(2, 6)) # Adjust delay as needed
-
-            elif task_type == 'cleanup_file':
-                file_path_to_delete = task.get('file_path')
-                if file_path_to_delete and os.path.exists(file_path_to_delete):
-                    try:
-                        os.remove(file_path_to_delete)
-                        print(f"Worker: Cleaned up uploaded file: {file_path_to_delete}")
-                    except OSError as e:
-                        print(f"Worker: Error deleting file {file_path_to_delete}: {e}")
-                else:
-                    print(f"Worker: Cleanup task - file not found or path not provided: {file_path_to_delete}")
-            
-            else:
-                print(f"Worker: Unknown task type received: {task_type}")
+# Broadcasts with send_at/deliver_by are held back and spread over their
+# window; nothing is sent during BROADCAST_QUIET_HOURS (in BROADCAST_TIMEZONE,
+# or the server's local time), by the scheduler or the bridge workers
+BROADCAST_TIMEZONE = ZoneInfo(os.environ['BROADCAST_TIMEZONE']) if os.environ.get('BROADCAST_TIMEZONE') else None
+quiet_hours = QuietHours(os.environ.get('BROADCAST_QUIET_HOURS', ''), BROADCAST_TIMEZONE)
 
-        except Exception as e:
-            print(f"Worker: Error processing task: {e}")
-            import traceback
-            traceback.print_exc()
-        finally:
-            if 'task' in locals() and task is not None : #Ensure task was pulled
-                 message_queue.task_done()
+# Sends are sharded across one or more bridges (comma-separated GO_BRIDGE_POOL),
+# each with its own queue, worker and rate limit
+GO_BRIDGE_POOL = [url.strip() for url in os.environ.get('GO_BRIDGE_POOL', GO_BRIDGE_BASE_URL).split(',') if url.strip()]
+BRIDGE_MIN_SEND_INTERVAL = float(os.environ.get('BRIDGE_MIN_SEND_INTERVAL', 2))
+BRIDGE_MAX_SEND_INTERVAL = float(os.environ.get('BRIDGE_MAX_SEND_INTERVAL', 6))
+bridge_pool = BridgePool(
+    GO_BRIDGE_POOL,
+    min_interval=BRIDGE_MIN_SEND_INTERVAL,
+    max_interval=BRIDGE_MAX_SEND_INTERVAL,
+    health_interval=float(os.environ.get('BRIDGE_HEALTH_INTERVAL', 15)),
+    max_attempts=int(os.environ.get('BRIDGE_MAX_SEND_ATTEMPTS', 3)),
+    quiet_hours=quiet_hours
+)
+
+# Seconds between keep-alive comments on the message stream
+MESSAGE_STREAM_HEARTBEAT = float(os.environ.get('MESSAGE_STREAM_HEARTBEAT', 15))
+
+# Admission control for the broadcast endpoint
+BROADCAST_MAX_QUEUE_DEPTH = int(os.environ.get('BROADCAST_MAX_QUEUE_DEPTH', 20000))
+BROADCAST_MAX_PENDING_PER_CLIENT = int(os.environ.get('BROADCAST_MAX_PENDING_PER_CLIENT', 10000))
+BROADCAST_MAX_RECIPIENTS = int(os.environ.get('BROADCAST_MAX_RECIPIENTS', 10000))
+# Until sends have been timed, Retry-After assumes every bridge sends at its average pace
+_mean_send_interval = (BRIDGE_MIN_SEND_INTERVAL + BRIDGE_MAX_SEND_INTERVAL) / 2
+admission = AdmissionController(
+    BROADCAST_MAX_QUEUE_DEPTH, BROADCAST_MAX_PENDING_PER_CLIENT,
+    default_drain_rate=len(bridge_pool.bridges) / _mean_send_interval if _mean_send_interval > 0 else None
+)
+
+class BroadcastRequest(Request):
+    # A full-size recipients_data field is larger than Werkzeug's default
+    # 500 KB limit for a single multipart form field
+    max_form_memory_size = max(500_000, BROADCAST_MAX_RECIPIENTS * 256)
+
+app.request_class = BroadcastRequest
+
+# Recipients are checked against WhatsApp before fan-out; lookups are cached locally
+RECIPIENT_VALIDATION = os.environ.get('RECIPIENT_VALIDATION', '1') == '1'
+registration_cache = RegistrationCache(
+    os.environ.get('RECIPIENT_CACHE_DB', 'recipient_cache.db'),
+    ttl=int(os.environ.get('RECIPIENT_CACHE_TTL', 7 * 24 * 3600)),
+    negative_ttl=int(os.environ.get('RECIPIENT_CACHE_NEGATIVE_TTL', 24 * 3600))
+)
+
+broadcast_timer = metrics.BroadcastTimer()
+
+def _enqueue(task):
+    # Scheduled sends only count against admission once they reach a queue
+    if task.get('scheduled'):
+        admission.reserve(task.get('client_id'))
+    try:
+        bridge_pool.put(task)
+    except Exception:
+        logger.exception("could not queue send", extra={"fields": {
+            "broadcast_id": task.get('broadcast_id'), "recipient_jid": task.get('recipient_jid')}})
+        finish_task(task)
+        return
+    metrics.MESSAGES_ENQUEUED.inc()
+
+# Held sends have their own limit, and a delivery window must leave the
+# bridges time to make every send
+broadcast_scheduler = BroadcastScheduler(
+    _enqueue,
+    quiet_hours,
+    max_pending=int(os.environ.get('BROADCAST_MAX_SCHEDULED', 100000)),
+    max_send_rate=bridge_pool.max_send_rate()
+)
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def _observe_request_latency(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # The URL rule, not the path, keeps label cardinality bounded
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.HTTP_REQUEST_SECONDS.labels(request.method, endpoint, response.status_code).observe(time.perf_counter() - start)
+    return response
+
+def _client_id():
+    # The address the trusted proxy saw (see ProxyFix above); a client can't
+    # pick a fresh one by sending its own X-Forwarded-For
+    return request.remote_addr or 'unknown'
+
+def _too_many_requests(retry_after):
+    response = jsonify({
+        "status": "error",
+        "message": "Too many messages are already queued. Please retry later.",
+        "retry_after": retry_after
+    })
+    response.headers['Retry-After'] = str(retry_after)
+    metrics.BROADCASTS.labels('rejected').inc()
+    return response, 429
+
+def _timed_bridge_call(kind, bridge, send, *args):
+    start = time.perf_counter()
+    success, status_msg = send(*args, api_base_url=bridge.api_base_url)
+    metrics.BRIDGE_REQUEST_SECONDS.labels(bridge.base_url, kind).observe(time.perf_counter() - start)
+    metrics.record_send(kind, success, status_msg)
+    return success, status_msg
+
+def _log_send(kind, recipient_jid, bridge, success, status_msg, message=None):
+    fields = {"kind": kind, "recipient_jid": recipient_jid, "bridge": bridge.base_url, "message": message}
+    if success:
+        # One of these per recipient; sampled by LOG_SAMPLE_RATES
+        logger.info("send succeeded", extra={"fields": fields, "sampled": True})
+    else:
+        fields["error_class"] = metrics.error_class(status_msg)
+        fields["status"] = status_msg
+        logger.warning("send failed", extra={"fields": fields})
+
+def finish_task(task):
+    """Release what a send held once it is done, or given up on."""
+    upload_store.release(task.get('file_path'))
+    admission.complete(task.get('client_id'))
+    broadcast_timer.done(task.get('broadcast_id'))
+
+# Worker handler for one queued task, run on the bridge the task was sharded to
+def process_message_task(task, bridge):
+    task_type = task.get("type")
+
+    if task_type != 'send_message':
+        logger.error("unknown task type", extra={"fields": {"task_type": task_type}})
+        return
+
+    recipient_jid = task['recipient_jid']
+    first_text = task['first_text']
+    base_message_body = task['base_message_body']
+    absolute_saved_file_path = task.get('file_path')
+
+    personalized_message = f"Dear {first_text},\\n{base_message_body}"
+
+    retrying = False
+    try:
+        # A task retried after a bridge failure skips whatever already went out
+        if absolute_saved_file_path and not task.get('file_sent'):
+            file_success, file_status_msg = _timed_bridge_call('file', bridge, mcp_send_file, recipient_jid, absolute_saved_file_path)
+            _log_send('file', recipient_jid, bridge, file_success, file_status_msg)
+            if not file_success and is_bridge_unavailable(file_status_msg):
+                raise BridgeUnavailable(file_status_msg)
+            task['file_sent'] = True
+
+        text_success, text_status_msg = _timed_bridge_call('text', bridge, mcp_send_message, recipient_jid, personalized_message)
+        _log_send('text', recipient_jid, bridge, text_success, text_status_msg, message=personalized_message)
+        if text_success and task.get('broadcast_id'):
+            mcp_record_broadcast_send(task['broadcast_id'], recipient_jid)
+        if not text_success and is_bridge_unavailable(text_status_msg):
+            raise BridgeUnavailable(text_status_msg)
+    except BridgeUnavailable:
+        retrying = True
+        raise
+    finally:
+        # Unless the send is being retried on another bridge (the pool calls
+        # finish_task if it gives up instead), it is done with its queue
+        # reservation and its reference on the attachment
+        if not retrying:
+            finish_task(task)
 
 @app.route('/api/whatsapp/status', methods=['GET'])
 def get_whatsapp_status():
@@ -170,66 +331,244 @@ def send_whatsapp():
 @app.route('/api/send-message-to-selected', methods=['POST'])
 def send_message_to_selected():
     try:
+        client_id = _client_id()
+
         base_message_body = request.form.get('message')
         recipients_data_json = request.form.get('recipients_data') # Changed from 'recipients'
         file_obj = request.files.get('file')
 
         if not base_message_body or not recipients_data_json:
+            metrics.BROADCASTS.labels('invalid').inc()
             return jsonify({"status": "error", "message": "Message and recipients_data are required"}), 400
 
+        # Optional delivery window: not before send_at, spread out until deliver_by
         try:
-            recipients_data = json.loads(recipients_data_json)
-        except json.JSONDecodeError as e:
-            return jsonify({"status": "error", "message": f"Invalid recipients_data JSON format: {str(e)}"}), 400
-        
-        if not isinstance(recipients_data, list) or \
-           not all(isinstance(r, dict) and 'jid' in r and 'first_text' in r for r in recipients_data):
-            return jsonify({"status": "error", "message": "recipients_data should be a list of objects, each with 'jid' and 'first_text'"}), 400
+            send_at = parse_time('send_at', request.form.get('send_at'), BROADCAST_TIMEZONE)
+            deliver_by = parse_time('deliver_by', request.form.get('deliver_by'), BROADCAST_TIMEZONE)
+            broadcast_scheduler.plan(1, send_at, deliver_by)
+        except ScheduleError as e:
+            metrics.BROADCASTS.labels('invalid').inc()
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        # Refuse early, before parsing recipients, when there is no room at all.
+        # Scheduled broadcasts are admitted to the queue send by send as they
+        # come due, and are bounded by BROADCAST_MAX_SCHEDULED instead.
+        if send_at is None and deliver_by is None and admission.capacity(client_id) == 0:
+            return _too_many_requests(admission.admit(client_id, 1))
+
+        max_recipients = min(BROADCAST_MAX_RECIPIENTS, admission.max_queue_depth, admission.max_pending_per_client)
+        try:
+            recipients_data = parse_recipients(recipients_data_json, max_recipients)
+        except RecipientsError as e:
+            metrics.BROADCASTS.labels('invalid').inc()
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+        skipped = []
+        if RECIPIENT_VALIDATION:
+            check = lambda jids: mcp_check_recipients(jids, api_base_url=bridge_pool.primary.api_base_url)
+            recipients_data, skipped = validate_recipients(recipients_data, check, registration_cache)
 
-        print("Base message body:", base_message_body)
-        print("Processing for recipients data:", recipients_data)
+        if not recipients_data:
+            metrics.BROADCASTS.labels('invalid').inc()
+            if skipped:
+                return jsonify({"status": "error", "message": "None of the recipients can receive WhatsApp messages", "skipped": skipped}), 400
+            return jsonify({"status": "error", "message": "recipients_data contains no recipients"}), 400
+
+        try:
+            slots = broadcast_scheduler.plan(len(recipients_data), send_at, deliver_by)
+        except ScheduleError as e:
+            metrics.BROADCASTS.labels('invalid').inc()
+            return jsonify({"status": "error", "message": str(e)}), 400
+        # Held back by a window or quiet hours, as opposed to queued right away
+        held = deliver_by is not None or slots[0] > time.time()
+        if not held:
+            retry_after = admission.admit(client_id, len(recipients_data))
+            if retry_after is not None:
+                return _too_many_requests(retry_after)
 
         absolute_saved_file_path = None
-        if file_obj:
-            filename = file_obj.filename
-            saved_file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            absolute_saved_file_path = os.path.abspath(saved_file_path)
-            file_obj.save(saved_file_path)
-            print("File saved (absolute):", absolute_saved_file_path)
-        
-        # Enqueue tasks for each recipient
-        for recipient_info in recipients_data:
-            task = {
+        broadcast_id = uuid.uuid4().hex
+        broadcast_timer.start(broadcast_id, len(recipients_data))
+        recorded = False
+        try:
+            if file_obj:
+                # One reference per recipient; each send releases its own when done
+                absolute_saved_file_path = upload_store.store(file_obj, references=len(recipients_data))
+
+            # Replies are only attributed to broadcasts recorded here; a failure
+            # costs the engagement report, not the broadcast. Recorded before
+            # scheduling, since sends due now are marked sent straight away.
+            recorded = mcp_record_broadcast(broadcast_id, base_message_body, [(r.jid, r.segment) for r in recipients_data])
+
+            # One task per recipient; those due now go straight onto the queue
+            tasks = [{
                 "type": "send_message",
-                "recipient_jid": recipient_info['jid'],
-                "first_text": recipient_info['first_text'],
+                "recipient_jid": recipient_info.jid,
+                "first_text": recipient_info.first_text,
                 "base_message_body": base_message_body,
-                "file_path": absolute_saved_file_path # This will be None if no file
-            }
-            message_queue.put(task)
-            print(f"Enqueued message for {recipient_info['jid']}")
-
-        # If a file was uploaded, enqueue a cleanup task for it
-        if absolute_saved_file_path:
-            cleanup_task = {
-                "type": "cleanup_file",
-                "file_path": absolute_saved_file_path
-            }
-            message_queue.put(cleanup_task)
-            print(f"Enqueued cleanup task for file: {absolute_saved_file_path}")
+                "file_path": absolute_saved_file_path, # This will be None if no file
+                "client_id": client_id,
+                "broadcast_id": broadcast_id,
+                "scheduled": held
+            } for recipient_info in recipients_data]
+            # Raises before accepting any task; a send failing to dispatch
+            # is finished on its own by _enqueue
+            broadcast_scheduler.schedule(broadcast_id, tasks, slots, deliver_by)
+        except Exception as e:
+            # None of the tasks were scheduled, so none will release their reservations
+            if not held:
+                admission.release(client_id, len(recipients_data))
+            upload_store.release(absolute_saved_file_path, len(recipients_data))
+            broadcast_timer.done(broadcast_id, len(recipients_data))
+            if recorded:
+                mcp_forget_broadcast(broadcast_id)
+            if isinstance(e, SchedulerFull):
+                metrics.BROADCASTS.labels('rejected').inc()
+                return jsonify({"status": "error", "message": str(e)}), 429
+            raise
+
+        metrics.BROADCASTS.labels('accepted').inc()
+        logger.info("broadcast accepted", extra={"fields": {
+            "broadcast_id": broadcast_id,
+            "client_id": client_id,
+            "recipients": len(recipients_data),
+            "skipped": len(skipped),
+            "message": base_message_body,
+            "attachment": os.path.basename(absolute_saved_file_path) if absolute_saved_file_path else None,
+            "first_send_at": format_time(slots[0], BROADCAST_TIMEZONE),
+            "last_send_at": format_time(slots[-1], BROADCAST_TIMEZONE),
+        }})
+
+        if held:
+            status_message = (f"{len(recipients_data)} messages have been scheduled between "
+                              f"{format_time(slots[0], BROADCAST_TIMEZONE)} and {format_time(slots[-1], BROADCAST_TIMEZONE)}.")
+        else:
+            status_message = f"{len(recipients_data)} messages have been queued for sending."
+        if skipped:
+            status_message += f" {len(skipped)} recipients were skipped because they can't receive WhatsApp messages."
 
         return jsonify({
             "status": "success", 
-            "message": f"{len(recipients_data)} messages have been queued for sending."
+            "message": status_message,
+            "broadcast_id": broadcast_id,
+            "first_send_at": format_time(slots[0], BROADCAST_TIMEZONE),
+            "last_send_at": format_time(slots[-1], BROADCAST_TIMEZONE),
+            "skipped": skipped
         })
 
     except Exception as e:
-        print(f"Error in /api/send-message-to-selected: {str(e)}")
-        # Log the full traceback for debugging
-        import traceback
-        traceback.print_exc()
+        logger.exception("broadcast request failed")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route('/api/contacts/autocomplete', methods=['GET'])
+def autocomplete_contacts():
+    """Ranked contact suggestions for a partial name or phone number"""
+    query = request.args.get('q', '').strip()
+    try:
+        limit = min(int(request.args.get('limit', 10)), 50)
+    except ValueError:
+        return jsonify({"status": "error", "message": "limit must be an integer"}), 400
+    if not query:
+        return jsonify({"status": "success", "contacts": []})
+
+    contacts = mcp_search_contacts(query, limit)
+    return jsonify({
+        "status": "success",
+        "contacts": [{"jid": c.jid, "name": c.name, "phone_number": c.phone_number} for c in contacts]
+    })
+
+@app.route('/api/broadcasts/engagement', methods=['GET'])
+@app.route('/api/broadcasts/<broadcast_id>/engagement', methods=['GET'])
+def broadcast_engagement(broadcast_id=None):
+    """Reply rate and time to first reply per broadcast (optionally per segment)"""
+    try:
+        limit = min(int(request.args.get('limit', 20)), 200)
+    except ValueError:
+        return jsonify({"status": "error", "message": "limit must be an integer"}), 400
+    by_segment = request.args.get('by_segment', '0').lower() in ('1', 'true', 'yes')
+
+    broadcasts = mcp_get_broadcast_engagement(broadcast_id, limit, by_segment)
+    if broadcast_id and not broadcasts:
+        return jsonify({"status": "error", "message": f"Unknown broadcast {broadcast_id}"}), 404
+    return jsonify({"status": "success", "broadcasts": broadcasts})
+
+@app.route('/api/broadcasts/scheduled', methods=['GET'])
+def scheduled_broadcasts():
+    """Broadcasts with sends still waiting for their slot in the delivery window"""
+    return jsonify({"status": "success", "broadcasts": broadcast_scheduler.pending()})
+
+@app.route('/api/broadcasts/<broadcast_id>/schedule', methods=['DELETE'])
+def cancel_scheduled_broadcast(broadcast_id):
+    """Cancel the sends of a broadcast that haven't gone out yet"""
+    cancelled = broadcast_scheduler.cancel(broadcast_id)
+    if not cancelled:
+        return jsonify({"status": "error", "message": f"No scheduled sends for broadcast {broadcast_id}"}), 404
+    # Held sends have no admission reservation yet
+    for task in cancelled:
+        upload_store.release(task.get('file_path'))
+        broadcast_timer.done(broadcast_id)
+    logger.info("scheduled broadcast cancelled", extra={"fields": {"broadcast_id": broadcast_id, "cancelled": len(cancelled)}})
+    return jsonify({"status": "success", "broadcast_id": broadcast_id, "cancelled": len(cancelled)})
+
+@app.route('/api/chats/<chat_jid>/stats', methods=['GET'])
+def chat_stats(chat_jid):
+    """Message counts, daily activity and most active senders of a chat (days=0 for all time)"""
+    try:
+        days = int(request.args.get('days', 30))
+        top = min(int(request.args.get('top', 10)), 100)
+    except ValueError:
+        return jsonify({"status": "error", "message": "days and top must be integers"}), 400
+    if days < 0 or top < 1:
+        return jsonify({"status": "error", "message": "days must be >= 0 and top >= 1"}), 400
+
+    try:
+        stats = mcp_get_chat_stats(chat_jid, days or None, top)
+    except sqlite3.Error as e:
+        logger.exception("chat stats failed")
+        return jsonify({"status": "error", "message": f"Chat stats are unavailable: {e}"}), 500
+    if stats is None:
+        return jsonify({"status": "error", "message": f"Unknown chat {chat_jid}"}), 404
+    return jsonify({"status": "success", "stats": stats})
+
+@app.route('/api/messages/stream', methods=['GET'])
+def stream_messages():
+    """Server-sent events with messages as the bridge stores them.
+
+    Each event's id is a feed cursor; browsers resend it as Last-Event-ID
+    when they reconnect, so no messages are missed in between.
+    """
+    chat_jid = request.args.get('chat_jid') or None
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+    try:
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "cursor must be an integer"}), 400
+
+    def events(cursor):
+        if cursor is None:
+            cursor = mcp_get_new_messages().cursor
+        yield f"retry: 3000\nid: {cursor}\nevent: ready\ndata: {{}}\n\n"
+        while True:
+            # Blocks on PRAGMA data_version, so an idle stream doesn't query messages
+            feed = mcp_wait_for_messages(cursor, chat_jid, timeout=MESSAGE_STREAM_HEARTBEAT)
+            cursor = feed.cursor
+            if feed.messages:
+                data = json.dumps([asdict(message) for message in feed.messages], default=str)
+                yield f"id: {cursor}\nevent: messages\ndata: {data}\n\n"
+            else:
+                # Keeps proxies from closing the connection and detects disconnected clients
+                yield ": keep-alive\n\n"
+
+    return Response(events(cursor), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus scrape endpoint for queue, send and route metrics"""
+    return Response(generate_latest(), content_type=CONTENT_TYPE_LATEST)
+
 # Serve React App
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -239,11 +578,32 @@ def serve_react_app(path):
     else:
         return send_from_directory(app.static_folder, 'index.html')
 
+_send_workers_lock = threading.Lock()
+_send_workers_started = False
+
+def start_send_workers():
+    """Start one worker thread per bridge and the scheduler, once per process.
+
+    Queues, rate limits, admission counts and held sends live in this
+    process's memory, so only one process may run them: the development
+    server below, or the single gunicorn worker (see gunicorn.conf.py).
+    """
+    global _send_workers_started
+    with _send_workers_lock:
+        if _send_workers_started:
+            return
+        _send_workers_started = True
+    # Sends queued or scheduled by an earlier process were lost with it, and
+    # so were the releases of their attachment references
+    removed = upload_store.reset()
+    if removed:
+        logger.info("removed attachments of sends lost on restart", extra={"fields": {"attachments": removed}})
+    bridge_pool.start(process_message_task, finish_task)
+    broadcast_scheduler.start()
+    logger.info("send workers started", extra={"fields": {"bridges": len(bridge_pool.bridges)}})
+
 if __name__ == '__main__':
-    # Start the worker thread
-    worker_thread = threading.Thread(target=process_message_queue, daemon=True)
-    worker_thread.start()
-    print("Message processing worker thread started.")
+    start_send_workers()
     
     # Use PORT environment variable for deployment, fallback to 5001 for local
     port = int(os.environ.get('PORT', 5001))
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""End-to-end throughput benchmark for /api/send-message-to-selected.
+
+Starts one or more stub bridges (bench/stub_bridge.py) as subprocesses,
+points app.py's bridge pool at them and drives the broadcast endpoint with
+synthetic recipient lists. For each size it reports:
+
+- enqueue latency: time for the endpoint to validate and queue the broadcast
+- sends/sec: recipients delivered per second until the queue drains
+- p50/p99 per-send latency: time spent in each bridge send call
+- memory: peak Python allocations during enqueue and process max RSS
+
+Results are written as JSON; with --baseline the run fails (exit 1) when a
+metric regresses by more than --tolerance, so it can gate CI.
+
+Usage:
+    python bench/broadcast_bench.py --sizes 1000,10000 --bridges 2 --out bench_results/broadcast.json
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from common import compare_to_baseline, percentile, write_results
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_stub(url: str, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/status", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Stub bridge at {url} did not start")
+
+
+def start_stub_bridges(count: int, args) -> list:
+    processes = []
+    urls = []
+    for _ in range(count):
+        port = _free_port()
+        cmd = [
+            sys.executable, os.path.join(BENCH_DIR, "stub_bridge.py"),
+            "--port", str(port),
+            "--latency-ms", str(args.latency_ms),
+            "--jitter-ms", str(args.jitter_ms),
+            "--error-rate", str(args.error_rate),
+        ]
+        processes.append(subprocess.Popen(cmd, stdout=subprocess.DEVNULL))
+        urls.append(f"http://127.0.0.1:{port}")
+    for url in urls:
+        _wait_for_stub(url)
+    return processes, urls
+
+
+def _stub_sends(urls) -> int:
+    total = 0
+    for url in urls:
+        with urllib.request.urlopen(f"{url}/stats", timeout=5) as response:
+            total += json.load(response)["sends"]
+    return total
+
+
+def run_case(app_module, client, size: int, urls, timeout: float) -> dict:
+    recipients = [
+        {"jid": f"34{600000000 + i}@s.whatsapp.net", "first_text": f"Member{i}"}
+        for i in range(size)
+    ]
+    form = {"message": "Benchmark broadcast", "recipients_data": json.dumps(recipients)}
+
+    send_latencies = []
+    latencies_lock = threading.Lock()
+    original_send = app_module.mcp_send_message
+
+    def timed_send(*a, **kw):
+        start = time.perf_counter()
+        try:
+            return original_send(*a, **kw)
+        finally:
+            with latencies_lock:
+                send_latencies.append(time.perf_counter() - start)
+
+    app_module.mcp_send_message = timed_send
+    sends_before = _stub_sends(urls)
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        # multipart, like the FormData the frontend posts
+        response = client.post("/api/send-message-to-selected", data=form, content_type="multipart/form-data")
+        enqueue_seconds = time.perf_counter() - start
+        _, enqueue_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if response.status_code != 200:
+            raise RuntimeError(f"Enqueue failed with HTTP {response.status_code}: {response.get_json()}")
+
+        deadline = time.monotonic() + timeout
+        while app_module.admission.pending and time.monotonic() < deadline:
+            time.sleep(0.01)
+        drain_seconds = time.perf_counter() - start
+        if app_module.admission.pending:
+            raise RuntimeError(f"{app_module.admission.pending} sends still pending after {timeout}s")
+    finally:
+        app_module.mcp_send_message = original_send
+
+    delivered = _stub_sends(urls) - sends_before
+    return {
+        "recipients": size,
+        "delivered": delivered,
+        "enqueue_latency_ms": enqueue_seconds * 1000,
+        "sends_per_sec": delivered / drain_seconds if drain_seconds else 0.0,
+        "send_p50_ms": percentile(send_latencies, 50) * 1000,
+        "send_p99_ms": percentile(send_latencies, 99) * 1000,
+        "enqueue_peak_alloc_mb": enqueue_peak / (1024 * 1024),
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the broadcast send path against stub bridges.")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated recipient counts")
+    parser.add_argument("--bridges", type=int, default=1, help="Number of stub bridges in the pool")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Stub bridge latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--send-interval", type=float, default=0.0,
+                        help="Per-bridge pause between sends (the production default is 2-6 s)")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Max seconds to wait for a queue to drain")
+    parser.add_argument("--out", default=None, help="Write results as JSON to this path")
+    parser.add_argument("--baseline", default=None, help="Compare against a previous results file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression as a fraction")
+    args = parser.parse_args()
+
+    # Resolve paths before moving into the scratch directory
+    out_path = os.path.abspath(args.out) if args.out else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    processes, urls = start_stub_bridges(args.bridges, args)
+    workdir = tempfile.mkdtemp(prefix="broadcast-bench-")
+    try:
+        # app.py reads its configuration at import time
+        os.environ.update({
+            "GO_BRIDGE_BASE_URL": urls[0],
+            "GO_BRIDGE_POOL": ",".join(urls),
+            "BRIDGE_MIN_SEND_INTERVAL": str(args.send_interval),
+            "BRIDGE_MAX_SEND_INTERVAL": str(args.send_interval),
+            "BROADCAST_MAX_QUEUE_DEPTH": str(10 ** 9),
+            "BROADCAST_MAX_PENDING_PER_CLIENT": str(10 ** 9),
+            "BROADCAST_MAX_RECIPIENTS": str(max(int(s) for s in args.sizes.split(",") if s.strip())),
+            "RECIPIENT_CACHE_DB": os.path.join(workdir, "recipient_cache.db"),
+        })
+        os.chdir(workdir)
+        sys.path.insert(0, REPO_ROOT)
+        # The app's log writer binds stdout at import; keep its output off the console
+        sys.stdout = open(os.devnull, "w")
+        import app as app_module
+
+        app_module.bridge_pool.start(app_module.process_message_task, app_module.finish_task)
+        client = app_module.app.test_client()
+
+        results = {}
+        for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+            results[f"recipients_{size}"] = run_case(app_module, client, size, urls, args.timeout)
+        sys.stdout = sys.__stdout__
+
+        print(json.dumps(results, indent=2))
+        if out_path:
+            write_results(out_path, "broadcast", results)
+
+        if baseline_path:
+            regressions = compare_to_baseline(baseline_path, results, args.tolerance,
+                                              higher_is_better=("sends_per_sec", "delivered", "recipients"))
+            if regressions:
+                print("Regressions against baseline:")
+                for line in regressions:
+                    print(f"  {line}")
+                sys.exit(1)
+    finally:
+        sys.stdout = sys.__stdout__
+        for process in processes:
+            process.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
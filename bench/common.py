@@ -0,0 +1,60 @@
+"""Shared helpers for the benchmark scripts: result files and baseline checks."""
+import json
+import math
+import os
+import platform
+import time
+from typing import Dict, List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def write_results(path: str, benchmark: str, results: Dict[str, Dict[str, float]]) -> None:
+    payload = {
+        "benchmark": benchmark,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+
+
+def compare_to_baseline(
+    baseline_path: str,
+    results: Dict[str, Dict[str, float]],
+    tolerance: float,
+    higher_is_better: tuple = (),
+) -> List[str]:
+    """Return a description of every metric that regressed beyond ``tolerance``.
+
+    Metrics are lower-is-better unless their name is in ``higher_is_better``.
+    ``tolerance`` is a fraction, e.g. 0.2 allows a 20% slowdown.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(case, {}).get(metric)
+            if not isinstance(old, (int, float)) or not isinstance(value, (int, float)) or old <= 0:
+                continue
+            if metric in higher_is_better:
+                regressed = value < old * (1 - tolerance)
+            else:
+                regressed = value > old * (1 + tolerance)
+            if regressed:
+                regressions.append(f"{case}.{metric}: {old:.4g} -> {value:.4g}")
+    return regressions
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""Generate a synthetic messages.db with the WhatsApp bridge's schema.
+
+The layout mirrors what MCP/whatsapp-bridge/main.go writes: a ``chats`` row
+per conversation and a ``messages`` row per stored message, timestamps in
+go-sqlite3's text format (plus Unix seconds in ``ts``) and senders as bare
+phone numbers. Chat activity
+is skewed (a few busy groups, a long tail of quiet direct chats), like a
+real club account.
+
+Usage:
+    python bench/generate_messages_db.py --out bench_data/medium.db --chats 500 --messages 100000
+"""
+import argparse
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+# Keep in sync with NewMessageStore in MCP/whatsapp-bridge/main.go
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    jid TEXT PRIMARY KEY,
+    name TEXT,
+    last_message_time TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT,
+    chat_jid TEXT,
+    sender TEXT,
+    content TEXT,
+    timestamp TIMESTAMP,
+    is_from_me BOOLEAN,
+    media_type TEXT,
+    filename TEXT,
+    url TEXT,
+    media_key BLOB,
+    file_sha256 BLOB,
+    file_enc_sha256 BLOB,
+    file_length INTEGER,
+    PRIMARY KEY (id, chat_jid),
+    FOREIGN KEY (chat_jid) REFERENCES chats(jid)
+);
+"""
+
+# Keep in sync with schemaMigrations in MCP/whatsapp-bridge/main.go
+MIGRATIONS = [
+    # 1: chat_summary
+    """
+    CREATE TABLE chat_summary (
+        chat_jid TEXT PRIMARY KEY,
+        last_message_id TEXT,
+        last_message_time TIMESTAMP,
+        last_sender TEXT,
+        last_content TEXT,
+        last_is_from_me BOOLEAN,
+        last_media_type TEXT,
+        last_from_me_time TIMESTAMP,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        unread_count INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX idx_chat_summary_last_message_time ON chat_summary(last_message_time);
+    CREATE INDEX idx_messages_chat_timestamp ON messages(chat_jid, timestamp);
+    CREATE INDEX idx_chats_name ON chats(name);
+
+    INSERT INTO chat_summary (chat_jid, message_count, last_from_me_time)
+    SELECT chat_jid, COUNT(*), MAX(CASE WHEN is_from_me THEN timestamp END)
+    FROM messages GROUP BY chat_jid;
+
+    INSERT INTO chat_summary (chat_jid) SELECT jid FROM chats WHERE true
+    ON CONFLICT(chat_jid) DO NOTHING;
+
+    UPDATE chat_summary SET
+        (last_message_id, last_message_time, last_sender, last_content, last_is_from_me, last_media_type) = (
+            SELECT id, timestamp, sender, content, is_from_me, media_type FROM messages m
+            WHERE m.chat_jid = chat_summary.chat_jid
+            ORDER BY timestamp DESC, rowid DESC LIMIT 1
+        ),
+        unread_count = (
+            SELECT COUNT(*) FROM messages m
+            WHERE m.chat_jid = chat_summary.chat_jid AND NOT m.is_from_me
+            AND m.timestamp > COALESCE(chat_summary.last_from_me_time, '')
+        );
+
+    CREATE TRIGGER chat_summary_after_chat_insert AFTER INSERT ON chats BEGIN
+        INSERT INTO chat_summary (chat_jid) VALUES (NEW.jid)
+        ON CONFLICT(chat_jid) DO NOTHING;
+    END;
+
+    CREATE TRIGGER chat_summary_after_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO chat_summary (chat_jid) VALUES (NEW.chat_jid)
+        ON CONFLICT(chat_jid) DO NOTHING;
+
+        UPDATE chat_summary SET
+            message_count = message_count + 1,
+            last_message_id = CASE WHEN last_message_time IS NULL OR NEW.timestamp >= last_message_time THEN NEW.id ELSE last_message_id END,
+            last_sender = CASE WHEN last_message_time IS NULL OR NEW.timestamp >= last_message_time THEN NEW.sender ELSE last_sender END,
+            last_content = CASE WHEN last_message_time IS NULL OR NEW.timestamp >= last_message_time THEN NEW.content ELSE last_content END,
+            last_is_from_me = CASE WHEN last_message_time IS NULL OR NEW.timestamp >= last_message_time THEN NEW.is_from_me ELSE last_is_from_me END,
+            last_media_type = CASE WHEN last_message_time IS NULL OR NEW.timestamp >= last_message_time THEN NEW.media_type ELSE last_media_type END,
+            last_message_time = CASE WHEN last_message_time IS NULL OR NEW.timestamp >= last_message_time THEN NEW.timestamp ELSE last_message_time END
+        WHERE chat_jid = NEW.chat_jid;
+
+        UPDATE chat_summary SET unread_count = unread_count + 1
+        WHERE chat_jid = NEW.chat_jid AND NOT NEW.is_from_me
+        AND NEW.timestamp > COALESCE(last_from_me_time, '');
+
+        -- An outgoing message marks everything before it as read
+        UPDATE chat_summary SET
+            last_from_me_time = NEW.timestamp,
+            unread_count = (
+                SELECT COUNT(*) FROM messages m
+                WHERE m.chat_jid = NEW.chat_jid AND NOT m.is_from_me AND m.timestamp > NEW.timestamp
+            )
+        WHERE chat_jid = NEW.chat_jid AND NEW.is_from_me
+        AND NEW.timestamp > COALESCE(last_from_me_time, '');
+    END;
+
+    CREATE TRIGGER chat_summary_after_update AFTER UPDATE OF content, sender, media_type ON messages BEGIN
+        UPDATE chat_summary SET
+            last_content = NEW.content,
+            last_sender = NEW.sender,
+            last_media_type = NEW.media_type
+        WHERE chat_jid = NEW.chat_jid AND last_message_id = NEW.id;
+    END;
+
+    CREATE TRIGGER chat_summary_after_delete AFTER DELETE ON messages BEGIN
+        UPDATE chat_summary SET
+            message_count = message_count - 1,
+            unread_count = unread_count - (NOT OLD.is_from_me AND OLD.timestamp > COALESCE(last_from_me_time, ''))
+        WHERE chat_jid = OLD.chat_jid;
+
+        UPDATE chat_summary SET
+            (last_message_id, last_message_time, last_sender, last_content, last_is_from_me, last_media_type) = (
+                SELECT id, timestamp, sender, content, is_from_me, media_type FROM messages m
+                WHERE m.chat_jid = OLD.chat_jid
+                ORDER BY timestamp DESC, rowid DESC LIMIT 1
+            )
+        WHERE chat_jid = OLD.chat_jid AND last_message_id = OLD.id;
+
+        UPDATE chat_summary SET
+            (last_from_me_time, unread_count) = (
+                SELECT t, (
+                    SELECT COUNT(*) FROM messages m
+                    WHERE m.chat_jid = OLD.chat_jid AND NOT m.is_from_me AND m.timestamp > COALESCE(t, '')
+                )
+                FROM (SELECT MAX(timestamp) AS t FROM messages WHERE chat_jid = OLD.chat_jid AND is_from_me)
+            )
+        WHERE chat_jid = OLD.chat_jid AND OLD.is_from_me AND OLD.timestamp = last_from_me_time;
+    END;
+    """,
+    # 2: chats.phone
+    """
+    ALTER TABLE chats ADD COLUMN phone TEXT;
+    UPDATE chats SET phone = substr(jid, 1, instr(jid, '@') - 1)
+    WHERE jid LIKE '%@s.whatsapp.net';
+    CREATE INDEX idx_chats_phone ON chats(phone);
+    """,
+    # 3: retention.
+    """
+    CREATE TABLE retention_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        archived_through TIMESTAMP
+    );
+    INSERT INTO retention_state (id) VALUES (1);
+    CREATE INDEX idx_messages_timestamp ON messages(timestamp);
+    """,
+    # 4: messages.ts
+    """
+    ALTER TABLE messages ADD COLUMN ts INTEGER;
+    UPDATE messages SET ts = unixepoch(timestamp);
+    CREATE INDEX idx_messages_chat_ts ON messages(chat_jid, ts);
+    CREATE INDEX idx_messages_ts ON messages(ts);
+    DROP INDEX idx_messages_timestamp;
+
+    ALTER TABLE retention_state ADD COLUMN archived_through_ts INTEGER;
+    UPDATE retention_state SET archived_through_ts = unixepoch(archived_through);
+    """,
+    # 5: chat_participants
+    """
+    CREATE TABLE chat_participants (
+        contact_jid TEXT NOT NULL,
+        chat_jid TEXT NOT NULL,
+        first_ts INTEGER,
+        last_ts INTEGER,
+        last_message_id TEXT,
+        message_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (contact_jid, chat_jid)
+    ) WITHOUT ROWID;
+    CREATE INDEX idx_chat_participants_contact_last ON chat_participants(contact_jid, last_ts);
+
+    WITH m AS (
+        SELECT chat_jid, ts,
+            CASE WHEN sender = '' THEN NULL WHEN instr(sender, '@') THEN sender ELSE sender || '@s.whatsapp.net' END AS sender_jid
+        FROM messages
+    )
+    INSERT INTO chat_participants (contact_jid, chat_jid, first_ts, last_ts, message_count)
+    SELECT contact_jid, chat_jid, MIN(ts), MAX(ts), COUNT(*) FROM (
+        SELECT sender_jid AS contact_jid, chat_jid, ts FROM m WHERE sender_jid IS NOT NULL
+        UNION ALL
+        SELECT chat_jid, chat_jid, ts FROM m WHERE chat_jid NOT LIKE '%@g.us' AND sender_jid IS NOT chat_jid
+    )
+    GROUP BY contact_jid, chat_jid;
+
+    UPDATE chat_participants SET last_message_id = (
+        SELECT id FROM messages m
+        WHERE m.chat_jid = chat_participants.chat_jid AND m.ts = chat_participants.last_ts
+        AND (chat_participants.chat_jid = chat_participants.contact_jid
+            OR CASE WHEN instr(m.sender, '@') THEN m.sender ELSE m.sender || '@s.whatsapp.net' END = chat_participants.contact_jid)
+        ORDER BY m.rowid DESC LIMIT 1
+    );
+
+    CREATE TRIGGER chat_participants_after_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO chat_participants (contact_jid, chat_jid, first_ts, last_ts, last_message_id, message_count)
+        SELECT contact_jid, NEW.chat_jid, NEW.ts, NEW.ts, NEW.id, 1 FROM (
+            SELECT CASE WHEN instr(NEW.sender, '@') THEN NEW.sender ELSE NEW.sender || '@s.whatsapp.net' END AS contact_jid
+            WHERE NEW.sender != ''
+            UNION
+            SELECT NEW.chat_jid WHERE NEW.chat_jid NOT LIKE '%@g.us'
+        ) WHERE true
+        ON CONFLICT (contact_jid, chat_jid) DO UPDATE SET
+            first_ts = MIN(first_ts, excluded.first_ts),
+            last_message_id = CASE WHEN excluded.last_ts >= last_ts THEN excluded.last_message_id ELSE last_message_id END,
+            last_ts = MAX(last_ts, excluded.last_ts),
+            message_count = message_count + 1;
+    END;
+    """,
+    # 6: activity
+    """
+    CREATE TABLE chat_activity_daily (
+        chat_jid TEXT NOT NULL,
+        day TEXT NOT NULL,
+        messages INTEGER NOT NULL,
+        media INTEGER NOT NULL,
+        from_me INTEGER NOT NULL,
+        first_ts INTEGER,
+        last_ts INTEGER,
+        PRIMARY KEY (chat_jid, day)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE chat_activity (
+        chat_jid TEXT PRIMARY KEY,
+        messages INTEGER NOT NULL,
+        media INTEGER NOT NULL,
+        from_me INTEGER NOT NULL,
+        first_ts INTEGER,
+        last_ts INTEGER
+    ) WITHOUT ROWID;
+
+    CREATE TABLE sender_activity_daily (
+        chat_jid TEXT NOT NULL,
+        sender TEXT NOT NULL,
+        day TEXT NOT NULL,
+        messages INTEGER NOT NULL,
+        media INTEGER NOT NULL,
+        first_ts INTEGER,
+        last_ts INTEGER,
+        PRIMARY KEY (chat_jid, day, sender)
+    ) WITHOUT ROWID;
+
+    CREATE TABLE sender_activity (
+        chat_jid TEXT NOT NULL,
+        sender TEXT NOT NULL,
+        messages INTEGER NOT NULL,
+        media INTEGER NOT NULL,
+        first_ts INTEGER,
+        last_ts INTEGER,
+        PRIMARY KEY (chat_jid, sender)
+    ) WITHOUT ROWID;
+    CREATE INDEX idx_sender_activity_top ON sender_activity(chat_jid, messages);
+
+    CREATE TABLE rollup_state (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        last_rowid INTEGER NOT NULL
+    );
+    INSERT INTO rollup_state (id, last_rowid) VALUES (1, 0);
+    """,
+    # 7: chat_summary.last_ts
+    """
+    ALTER TABLE chat_summary ADD COLUMN last_ts INTEGER;
+    UPDATE chat_summary SET
+        (last_message_id, last_message_time, last_ts, last_sender, last_content, last_is_from_me, last_media_type) = (
+            SELECT id, timestamp, ts, sender, content, is_from_me, media_type FROM messages m
+            WHERE m.chat_jid = chat_summary.chat_jid
+            ORDER BY ts DESC, rowid DESC LIMIT 1
+        );
+    CREATE INDEX idx_chat_summary_last_ts ON chat_summary(last_ts);
+    DROP INDEX idx_chat_summary_last_message_time;
+
+    DROP TRIGGER chat_summary_after_insert;
+    CREATE TRIGGER chat_summary_after_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO chat_summary (chat_jid) VALUES (NEW.chat_jid)
+        ON CONFLICT(chat_jid) DO NOTHING;
+
+        UPDATE chat_summary SET
+            message_count = message_count + 1,
+            last_message_id = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.id ELSE last_message_id END,
+            last_sender = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.sender ELSE last_sender END,
+            last_content = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.content ELSE last_content END,
+            last_is_from_me = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.is_from_me ELSE last_is_from_me END,
+            last_media_type = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.media_type ELSE last_media_type END,
+            last_message_time = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.timestamp ELSE last_message_time END,
+            last_ts = CASE WHEN last_ts IS NULL OR NEW.ts >= last_ts THEN NEW.ts ELSE last_ts END
+        WHERE chat_jid = NEW.chat_jid;
+
+        UPDATE chat_summary SET unread_count = unread_count + 1
+        WHERE chat_jid = NEW.chat_jid AND NOT NEW.is_from_me
+        AND NEW.timestamp > COALESCE(last_from_me_time, '');
+
+        -- An outgoing message marks everything before it as read
+        UPDATE chat_summary SET
+            last_from_me_time = NEW.timestamp,
+            unread_count = (
+                SELECT COUNT(*) FROM messages m
+                WHERE m.chat_jid = NEW.chat_jid AND NOT m.is_from_me AND m.timestamp > NEW.timestamp
+            )
+        WHERE chat_jid = NEW.chat_jid AND NEW.is_from_me
+        AND NEW.timestamp > COALESCE(last_from_me_time, '');
+    END;
+
+    DROP TRIGGER chat_summary_after_delete;
+    CREATE TRIGGER chat_summary_after_delete AFTER DELETE ON messages BEGIN
+        UPDATE chat_summary SET
+            message_count = message_count - 1,
+            unread_count = unread_count - (NOT OLD.is_from_me AND OLD.timestamp > COALESCE(last_from_me_time, ''))
+        WHERE chat_jid = OLD.chat_jid;
+
+        UPDATE chat_summary SET
+            (last_message_id, last_message_time, last_ts, last_sender, last_content, last_is_from_me, last_media_type) = (
+                SELECT id, timestamp, ts, sender, content, is_from_me, media_type FROM messages m
+                WHERE m.chat_jid = OLD.chat_jid
+                ORDER BY ts DESC, rowid DESC LIMIT 1
+            )
+        WHERE chat_jid = OLD.chat_jid AND last_message_id = OLD.id;
+
+        UPDATE chat_summary SET
+            (last_from_me_time, unread_count) = (
+                SELECT t, (
+                    SELECT COUNT(*) FROM messages m
+                    WHERE m.chat_jid = OLD.chat_jid AND NOT m.is_from_me AND m.timestamp > COALESCE(t, '')
+                )
+                FROM (SELECT MAX(timestamp) AS t FROM messages WHERE chat_jid = OLD.chat_jid AND is_from_me)
+            )
+        WHERE chat_jid = OLD.chat_jid AND OLD.is_from_me AND OLD.timestamp = last_from_me_time;
+    END;
+    """,
+]
+
+FIRST_NAMES = ["Ana", "Lucía", "Mario", "Tomás", "Zoë", "Jörg", "Chloé", "Ines", "Pablo", "Sofía",
+               "Liam", "Noah", "Emma", "Mia", "Hugo", "Léa", "Ziyad", "Yulia", "Zuzanna", "Björn"]
+LAST_NAMES = ["García", "Müller", "Smith", "Rossi", "Dubois", "Novak", "Silva", "Kowalski",
+              "Ploquin", "Saber", "Klimovich", "Slotwinska", "Raphael", "Nguyen", "O'Brien"]
+WORDS = ["padel", "tonight", "court", "booking", "members", "event", "dinner", "see", "you", "there",
+         "thanks", "tomorrow", "tournament", "friday", "who", "is", "coming", "great", "photo", "club",
+         "announcement", "schedule", "changed", "welcome", "new", "please", "confirm", "rsvp", "link"]
+COUNTRY_CODES = ["34", "33", "44", "49", "1", "39", "351", "48"]
+MEDIA_TYPES = [("image", "jpg"), ("video", "mp4"), ("audio", "ogg"), ("document", "pdf")]
+
+OWN_NUMBER = "34600000000"
+
+
+# Keep in sync with rollupSQL in MCP/whatsapp-bridge/main.go
+ROLLUP_SQL = [
+    """INSERT INTO chat_activity_daily (chat_jid, day, messages, media, from_me, first_ts, last_ts)
+        SELECT chat_jid, date(ts, 'unixepoch'), COUNT(*), COUNT(NULLIF(media_type, '')), SUM(is_from_me), MIN(ts), MAX(ts)
+        FROM messages WHERE rowid > ?1 AND rowid <= ?2 AND ts IS NOT NULL
+        GROUP BY chat_jid, date(ts, 'unixepoch')
+        ON CONFLICT (chat_jid, day) DO UPDATE SET
+            messages = messages + excluded.messages, media = media + excluded.media, from_me = from_me + excluded.from_me,
+            first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts)""",
+    """INSERT INTO chat_activity (chat_jid, messages, media, from_me, first_ts, last_ts)
+        SELECT chat_jid, COUNT(*), COUNT(NULLIF(media_type, '')), SUM(is_from_me), MIN(ts), MAX(ts)
+        FROM messages WHERE rowid > ?1 AND rowid <= ?2 AND ts IS NOT NULL
+        GROUP BY chat_jid
+        ON CONFLICT (chat_jid) DO UPDATE SET
+            messages = messages + excluded.messages, media = media + excluded.media, from_me = from_me + excluded.from_me,
+            first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts)""",
+    """INSERT INTO sender_activity_daily (chat_jid, sender, day, messages, media, first_ts, last_ts)
+        SELECT chat_jid, CASE WHEN instr(sender, '@') THEN sender ELSE sender || '@s.whatsapp.net' END AS sender_jid,
+            date(ts, 'unixepoch'), COUNT(*), COUNT(NULLIF(media_type, '')), MIN(ts), MAX(ts)
+        FROM messages WHERE rowid > ?1 AND rowid <= ?2 AND ts IS NOT NULL AND sender != ''
+        GROUP BY chat_jid, sender_jid, date(ts, 'unixepoch')
+        ON CONFLICT (chat_jid, day, sender) DO UPDATE SET
+            messages = messages + excluded.messages, media = media + excluded.media,
+            first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts)""",
+    """INSERT INTO sender_activity (chat_jid, sender, messages, media, first_ts, last_ts)
+        SELECT chat_jid, CASE WHEN instr(sender, '@') THEN sender ELSE sender || '@s.whatsapp.net' END AS sender_jid,
+            COUNT(*), COUNT(NULLIF(media_type, '')), MIN(ts), MAX(ts)
+        FROM messages WHERE rowid > ?1 AND rowid <= ?2 AND ts IS NOT NULL AND sender != ''
+        GROUP BY chat_jid, sender_jid
+        ON CONFLICT (chat_jid, sender) DO UPDATE SET
+            messages = messages + excluded.messages, media = media + excluded.media,
+            first_ts = MIN(first_ts, excluded.first_ts), last_ts = MAX(last_ts, excluded.last_ts)""",
+]
+
+
+def go_timestamp(ts: datetime) -> str:
+    """Format a datetime the way go-sqlite3 stores time.Time values."""
+    return ts.strftime("%Y-%m-%d %H:%M:%S") + "+00:00"
+
+
+def create_schema(conn: sqlite3.Connection) -> None:
+    """Create the tables and apply every migration, as the bridge does on startup."""
+    conn.executescript(SCHEMA)
+    for version, migration in enumerate(MIGRATIONS, start=1):
+        conn.executescript(migration)
+        conn.execute(f"PRAGMA user_version = {version}")
+
+
+def random_phone(rng: random.Random) -> str:
+    code = rng.choice(COUNTRY_CODES)
+    return code + "".join(rng.choice("0123456789") for _ in range(11 - len(code))) + str(rng.randint(0, 9))
+
+
+def generate(path: str, chats: int, messages: int, group_ratio: float, media_ratio: float,
+             days: int, seed: int) -> None:
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path)
+    # Same journal mode as the bridge's store
+    conn.execute("PRAGMA journal_mode=WAL")
+    create_schema(conn)
+
+    contacts = []
+    seen = set()
+    while len(contacts) < max(chats, 10):
+        phone = random_phone(rng)
+        if phone in seen:
+            continue
+        seen.add(phone)
+        contacts.append((phone, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"))
+
+    group_count = max(1, int(chats * group_ratio))
+    chat_rows = []
+    for i in range(chats):
+        if i < group_count:
+            jid = f"1203630{rng.randint(10 ** 10, 10 ** 11 - 1)}@g.us"
+            members = rng.sample(contacts, k=min(len(contacts), rng.randint(5, 60)))
+            chat_rows.append({"jid": jid, "name": f"Club {rng.choice(WORDS).title()} {i}", "phone": None,
+                              "members": members})
+        else:
+            phone, name = contacts[i - group_count]
+            chat_rows.append({"jid": f"{phone}@s.whatsapp.net", "name": name, "phone": phone,
+                              "members": [(phone, name)]})
+
+    # Zipf-like activity: a handful of chats carry most of the traffic
+    weights = [1.0 / (rank + 1) ** 0.9 for rank in range(chats)]
+    rng.shuffle(weights)
+
+    start = datetime.now(timezone.utc) - timedelta(days=days)
+    span = days * 86400
+    offsets = sorted(rng.random() * span for _ in range(messages))
+
+    last_time = {}
+    batch = []
+    for n, offset in enumerate(offsets):
+        chat = rng.choices(chat_rows, weights=weights)[0]
+        ts = start + timedelta(seconds=offset)
+        is_from_me = rng.random() < 0.2
+        sender = OWN_NUMBER if is_from_me else rng.choice(chat["members"])[0]
+
+        media_type = filename = url = None
+        media_key = file_sha256 = file_enc_sha256 = None
+        file_length = None
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 25)))
+        if rng.random() < media_ratio:
+            media_type, ext = rng.choice(MEDIA_TYPES)
+            filename = f"{media_type}_{ts:%Y%m%d_%H%M%S}.{ext}"
+            url = f"https://mmg.whatsapp.net/v/t62.7118-24/{rng.getrandbits(64)}_n.enc?ccb=11-4"
+            media_key = rng.randbytes(32)
+            file_sha256 = rng.randbytes(32)
+            file_enc_sha256 = rng.randbytes(32)
+            file_length = rng.randint(10_000, 5_000_000)
+            content = "" if rng.random() < 0.7 else content
+
+        batch.append((
+            f"3EB0{n:016X}", chat["jid"], sender, content, go_timestamp(ts), int(ts.timestamp()), is_from_me,
+            media_type or "", filename or "", url or "", media_key, file_sha256, file_enc_sha256, file_length,
+        ))
+        last_time[chat["jid"]] = ts
+
+        if len(batch) >= 10_000:
+            _flush(conn, chat_rows, last_time, batch)
+            batch = []
+    _flush(conn, chat_rows, last_time, batch)
+    rollup_activity(conn)
+    conn.close()
+
+
+def _flush(conn, chat_rows, last_time, batch) -> None:
+    with conn:
+        # The bridge upserts the chat before each message it stores
+        conn.executemany(
+            "INSERT OR REPLACE INTO chats (jid, name, last_message_time, phone) VALUES (?, ?, ?, ?)",
+            [(c["jid"], c["name"], go_timestamp(last_time[c["jid"]]) if c["jid"] in last_time else None, c["phone"])
+             for c in chat_rows]
+        )
+        conn.executemany(
+            """INSERT INTO messages
+            (id, chat_jid, sender, content, timestamp, ts, is_from_me, media_type, filename, url, media_key, file_sha256, file_enc_sha256, file_length)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            batch
+        )
+
+
+def rollup_activity(conn: sqlite3.Connection) -> None:
+    """Bring the activity rollups up to date, as the bridge does every minute."""
+    with conn:
+        after = conn.execute("SELECT last_rowid FROM rollup_state").fetchone()[0]
+        upto = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM messages").fetchone()[0]
+        for query in ROLLUP_SQL:
+            conn.execute(query, (after, upto))
+        conn.execute("UPDATE rollup_state SET last_rowid = ?", (upto,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic WhatsApp bridge messages.db.")
+    parser.add_argument("--out", required=True, help="Path of the database to create (overwritten)")
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--group-ratio", type=float, default=0.1, help="Fraction of chats that are groups")
+    parser.add_argument("--media-ratio", type=float, default=0.1, help="Fraction of messages carrying media")
+    parser.add_argument("--days", type=int, default=365, help="History length the messages are spread over")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    generate(args.out, args.chats, args.messages, args.group_ratio, args.media_ratio, args.days, args.seed)
+    print(f"Wrote {args.messages} messages in {args.chats} chats to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
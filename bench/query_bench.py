@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Benchmark the whatsapp.py read functions against synthetic databases.
+
+For every scale, a messages.db is generated with bench/generate_messages_db.py
+(and kept in --data-dir for later runs), MESSAGES_DB_PATH is pointed at it,
+and each read function the MCP server exposes is timed with representative
+arguments taken from the data. Results are written as JSON and can be
+compared against a stored baseline to catch query regressions before
+deploying.
+
+Usage:
+    python bench/query_bench.py --scales small,medium --out bench_results/queries.json
+    python bench/query_bench.py --scales small,medium --baseline bench_results/queries.json
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+MCP_SERVER_DIR = os.path.join(REPO_ROOT, "MCP", "whatsapp-mcp-server")
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, MCP_SERVER_DIR)
+
+from common import compare_to_baseline, percentile, write_results
+from generate_messages_db import MIGRATIONS, generate
+
+import whatsapp
+
+# name: (chats, messages)
+SCALES = {
+    "small": (50, 5_000),
+    "medium": (500, 100_000),
+    "large": (2_000, 1_000_000),
+}
+
+
+def ensure_database(data_dir: str, scale: str, seed: int) -> str:
+    chats, messages = SCALES[scale]
+    # The schema version is part of the name so a migration regenerates the data
+    path = os.path.join(data_dir, f"{scale}-{chats}x{messages}-seed{seed}-v{len(MIGRATIONS)}.db")
+    if not os.path.exists(path):
+        print(f"Generating {scale} database ({chats} chats, {messages} messages)...", flush=True)
+        generate(path, chats, messages, group_ratio=0.1, media_ratio=0.1, days=365, seed=seed)
+    return path
+
+
+def pick_arguments(db_path: str) -> dict:
+    """Choose realistic arguments (busiest group, a direct contact, ...) from the data."""
+    conn = sqlite3.connect(db_path)
+    try:
+        group_jid = conn.execute("""
+            SELECT chat_jid FROM messages WHERE chat_jid LIKE '%@g.us'
+            GROUP BY chat_jid ORDER BY COUNT(*) DESC LIMIT 1
+        """).fetchone()[0]
+        direct_jid, direct_name = conn.execute("""
+            SELECT jid, name FROM chats WHERE jid LIKE '%@s.whatsapp.net'
+            ORDER BY last_message_time DESC LIMIT 1
+        """).fetchone()
+        message_id = conn.execute(
+            "SELECT id FROM messages WHERE chat_jid = ? ORDER BY timestamp DESC LIMIT 1 OFFSET 10", (group_jid,)
+        ).fetchone()[0]
+        first_ts, last_ts = conn.execute("SELECT MIN(timestamp), MAX(timestamp) FROM messages").fetchone()
+    finally:
+        conn.close()
+
+    phone = direct_jid.split("@")[0]
+    first, last = datetime.fromisoformat(first_ts), datetime.fromisoformat(last_ts)
+    middle = first + (last - first) / 2
+    return {
+        "group_jid": group_jid,
+        "direct_jid": direct_jid,
+        "contact_name": direct_name.split(" ")[0],
+        "phone": phone,
+        "message_id": message_id,
+        # A one-month window in the middle of the history
+        "after": (middle - timedelta(days=15)).isoformat(),
+        "before": (middle + timedelta(days=15)).isoformat(),
+    }
+
+
+def cases(a: dict) -> dict:
+    return {
+        "list_messages": lambda: whatsapp.list_messages(),
+        "list_messages_no_context": lambda: whatsapp.list_messages(include_context=False),
+        "list_messages_chat": lambda: whatsapp.list_messages(chat_jid=a["group_jid"], include_context=False),
+        "list_messages_query": lambda: whatsapp.list_messages(query="tournament", include_context=False),
+        "list_messages_range": lambda: whatsapp.list_messages(after=a["after"], before=a["before"], include_context=False),
+        "list_messages_sender": lambda: whatsapp.list_messages(sender_phone_number=a["phone"], include_context=False),
+        "get_message_context": lambda: whatsapp.get_message_context(a["message_id"]),
+        "list_chats": lambda: whatsapp.list_chats(),
+        "list_chats_query": lambda: whatsapp.list_chats(query="club"),
+        "list_chats_by_name": lambda: whatsapp.list_chats(sort_by="name"),
+        "get_chat": lambda: whatsapp.get_chat(a["group_jid"]),
+        "get_direct_chat_by_contact": lambda: whatsapp.get_direct_chat_by_contact(a["phone"]),
+        "get_contact_chats": lambda: whatsapp.get_contact_chats(a["direct_jid"]),
+        "get_last_interaction": lambda: whatsapp.get_last_interaction(a["direct_jid"]),
+        "get_chat_stats": lambda: whatsapp.get_chat_stats(a["group_jid"]),
+        "get_chat_stats_all_time": lambda: whatsapp.get_chat_stats(a["group_jid"], days=None),
+        "search_contacts": lambda: whatsapp.search_contacts(a["contact_name"]),
+        "search_contacts_phone": lambda: whatsapp.search_contacts(a["phone"][:6]),
+    }
+
+
+def time_case(fn, repeat: int) -> dict:
+    fn()  # warm the page cache so runs are comparable
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "median_ms": statistics.median(samples),
+        "p95_ms": percentile(samples, 95),
+        "min_ms": min(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark whatsapp.py read functions.")
+    parser.add_argument("--scales", default="small,medium", help=f"Comma-separated, from: {', '.join(SCALES)}")
+    parser.add_argument("--data-dir", default=os.path.join(REPO_ROOT, "bench_data"),
+                        help="Where generated databases are kept between runs")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", default=None, help="Comma-separated case names to run")
+    parser.add_argument("--cached", action="store_true",
+                        help="Leave the query cache on (by default every call runs its SQL)")
+    parser.add_argument("--out", default=None, help="Write results as JSON to this path")
+    parser.add_argument("--baseline", default=None, help="Compare against a previous results file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed regression as a fraction")
+    args = parser.parse_args()
+
+    only = set(args.only.split(",")) if args.only else None
+    if not args.cached:
+        whatsapp.query_cache.max_entries = 0
+    results = {}
+    for scale in (s.strip() for s in args.scales.split(",") if s.strip()):
+        if scale not in SCALES:
+            parser.error(f"Unknown scale {scale!r}")
+        db_path = ensure_database(args.data_dir, scale, args.seed)
+        whatsapp.MESSAGES_DB_PATH = db_path
+        for name, fn in cases(pick_arguments(db_path)).items():
+            if only and name not in only:
+                continue
+            results[f"{scale}.{name}"] = time_case(fn, args.repeat)
+            print(f"{scale:>8} {name:<28} median {results[f'{scale}.{name}']['median_ms']:9.3f} ms", flush=True)
+
+    if args.out:
+        write_results(args.out, "queries", results)
+
+    if args.baseline:
+        regressions = compare_to_baseline(args.baseline, results, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
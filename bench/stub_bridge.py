@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Go WhatsApp bridge, for benchmarks and failover drills.
+
+Implements the HTTP API app.py and whatsapp.py talk to (/status, /qr,
+/api/send including async sends, /api/jobs, /api/download, /api/check)
+without a phone or a WhatsApp account. Latency and failures can be injected, and /stats reports what the
+stub has seen so benchmarks can check their numbers against it.
+
+Usage:
+    python bench/stub_bridge.py --port 18082 --latency-ms 50 --jitter-ms 20 --error-rate 0.01
+"""
+import argparse
+import json
+import queue
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubState:
+    def __init__(self, args):
+        self.latency = args.latency_ms / 1000.0
+        self.jitter = args.jitter_ms / 1000.0
+        self.error_rate = args.error_rate
+        self.disconnect_after = args.disconnect_after
+        self.unregistered_prefix = args.unregistered_prefix
+        self.lock = threading.Lock()
+        self.sends = 0
+        self.errors = 0
+        self.checks = 0
+        # Async sends, run by a worker pool like the bridge's send queue
+        self.pending = queue.Queue(maxsize=args.send_queue_size)
+        self.jobs = {}
+        for _ in range(args.send_workers):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    @property
+    def connected(self) -> bool:
+        return self.disconnect_after is None or self.sends < self.disconnect_after
+
+    def delay(self) -> None:
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def send(self, recipient: str):
+        """Simulate one send; returns (success, message)."""
+        if not self.connected:
+            return False, "Not connected to WhatsApp"
+        self.delay()
+        with self.lock:
+            self.sends += 1
+            failed = random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        if failed:
+            return False, "Error sending message: injected failure"
+        return True, f"Message sent to {recipient}"
+
+    def submit(self, recipient: str):
+        job = {"job_id": uuid.uuid4().hex, "recipient": recipient, "status": "queued", "success": False,
+               "queued_at": time.time()}
+        with self.lock:
+            try:
+                self.pending.put_nowait(job)
+            except queue.Full:
+                return None
+            self.jobs[job["job_id"]] = job
+            return dict(job)
+
+    def _work(self) -> None:
+        while True:
+            job = self.pending.get()
+            with self.lock:
+                job["status"] = "sending"
+            success, message = self.send(job["recipient"])
+            with self.lock:
+                job.update(status="sent" if success else "failed", success=success, message=message,
+                           finished_at=time.time())
+
+    def job_status(self, job_ids):
+        with self.lock:
+            return {job_id: dict(self.jobs[job_id]) for job_id in job_ids if job_id in self.jobs}
+
+
+def make_handler(state: StubState):
+    class StubBridgeHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            # Per-request logging would dominate benchmark timings
+            pass
+
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _read_json(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                return json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                return None
+
+        def do_GET(self):
+            if self.path == "/status":
+                self._send_json({"connected": state.connected})
+            elif self.path == "/qr":
+                if state.connected:
+                    self._send_json({"qr_base64": None, "message": "Already connected"})
+                else:
+                    self._send_json({"qr_base64": None, "message": "QR code not available or not connected yet"})
+            elif self.path == "/stats":
+                with state.lock:
+                    self._send_json({"sends": state.sends, "errors": state.errors, "checks": state.checks})
+            elif self.path.startswith("/api/jobs/"):
+                job_id = self.path[len("/api/jobs/"):]
+                job = state.job_status([job_id]).get(job_id)
+                if job is None:
+                    self._send_json({"success": False, "message": "Unknown job ID"}, 404)
+                else:
+                    self._send_json(job)
+            else:
+                self._send_json({"success": False, "message": "Not found"}, 404)
+
+        def do_POST(self):
+            req = self._read_json()
+            if req is None:
+                self._send_json({"success": False, "message": "Invalid request format"}, 400)
+                return
+
+            if self.path == "/api/send":
+                if not req.get("recipient") or not (req.get("message") or req.get("media_path")):
+                    self._send_json({"success": False, "message": "Recipient and message or media path are required"}, 400)
+                    return
+                if req.get("async"):
+                    job = state.submit(req["recipient"])
+                    if job is None:
+                        self._send_json({"success": False, "message": "Send queue is full"}, 503)
+                    else:
+                        self._send_json(job, 202)
+                    return
+                success, message = state.send(req["recipient"])
+                self._send_json({"success": success, "message": message}, 200 if success else 500)
+
+            elif self.path == "/api/jobs":
+                self._send_json({"success": True, "jobs": state.job_status(req.get("job_ids") or [])})
+
+            elif self.path == "/api/download":
+                state.delay()
+                self._send_json({"success": False, "message": "Failed to download media: stub bridge has no media"}, 500)
+
+            elif self.path == "/api/check":
+                recipients = req.get("recipients") or []
+                state.delay()
+                with state.lock:
+                    state.checks += len(recipients)
+                results = []
+                for recipient in recipients:
+                    user = recipient.split("@")[0]
+                    registered = not (state.unregistered_prefix and user.startswith(state.unregistered_prefix))
+                    results.append({
+                        "recipient": recipient,
+                        "jid": f"{user}@s.whatsapp.net" if registered else "",
+                        "is_on_whatsapp": registered,
+                    })
+                self._send_json({"success": True, "results": results})
+
+            else:
+                self._send_json({"success": False, "message": "Not found"}, 404)
+
+    return StubBridgeHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub WhatsApp bridge.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Mean latency added to each API call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform jitter around the mean latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of sends that fail")
+    parser.add_argument("--disconnect-after", type=int, default=None,
+                        help="Report disconnected (and refuse sends) after this many sends")
+    parser.add_argument("--unregistered-prefix", default="",
+                        help="Numbers starting with this prefix are reported as not on WhatsApp")
+    parser.add_argument("--send-workers", type=int, default=4, help="Workers running async sends")
+    parser.add_argument("--send-queue-size", type=int, default=1000,
+                        help="Async sends waiting before new ones are refused with 503")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(StubState(args)))
+    server.daemon_threads = True
+    print(f"Stub bridge listening on {args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
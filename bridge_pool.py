@@ -0,0 +1,202 @@
+import hashlib
+import logging
+import queue
+import random
+import threading
+import time
+from typing import Callable, List, Optional
+
+import requests
+
+from broadcast_scheduler import QuietHours
+from metrics import RATE_LIMIT_SLEEP_SECONDS, SEND_QUEUE_DEPTH
+
+logger = logging.getLogger("clubchat.bridge_pool")
+
+# Longest a worker sleeps at once through quiet hours, so wall-clock changes are noticed
+_MAX_QUIET_SLEEP_SECONDS = 60
+
+# Status messages from whatsapp.py that mean the bridge itself couldn't
+# take the send, as opposed to WhatsApp rejecting it
+_UNAVAILABLE_MARKERS = ("Request error", "Not connected to WhatsApp")
+
+
+class BridgeUnavailable(Exception):
+    """Raised by a send handler when its bridge can't take the send."""
+
+
+def is_bridge_unavailable(status_msg: str) -> bool:
+    return any(marker in (status_msg or "") for marker in _UNAVAILABLE_MARKERS)
+
+
+class RateLimiter:
+    """Spaces sends on one bridge by a random interval.
+
+    The interval is measured from the start of the previous send, so time
+    spent talking to the bridge counts towards the pause.
+    """
+
+    def __init__(self, min_interval: float, max_interval: float):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._next_slot = 0.0
+
+    def wait(self) -> float:
+        """Block until the next send may start; returns the time slept."""
+        delay = max(0.0, self._next_slot - time.monotonic())
+        if delay:
+            time.sleep(delay)
+        self._next_slot = time.monotonic() + random.uniform(self.min_interval, self.max_interval)
+        return delay
+
+
+class Bridge:
+    """One linked WhatsApp bridge with its own queue and send rate."""
+
+    def __init__(self, base_url: str, limiter: RateLimiter):
+        self.base_url = base_url.rstrip('/')
+        self.api_base_url = f"{self.base_url}/api"
+        self.limiter = limiter
+        self.queue = queue.Queue()
+        SEND_QUEUE_DEPTH.labels(self.base_url).set_function(self.queue.qsize)
+        # Assume healthy until the first health check says otherwise
+        self.healthy = True
+
+    def check_health(self) -> bool:
+        try:
+            response = requests.get(f"{self.base_url}/status", timeout=5)
+            self.healthy = response.status_code == 200 and bool(response.json().get("connected"))
+        except (requests.RequestException, ValueError):
+            self.healthy = False
+        return self.healthy
+
+
+class BridgePool:
+    """Shards sends across several bridges.
+
+    Each recipient is assigned to a healthy bridge by rendezvous hashing, so
+    a member keeps hearing from the same account while the set of healthy
+    bridges is stable. Every bridge has its own worker thread and rate
+    limiter. When a bridge drops, its queued tasks and the send that hit
+    the failure are moved to the remaining healthy bridges. A send that has
+    hit an unavailable bridge ``max_attempts`` times is given up on.
+    Workers send nothing during ``quiet_hours``; sends already queued wait
+    for the period to end.
+
+    Bridges must see the same filesystem paths as this process, since
+    attachments are passed to them by path.
+    """
+
+    def __init__(self, base_urls: List[str], min_interval: float, max_interval: float,
+                 health_interval: float, max_attempts: int = 3, quiet_hours: Optional[QuietHours] = None):
+        if not base_urls:
+            raise ValueError("At least one bridge URL is required")
+        self.bridges = [Bridge(url, RateLimiter(min_interval, max_interval)) for url in base_urls]
+        self.health_interval = health_interval
+        self.max_attempts = max_attempts
+        self.quiet_hours = quiet_hours or QuietHours()
+        self._healthy_changed = threading.Condition()
+
+    @property
+    def primary(self) -> Bridge:
+        return self.bridges[0]
+
+    def qsize(self) -> int:
+        return sum(bridge.queue.qsize() for bridge in self.bridges)
+
+    def max_send_rate(self) -> Optional[float]:
+        """Most sends per second the bridges can make together; None if they aren't rate limited."""
+        if any(bridge.limiter.min_interval <= 0 for bridge in self.bridges):
+            return None
+        return sum(1 / bridge.limiter.min_interval for bridge in self.bridges)
+
+    def _choose(self, key: str, exclude: Optional[Bridge] = None) -> Bridge:
+        candidates = [b for b in self.bridges if b.healthy and b is not exclude]
+        if not candidates:
+            # Nothing healthy: keep the task on a stable bridge until one recovers
+            candidates = [b for b in self.bridges if b is not exclude] or self.bridges
+        return max(candidates, key=lambda b: hashlib.sha1(f"{b.base_url}|{key}".encode()).digest())
+
+    def put(self, task: dict, exclude: Optional[Bridge] = None) -> None:
+        self._choose(task.get("recipient_jid", ""), exclude).queue.put(task)
+
+    def _fail_over(self, bridge: Bridge) -> None:
+        """Move everything queued on an unhealthy bridge elsewhere."""
+        if not any(b.healthy for b in self.bridges if b is not bridge):
+            return
+        moved = 0
+        while True:
+            try:
+                task = bridge.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.put(task, exclude=bridge)
+            bridge.queue.task_done()
+            moved += 1
+        if moved:
+            logger.warning("moved queued sends off unhealthy bridge", extra={"fields": {"bridge": bridge.base_url, "moved": moved}})
+
+    def _health_loop(self) -> None:
+        while True:
+            for bridge in self.bridges:
+                was_healthy = bridge.healthy
+                if bridge.check_health() != was_healthy:
+                    logger.warning("bridge health changed", extra={"fields": {"bridge": bridge.base_url, "healthy": bridge.healthy}})
+                    with self._healthy_changed:
+                        self._healthy_changed.notify_all()
+                if not bridge.healthy:
+                    self._fail_over(bridge)
+            time.sleep(self.health_interval)
+
+    def _wait_until_open(self) -> None:
+        while True:
+            delay = self.quiet_hours.next_open(time.time()) - time.time()
+            if delay <= 0:
+                return
+            time.sleep(min(delay, _MAX_QUIET_SLEEP_SECONDS))
+
+    def _wait_for_any_healthy(self) -> None:
+        with self._healthy_changed:
+            while not any(b.healthy for b in self.bridges):
+                self._healthy_changed.wait(timeout=self.health_interval)
+
+    def _worker(self, bridge: Bridge, handler: Callable[[dict, Bridge], None],
+                give_up: Optional[Callable[[dict], None]]) -> None:
+        while True:
+            task = bridge.queue.get()
+            try:
+                if not bridge.healthy and any(b.healthy for b in self.bridges if b is not bridge):
+                    self.put(task, exclude=bridge)
+                    continue
+                self._wait_until_open()
+                self._wait_for_any_healthy()
+                RATE_LIMIT_SLEEP_SECONDS.labels(bridge.base_url).observe(bridge.limiter.wait())
+                try:
+                    handler(task, bridge)
+                except BridgeUnavailable:
+                    bridge.healthy = False
+                    task["attempts"] = task.get("attempts", 0) + 1
+                    if task["attempts"] >= self.max_attempts:
+                        logger.error("bridge unavailable, giving up on send", extra={"fields": {
+                            "bridge": bridge.base_url, "recipient_jid": task.get("recipient_jid"), "attempt": task["attempts"]}})
+                        if give_up:
+                            give_up(task)
+                    else:
+                        logger.warning("bridge unavailable, retrying send elsewhere", extra={"fields": {
+                            "bridge": bridge.base_url, "recipient_jid": task.get("recipient_jid"), "attempt": task["attempts"]}})
+                        self.put(task, exclude=bridge)
+                    self._fail_over(bridge)
+            except Exception:
+                logger.exception("error processing task", extra={"fields": {"bridge": bridge.base_url}})
+            finally:
+                bridge.queue.task_done()
+
+    def start(self, handler: Callable[[dict, Bridge], None], give_up: Optional[Callable[[dict], None]] = None) -> None:
+        """Start one worker per bridge plus the health checker.
+
+        ``handler`` raises BridgeUnavailable to have a send retried;
+        ``give_up`` is called with each send that ran out of attempts.
+        """
+        for bridge in self.bridges:
+            threading.Thread(target=self._worker, args=(bridge, handler, give_up), daemon=True).start()
+        threading.Thread(target=self._health_loop, daemon=True).start()
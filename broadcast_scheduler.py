@@ -0,0 +1,269 @@
+import bisect
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import date, datetime, time as dtime, timedelta, tzinfo
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import SCHEDULED_SENDS
+
+logger = logging.getLogger("clubchat.scheduler")
+
+# How far ahead to look for the end of quiet hours before giving up
+_MAX_QUIET_DAYS = 8
+
+# Longest the scheduler sleeps at once, so wall-clock changes are noticed
+_MAX_SLEEP_SECONDS = 60
+
+
+class ScheduleError(ValueError):
+    """Raised when a broadcast's send time or delivery window is unusable."""
+
+
+class SchedulerFull(Exception):
+    """Raised when holding a broadcast's sends would exceed the scheduler's limit."""
+
+
+def _parse_clock(value: str) -> dtime:
+    try:
+        return dtime.fromisoformat(value.strip())
+    except ValueError:
+        raise ScheduleError(f"Invalid time of day '{value}' in quiet hours; use HH:MM")
+
+
+def parse_time(name: str, value: Optional[str], tz: Optional[tzinfo] = None) -> Optional[float]:
+    """Epoch seconds for an ISO-8601 time; without an offset it is taken to be in ``tz``."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ScheduleError(f"Invalid date format for '{name}': {value}. Please use ISO-8601 format.")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=tz)
+    return parsed.timestamp()
+
+
+def _duration(seconds: float) -> str:
+    return f"{seconds / 60:.0f} minutes" if seconds >= 120 else f"{seconds:.0f} seconds"
+
+
+def format_time(ts: Optional[float], tz: Optional[tzinfo] = None) -> Optional[str]:
+    if ts is None:
+        return None
+    moment = datetime.fromtimestamp(ts, tz)
+    return (moment if tz else moment.astimezone()).isoformat()
+
+
+class QuietHours:
+    """Daily periods (e.g. "22:00-08:00,14:00-16:00") when nothing is sent.
+
+    Times are wall-clock times in ``tz``, or in the server's local time when
+    ``tz`` is None. A period whose end is before its start runs past midnight.
+    """
+
+    def __init__(self, spec: str = "", tz: Optional[tzinfo] = None):
+        self.tz = tz
+        self.periods: List[Tuple[dtime, dtime]] = []
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            start, sep, end = part.partition("-")
+            if not sep:
+                raise ScheduleError(f"Invalid quiet hours '{part}'; use HH:MM-HH:MM")
+            start, end = _parse_clock(start), _parse_clock(end)
+            if start != end:
+                self.periods.append((start, end))
+        # Refuse periods that leave no time to send at all up front
+        self.next_open(time.time())
+
+    def _epoch(self, day: date, clock: dtime) -> float:
+        # Naive datetimes are local time, DST included
+        return datetime.combine(day, clock, tzinfo=self.tz).timestamp()
+
+    def _day(self, ts: float) -> date:
+        return datetime.fromtimestamp(ts, self.tz).date()
+
+    def spans(self, start: float, end: float) -> List[Tuple[float, float]]:
+        """Quiet periods overlapping [start, end), as epoch seconds."""
+        spans = []
+        # Start a day early for periods running past midnight into the window
+        day, last = self._day(start) - timedelta(days=1), self._day(end)
+        while day <= last:
+            for quiet_start, quiet_end in self.periods:
+                a = self._epoch(day, quiet_start)
+                b = self._epoch(day + timedelta(days=1) if quiet_end < quiet_start else day, quiet_end)
+                if a < end and b > start:
+                    spans.append((a, b))
+            day += timedelta(days=1)
+        return sorted(spans)
+
+    def next_open(self, ts: float) -> float:
+        """The earliest time at or after ``ts`` outside quiet hours."""
+        horizon = ts + _MAX_QUIET_DAYS * 86400
+        while self.periods:
+            inside = [b for a, b in self.spans(ts, ts + 1) if a <= ts < b]
+            if not inside:
+                return ts
+            ts = max(inside)
+            if ts >= horizon:
+                raise ScheduleError("Quiet hours cover the whole day; nothing could be sent")
+        return ts
+
+    def open_spans(self, start: float, end: float) -> List[Tuple[float, float]]:
+        """[start, end) with the quiet periods cut out."""
+        open_spans, cursor = [], start
+        for a, b in self.spans(start, end):
+            if a > cursor:
+                open_spans.append((cursor, min(a, end)))
+            cursor = max(cursor, b)
+        if cursor < end:
+            open_spans.append((cursor, end))
+        return open_spans
+
+
+class BroadcastScheduler:
+    """Holds sends back until their slot, then hands them to ``dispatch``.
+
+    A broadcast with a delivery window gets its recipients spaced evenly
+    over the part of the window outside quiet hours. Slots of all pending
+    broadcasts share one heap, so overlapping campaigns interleave and the
+    bridge queues only ever hold what is due now: a broadcast accepted
+    later isn't stuck behind thousands of queued sends of an earlier one.
+    Without a window, every send is due as soon as quiet hours allow.
+
+    At most ``max_pending`` sends are held at once. Pending sends live in
+    memory, like the bridge queues, and are lost on restart. A window too
+    short for ``max_send_rate`` (sends per second, None for no limit) to
+    get through all of a broadcast is refused.
+    """
+
+    def __init__(self, dispatch: Callable[[dict], None], quiet_hours: Optional[QuietHours] = None,
+                 max_pending: int = 100000, max_send_rate: Optional[float] = None):
+        self.dispatch = dispatch
+        self.quiet_hours = quiet_hours or QuietHours()
+        self.max_pending = max_pending
+        self.max_send_rate = max_send_rate
+        self._heap: List[Tuple[float, int, dict]] = []
+        self._seq = itertools.count()
+        # send_at, deliver_by and sends still held back, per broadcast
+        self._broadcasts: Dict[str, dict] = {}
+        self._changed = threading.Condition()
+        SCHEDULED_SENDS.set_function(self.__len__)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def plan(self, count: int, send_at: Optional[float] = None, deliver_by: Optional[float] = None) -> List[float]:
+        """Epoch times at which ``count`` sends should go out."""
+        requested = max(send_at or 0, time.time())
+        start = self.quiet_hours.next_open(requested)
+        if deliver_by is None:
+            return [start] * count
+        if deliver_by <= requested:
+            raise ScheduleError("deliver_by must be later than send_at and in the future")
+        if deliver_by <= start:
+            raise ScheduleError("The delivery window falls entirely within quiet hours")
+        spans = self.quiet_hours.open_spans(start, deliver_by)
+        total = sum(b - a for a, b in spans)
+        if not total:
+            raise ScheduleError("The delivery window falls entirely within quiet hours")
+        if self.max_send_rate and count / self.max_send_rate > total:
+            raise ScheduleError(
+                f"{count} sends take at least {_duration(count / self.max_send_rate)} outside quiet hours, "
+                f"but the delivery window leaves {_duration(total)}; move deliver_by later or send to fewer recipients")
+
+        # Slot i is i/count of the way through the open time
+        passed = list(itertools.accumulate((b - a for a, b in spans), initial=0.0))
+        slots = []
+        for i in range(count):
+            offset = i * total / count
+            span = bisect.bisect_right(passed, offset, hi=len(spans)) - 1
+            slots.append(spans[span][0] + offset - passed[span])
+        return slots
+
+    def schedule(self, broadcast_id: str, tasks: List[dict], slots: List[float],
+                 deliver_by: Optional[float] = None) -> None:
+        """Hold ``tasks`` until their ``slots`` (from plan); sends already due are dispatched right away.
+
+        Raises SchedulerFull, before accepting any of them, if there's no room.
+        """
+        now = time.time()
+        later = [(slot, task) for slot, task in zip(slots, tasks) if slot > now]
+        if later:
+            with self._changed:
+                if len(self._heap) + len(later) > self.max_pending:
+                    raise SchedulerFull(f"At most {self.max_pending} sends can be scheduled at once; "
+                                        f"{len(self._heap)} already are")
+                self._broadcasts[broadcast_id] = {"send_at": slots[0], "deliver_by": deliver_by, "remaining": len(later)}
+                for slot, task in later:
+                    heapq.heappush(self._heap, (slot, next(self._seq), task))
+                self._changed.notify()
+        for slot, task in zip(slots, tasks):
+            if slot <= now:
+                self._dispatch(task)
+
+    def _dispatch(self, task: dict) -> None:
+        # A failed dispatch affects only its own send; handling it is up to dispatch
+        try:
+            self.dispatch(task)
+        except Exception:
+            logger.exception("error dispatching scheduled send", extra={"fields": {
+                "broadcast_id": task.get("broadcast_id"), "recipient_jid": task.get("recipient_jid")}})
+
+    def cancel(self, broadcast_id: str) -> List[dict]:
+        """Drop a broadcast's sends that haven't gone out yet and return them."""
+        with self._changed:
+            if self._broadcasts.pop(broadcast_id, None) is None:
+                return []
+            cancelled = [task for _, _, task in self._heap if task.get("broadcast_id") == broadcast_id]
+            self._heap = [entry for entry in self._heap if entry[2].get("broadcast_id") != broadcast_id]
+            heapq.heapify(self._heap)
+            self._changed.notify()
+        return cancelled
+
+    def pending(self) -> List[dict]:
+        """Broadcasts with sends still waiting for their slot, soonest first."""
+        with self._changed:
+            next_slots: Dict[str, float] = {}
+            for slot, _, task in self._heap:
+                broadcast_id = task.get("broadcast_id")
+                next_slots[broadcast_id] = min(slot, next_slots.get(broadcast_id, slot))
+            broadcasts = [dict(entry, broadcast_id=broadcast_id) for broadcast_id, entry in self._broadcasts.items()]
+        tz = self.quiet_hours.tz
+        broadcasts.sort(key=lambda b: next_slots[b["broadcast_id"]])
+        return [
+            {
+                "broadcast_id": b["broadcast_id"],
+                "remaining": b["remaining"],
+                "send_at": format_time(b["send_at"], tz),
+                "deliver_by": format_time(b["deliver_by"], tz),
+                "next_send_at": format_time(next_slots[b["broadcast_id"]], tz),
+            }
+            for b in broadcasts
+        ]
+
+    def _due(self) -> List[dict]:
+        with self._changed:
+            while True:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    due = []
+                    while self._heap and self._heap[0][0] <= now:
+                        task = heapq.heappop(self._heap)[2]
+                        broadcast = self._broadcasts[task.get("broadcast_id")]
+                        broadcast["remaining"] -= 1
+                        if not broadcast["remaining"]:
+                            del self._broadcasts[task.get("broadcast_id")]
+                        due.append(task)
+                    return due
+                wait = self._heap[0][0] - now if self._heap else _MAX_SLEEP_SECONDS
+                self._changed.wait(timeout=min(wait, _MAX_SLEEP_SECONDS))
+
+    def _run(self) -> None:
+        while True:
+            for task in self._due():
+                self._dispatch(task)
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, daemon=True).start()
@@ -0,0 +1,27 @@
+"""Gunicorn settings for the backend (gunicorn -c gunicorn.conf.py app:app).
+
+Bridge queues, rate limiters, admission counts and scheduled sends live in
+the backend's memory. More than one worker process would each send on
+their own, multiplying the per-bridge rate, so the backend runs exactly one,
+and it starts the send threads once it has loaded the app.
+
+Requests are served by threads instead: each open /api/messages/stream
+holds one for as long as it stays connected. Unlike sync workers, gthread
+workers keep heartbeating the arbiter while a response streams, so long
+streams aren't killed at the timeout.
+"""
+import os
+
+workers = 1
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 32))
+
+
+def on_starting(server):
+    if server.cfg.workers != 1:
+        raise RuntimeError("The backend keeps its send queues in memory and must run with a single gunicorn worker")
+
+
+def post_worker_init(worker):
+    from app import start_send_workers
+    start_send_workers()
@@ -0,0 +1,104 @@
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Bridge sends are paced seconds apart and each broadcast can take hours,
+# so the default sub-second buckets would put everything in +Inf
+_SEND_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_SLEEP_BUCKETS = (0.1, 0.5, 1, 2, 3, 4, 5, 6, 8, 10, 30)
+_BROADCAST_BUCKETS = (10, 30, 60, 300, 900, 1800, 3600, 7200, 14400, 28800, 86400)
+
+SEND_QUEUE_DEPTH = Gauge(
+    'clubchat_send_queue_depth', 'Sends waiting in a bridge queue', ['bridge']
+)
+SCHEDULED_SENDS = Gauge(
+    'clubchat_scheduled_sends', 'Sends held back until their slot in a broadcast delivery window'
+)
+BROADCASTS = Counter(
+    'clubchat_broadcasts_total', 'Broadcast requests by outcome', ['outcome']
+)
+MESSAGES_ENQUEUED = Counter(
+    'clubchat_messages_enqueued_total', 'Per-recipient sends put on the queue'
+)
+SENDS = Counter(
+    'clubchat_sends_total', 'Bridge send calls by kind, outcome and error class',
+    ['kind', 'outcome', 'error_class']
+)
+BRIDGE_REQUEST_SECONDS = Histogram(
+    'clubchat_bridge_request_seconds', 'Latency of calls to the WhatsApp bridge',
+    ['bridge', 'kind'], buckets=_SEND_BUCKETS
+)
+RATE_LIMIT_SLEEP_SECONDS = Histogram(
+    'clubchat_rate_limit_sleep_seconds', 'Time a worker slept before a send to respect the rate limit',
+    ['bridge'], buckets=_SLEEP_BUCKETS
+)
+BROADCAST_DURATION_SECONDS = Histogram(
+    'clubchat_broadcast_duration_seconds', 'Time from accepting a broadcast to its last send',
+    buckets=_BROADCAST_BUCKETS
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    'clubchat_http_request_seconds', 'Flask route latency',
+    ['method', 'endpoint', 'status']
+)
+DB_LOCK_WAIT_SECONDS = Histogram(
+    'clubchat_db_lock_wait_seconds', 'Time a messages.db read waited for a lock before running'
+)
+LOG_RECORDS_DROPPED = Counter(
+    'clubchat_log_records_dropped_total', 'Log records dropped because the log queue was full'
+)
+
+_HTTP_STATUS = re.compile(r'^Error: HTTP (\d{3})')
+
+
+def error_class(status_msg: Optional[str]) -> str:
+    """Map a whatsapp.py status message to a low-cardinality error label."""
+    status_msg = status_msg or ''
+    if status_msg.startswith('Request error'):
+        return 'bridge_unreachable'
+    if status_msg.startswith('Request failed'):
+        return 'bridge_request_failed'
+    if 'Not connected to WhatsApp' in status_msg:
+        return 'bridge_disconnected'
+    match = _HTTP_STATUS.match(status_msg)
+    if match:
+        return f'http_{match.group(1)[0]}xx'
+    if status_msg.startswith('Error parsing response'):
+        return 'invalid_response'
+    if status_msg.startswith('Media file not found') or status_msg.startswith('Error converting file'):
+        return 'media'
+    if 'must be provided' in status_msg:
+        return 'invalid_request'
+    return 'other'
+
+
+def record_send(kind: str, success: bool, status_msg: Optional[str]) -> None:
+    if success:
+        SENDS.labels(kind, 'success', '').inc()
+    else:
+        SENDS.labels(kind, 'failure', error_class(status_msg)).inc()
+
+
+class BroadcastTimer:
+    """Observes a broadcast's duration when the last of its sends finishes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[str, list] = {}
+
+    def start(self, broadcast_id: str, sends: int) -> None:
+        with self._lock:
+            self._pending[broadcast_id] = [sends, time.monotonic()]
+
+    def done(self, broadcast_id: Optional[str], sends: int = 1) -> None:
+        with self._lock:
+            entry = self._pending.get(broadcast_id)
+            if entry is None:
+                return
+            entry[0] -= sends
+            if entry[0] > 0:
+                return
+            del self._pending[broadcast_id]
+        BROADCAST_DURATION_SECONDS.observe(time.monotonic() - entry[1])
@@ -0,0 +1,177 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Personal chats are <country code + number>@s.whatsapp.net, groups are <id>@g.us
+_USER_JID_RE = re.compile(r'^\d{7,15}@s\.whatsapp\.net$')
+_GROUP_JID_RE = re.compile(r'^\d+(-\d+)?@g\.us$')
+
+# Recipients looked up per bridge request
+CHECK_BATCH_SIZE = 500
+
+
+class RecipientsError(ValueError):
+    """Raised when recipients_data is malformed."""
+
+
+@dataclass
+class Recipient:
+    jid: str
+    first_text: str
+    # Optional member segment (e.g. "juniors"), used to break down reply rates
+    segment: Optional[str] = None
+
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+def _skip_whitespace(text: str, idx: int) -> int:
+    while idx < len(text) and text[idx] in _WHITESPACE:
+        idx += 1
+    return idx
+
+
+def iter_recipients(recipients_data_json: str) -> Iterator[Recipient]:
+    """Parse a JSON array of recipient objects one element at a time.
+
+    Each element is decoded and validated as soon as it is reached, so a bad
+    entry is reported without decoding the rest of the payload and callers
+    can stop early (e.g. when a size limit is hit).
+    """
+    idx = _skip_whitespace(recipients_data_json, 0)
+    if idx >= len(recipients_data_json) or recipients_data_json[idx] != '[':
+        raise RecipientsError("recipients_data should be a list of objects, each with 'jid' and 'first_text'")
+    idx = _skip_whitespace(recipients_data_json, idx + 1)
+
+    position = 0
+    if idx < len(recipients_data_json) and recipients_data_json[idx] == ']':
+        idx += 1
+    else:
+        while True:
+            try:
+                item, idx = _decoder.raw_decode(recipients_data_json, idx)
+            except json.JSONDecodeError as e:
+                raise RecipientsError(f"Invalid recipients_data JSON format: {str(e)}")
+
+            if not isinstance(item, dict) or not isinstance(item.get('jid'), str) or 'first_text' not in item:
+                raise RecipientsError(f"recipients_data[{position}] should be an object with 'jid' and 'first_text'")
+            segment = item.get('segment')
+            yield Recipient(jid=item['jid'], first_text=str(item['first_text']), segment=str(segment) if segment is not None else None)
+            position += 1
+
+            idx = _skip_whitespace(recipients_data_json, idx)
+            if idx < len(recipients_data_json) and recipients_data_json[idx] == ',':
+                idx = _skip_whitespace(recipients_data_json, idx + 1)
+                continue
+            if idx < len(recipients_data_json) and recipients_data_json[idx] == ']':
+                idx += 1
+                break
+            raise RecipientsError(f"Invalid recipients_data JSON format: expected ',' or ']' at char {idx}")
+
+    if _skip_whitespace(recipients_data_json, idx) != len(recipients_data_json):
+        raise RecipientsError(f"Invalid recipients_data JSON format: extra data at char {idx}")
+
+
+def parse_recipients(recipients_data_json: str, max_count: int) -> List[Recipient]:
+    """Parse and validate recipients_data, refusing payloads above max_count."""
+    recipients = []
+    for recipient in iter_recipients(recipients_data_json):
+        if len(recipients) >= max_count:
+            raise RecipientsError(f"recipients_data may contain at most {max_count} recipients per request")
+        recipients.append(recipient)
+    return recipients
+
+
+class RegistrationCache:
+    """Local SQLite cache of WhatsApp-registration lookups, with expiry.
+
+    Numbers found on WhatsApp are kept for ``ttl`` seconds; numbers that
+    were not found are re-checked sooner, after ``negative_ttl`` seconds.
+    """
+
+    def __init__(self, db_path: str, ttl: int, negative_ttl: int):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS registrations (
+                    jid TEXT PRIMARY KEY,
+                    is_on_whatsapp INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+    def get_many(self, jids: List[str]) -> Dict[str, bool]:
+        """Return the cached, unexpired results for the given JIDs."""
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(jids), CHECK_BATCH_SIZE):
+                batch = jids[start:start + CHECK_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT jid, is_on_whatsapp FROM registrations WHERE jid IN ({placeholders}) AND expires_at > ?",
+                    (*batch, now)
+                ).fetchall()
+                found.update((jid, bool(is_on_whatsapp)) for jid, is_on_whatsapp in rows)
+        return found
+
+    def put_many(self, results: Dict[str, bool]) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO registrations (jid, is_on_whatsapp, expires_at) VALUES (?, ?, ?)",
+                [(jid, int(ok), now + (self.ttl if ok else self.negative_ttl)) for jid, ok in results.items()]
+            )
+
+
+def is_valid_jid(jid: str) -> bool:
+    return bool(_USER_JID_RE.match(jid) or _GROUP_JID_RE.match(jid))
+
+
+def validate_recipients(
+    recipients: List[Recipient],
+    check: Callable[[List[str]], Optional[Dict[str, bool]]],
+    cache: RegistrationCache
+) -> Tuple[List[Recipient], List[Dict[str, str]]]:
+    """Split recipients into those worth sending to and those to skip.
+
+    Malformed JIDs are rejected without a lookup. Well-formed personal JIDs
+    are checked against the cache and the remainder in bulk through
+    ``check``; if the bridge can't answer, unchecked recipients are kept
+    rather than blocking the broadcast.
+    """
+    skipped = []
+    well_formed = []
+    for recipient in recipients:
+        if is_valid_jid(recipient.jid):
+            well_formed.append(recipient)
+        else:
+            skipped.append({"jid": recipient.jid, "reason": "malformed JID"})
+
+    to_check = sorted({r.jid for r in well_formed if not r.jid.endswith('@g.us')})
+    registered = cache.get_many(to_check)
+    missing = [jid for jid in to_check if jid not in registered]
+
+    for start in range(0, len(missing), CHECK_BATCH_SIZE):
+        results = check(missing[start:start + CHECK_BATCH_SIZE])
+        if results is None:
+            break
+        cache.put_many(results)
+        registered.update(results)
+
+    valid = []
+    for recipient in well_formed:
+        if registered.get(recipient.jid, True):
+            valid.append(recipient)
+        else:
+            skipped.append({"jid": recipient.jid, "reason": "not on WhatsApp"})
+    return valid, skipped
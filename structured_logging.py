@@ -0,0 +1,146 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+import traceback
+from typing import Dict, Optional
+
+from metrics import LOG_RECORDS_DROPPED
+
+# Fields that carry member content are reduced to their length; fields that
+# identify a member keep only the last digits of the phone number, and free
+# text from the bridge has any phone numbers in it masked the same way
+REDACTED_FIELDS = {"message", "body", "first_text", "personalized_message"}
+MASKED_FIELDS = {"recipient", "recipient_jid", "jid", "sender"}
+SCRUBBED_FIELDS = {"status"}
+
+_PHONE = re.compile(r"\d+(?=\d{4})")
+_PHONE_IN_TEXT = re.compile(r"\d{7,15}")
+
+
+def mask_jid(value: str) -> str:
+    user, sep, server = str(value).partition("@")
+    return _PHONE.sub(lambda m: "*" * len(m.group()), user) + sep + server
+
+
+def scrub_phone_numbers(text: str) -> str:
+    return _PHONE_IN_TEXT.sub(lambda m: mask_jid(m.group()), str(text))
+
+
+def _redact(fields: Dict) -> Dict:
+    redacted = {}
+    for key, value in fields.items():
+        if key in REDACTED_FIELDS and value is not None:
+            redacted[key] = f"<redacted {len(str(value))} chars>"
+        elif key in MASKED_FIELDS and value is not None:
+            redacted[key] = mask_jid(value)
+        elif key in SCRUBBED_FIELDS and value is not None:
+            redacted[key] = scrub_phone_numbers(value)
+        else:
+            redacted[key] = value
+    return redacted
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with redacted structured fields.
+
+    Structured fields are passed as ``extra={"fields": {...}}``.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(_redact(getattr(record, "fields", None) or {}))
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the records marked ``extra={"sampled": True}``.
+
+    Rates are per level, so per-recipient INFO events can be thinned while
+    warnings and errors always get through.
+    """
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "sampled", False):
+            return True
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread and drops them when the queue is full.
+
+    Only message interpolation happens on the caller's thread; JSON
+    encoding, redaction and the write happen on the listener thread.
+    """
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+
+def parse_sample_rates(spec: str) -> Dict[int, float]:
+    """Parse ``"DEBUG=0.01,INFO=0.1"`` into ``{logging.DEBUG: 0.01, ...}``."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        level, _, rate = item.partition("=")
+        rates[logging.getLevelName(level.strip().upper())] = float(rate)
+    return rates
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging(stream=None) -> None:
+    """Route the ``clubchat`` loggers through a background JSON writer.
+
+    Configured from LOG_LEVEL, LOG_SAMPLE_RATES and LOG_QUEUE_SIZE.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter())
+
+    handler = NonBlockingQueueHandler(queue.Queue(int(os.environ.get("LOG_QUEUE_SIZE", 10000))))
+    handler.addFilter(SamplingFilter(parse_sample_rates(os.environ.get("LOG_SAMPLE_RATES", "DEBUG=0.01,INFO=0.1"))))
+
+    logger = logging.getLogger("clubchat")
+    logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(handler.queue, output)
+    _listener.start()
+    # Flush what is still queued on shutdown
+    atexit.register(_listener.stop)
@@ -0,0 +1,85 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_BRIDGE = os.path.join(REPO_ROOT, "bench", "stub_bridge.py")
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "MCP", "whatsapp-mcp-server"))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until(condition, timeout: float = 10.0, interval: float = 0.02) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return condition()
+
+
+class StubBridges:
+    """Stub bridge processes on local ports, stopped and restarted by index."""
+
+    def __init__(self):
+        self.ports = []
+        self.processes = []
+
+    @property
+    def urls(self):
+        return [f"http://127.0.0.1:{port}" for port in self.ports]
+
+    def start(self, count: int, *extra_args: str) -> list:
+        for _ in range(count):
+            self.ports.append(_free_port())
+            self.processes.append(None)
+            self.restart(len(self.ports) - 1, *extra_args)
+        return self.urls
+
+    def restart(self, index: int, *extra_args: str) -> None:
+        cmd = [sys.executable, STUB_BRIDGE, "--port", str(self.ports[index]), *extra_args]
+        self.processes[index] = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        url = self.urls[index]
+        if not wait_until(lambda: self._reachable(url)):
+            raise RuntimeError(f"Stub bridge at {url} did not start")
+
+    def stop(self, index: int) -> None:
+        process = self.processes[index]
+        process.kill()
+        process.wait()
+
+    def sends(self, index: int) -> int:
+        with urllib.request.urlopen(f"{self.urls[index]}/stats", timeout=5) as response:
+            return json.load(response)["sends"]
+
+    @staticmethod
+    def _reachable(url: str) -> bool:
+        try:
+            with urllib.request.urlopen(f"{url}/status", timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def close(self) -> None:
+        for process in self.processes:
+            if process and process.poll() is None:
+                process.kill()
+                process.wait()
+
+
+@pytest.fixture
+def stub_bridges():
+    bridges = StubBridges()
+    yield bridges
+    bridges.close()
@@ -0,0 +1,153 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bridge_pool import BridgePool, BridgeUnavailable, is_bridge_unavailable
+from broadcast_scheduler import QuietHours
+from conftest import wait_until
+from whatsapp import send_message
+
+
+class Recorder:
+    """Send handler that talks to the stub bridges and records each call."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []  # (recipient_jid, bridge url, start time, success)
+        self.given_up = []
+
+    def __call__(self, task, bridge):
+        start = time.monotonic()
+        success, status_msg = send_message(task["recipient_jid"], "hello", api_base_url=bridge.api_base_url)
+        with self.lock:
+            self.calls.append((task["recipient_jid"], bridge.base_url, start, success))
+        if not success and is_bridge_unavailable(status_msg):
+            raise BridgeUnavailable(status_msg)
+
+    def give_up(self, task):
+        with self.lock:
+            self.given_up.append(task)
+
+    def delivered(self):
+        with self.lock:
+            return {(jid, url) for jid, url, _, success in self.calls if success}
+
+
+def _recipients(count):
+    return [f"3460000{i:04d}@s.whatsapp.net" for i in range(count)]
+
+
+def _start_pool(urls, recorder, interval=0.0, health_interval=30.0, max_attempts=3):
+    pool = BridgePool(urls, min_interval=interval, max_interval=interval,
+                      health_interval=health_interval, max_attempts=max_attempts)
+    pool.start(recorder, recorder.give_up)
+    return pool
+
+
+def test_recipients_are_sharded_stably(stub_bridges):
+    urls = stub_bridges.start(3)
+    recorder = Recorder()
+    pool = _start_pool(urls, recorder)
+
+    recipients = _recipients(60)
+    for jid in recipients * 2:
+        pool.put({"recipient_jid": jid})
+    assert wait_until(lambda: len(recorder.delivered()) == 60 and len(recorder.calls) == 120)
+
+    bridges_by_recipient = {}
+    for jid, url in recorder.delivered():
+        bridges_by_recipient.setdefault(jid, set()).add(url)
+    # Every recipient always hears from the same bridge, and every bridge gets a share
+    assert all(len(bridges) == 1 for bridges in bridges_by_recipient.values())
+    assert {url for bridges in bridges_by_recipient.values() for url in bridges} == set(urls)
+    assert sum(stub_bridges.sends(i) for i in range(3)) == 120
+
+
+def test_sends_are_rate_limited_per_bridge(stub_bridges):
+    urls = stub_bridges.start(2)
+    recorder = Recorder()
+    pool = _start_pool(urls, recorder, interval=0.2)
+
+    recipients = _recipients(40)
+    by_bridge = {url: [jid for jid in recipients if pool._choose(jid).base_url == url][:4] for url in urls}
+    for jids in by_bridge.values():
+        for jid in jids:
+            pool.put({"recipient_jid": jid})
+    assert wait_until(lambda: len(recorder.calls) == 8)
+
+    starts = {url: sorted(start for _, u, start, _ in recorder.calls if u == url) for url in urls}
+    for times in starts.values():
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        assert min(gaps) >= 0.19
+    # The bridges are paced independently, so they send side by side
+    first, second = starts.values()
+    assert abs(first[0] - second[0]) < 0.15
+
+
+def test_in_flight_sends_move_off_a_bridge_that_drops(stub_bridges):
+    # The first bridge disconnects from WhatsApp after two sends
+    stub_bridges.start(1, "--disconnect-after", "2")
+    urls = stub_bridges.start(1)
+    recorder = Recorder()
+    pool = _start_pool(urls, recorder)
+
+    recipients = [jid for jid in _recipients(100) if pool._choose(jid).base_url == urls[0]][:6]
+    for jid in recipients:
+        pool.put({"recipient_jid": jid})
+    assert wait_until(lambda: len(recorder.delivered()) == 6)
+
+    delivered = dict(recorder.delivered())
+    assert sum(1 for url in delivered.values() if url == urls[0]) == 2
+    assert sum(1 for url in delivered.values() if url == urls[1]) == 4
+    assert not pool.bridges[0].healthy
+    assert not recorder.given_up
+
+
+def test_bridge_rejoins_after_failed_health_check(stub_bridges):
+    urls = stub_bridges.start(2)
+    recorder = Recorder()
+    pool = _start_pool(urls, recorder, health_interval=0.1)
+    home = [jid for jid in _recipients(100) if pool._choose(jid).base_url == urls[0]][:3]
+
+    stub_bridges.stop(0)
+    assert wait_until(lambda: not pool.bridges[0].healthy)
+    for jid in home:
+        pool.put({"recipient_jid": jid})
+    assert wait_until(lambda: len(recorder.delivered()) == 3)
+    assert {url for _, url in recorder.delivered()} == {urls[1]}
+
+    stub_bridges.restart(0)
+    assert wait_until(lambda: pool.bridges[0].healthy)
+    for jid in home:
+        pool.put({"recipient_jid": jid})
+    assert wait_until(lambda: len(recorder.delivered()) == 6)
+    assert {jid for jid, url in recorder.delivered() if url == urls[0]} == set(home)
+
+
+def test_send_is_given_up_after_max_attempts(stub_bridges):
+    urls = stub_bridges.start(1, "--disconnect-after", "0")
+    recorder = Recorder()
+    pool = _start_pool(urls, recorder, health_interval=0.1, max_attempts=2)
+    # Keep the only bridge looking healthy so the send is retried on it
+    pool.bridges[0].check_health = lambda: setattr(pool.bridges[0], "healthy", True) or True
+
+    pool.put({"recipient_jid": _recipients(1)[0]})
+    assert wait_until(lambda: recorder.given_up)
+    assert recorder.given_up[0]["attempts"] == 2
+    time.sleep(0.3)
+    assert len(recorder.calls) == 2
+
+
+def test_queued_sends_wait_out_quiet_hours(stub_bridges):
+    urls = stub_bridges.start(1)
+    recorder = Recorder()
+    # Quiet from a minute ago until a second from now
+    now = datetime.now()
+    quiet_until = now + timedelta(seconds=1)
+    quiet_hours = QuietHours(f"{(now - timedelta(minutes=1)).time().isoformat()}-{quiet_until.time().isoformat()}")
+    pool = BridgePool(urls, min_interval=0.0, max_interval=0.0, health_interval=30.0, quiet_hours=quiet_hours)
+    pool.start(recorder, recorder.give_up)
+
+    pool.put({"recipient_jid": _recipients(1)[0]})
+    assert wait_until(lambda: recorder.delivered())
+    assert time.time() >= quiet_until.timestamp()
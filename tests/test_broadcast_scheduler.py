@@ -0,0 +1,22 @@
+import time
+
+import pytest
+
+from broadcast_scheduler import BroadcastScheduler, ScheduleError
+
+
+def test_window_too_short_for_the_send_rate_is_refused():
+    # Two bridges at one send every 2 s get through one send a second
+    scheduler = BroadcastScheduler(lambda task: None, max_send_rate=1.0)
+    now = time.time()
+
+    slots = scheduler.plan(100, now, now + 200)
+    assert len(slots) == 100 and slots[-1] < now + 200
+    with pytest.raises(ScheduleError, match="delivery window"):
+        scheduler.plan(300, now, now + 200)
+
+
+def test_unlimited_send_rate_accepts_any_window():
+    scheduler = BroadcastScheduler(lambda task: None)
+    now = time.time()
+    assert len(scheduler.plan(10000, now, now + 60)) == 10000
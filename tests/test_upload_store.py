@@ -0,0 +1,38 @@
+import io
+import os
+from types import SimpleNamespace
+
+from upload_store import UploadStore
+
+
+def _upload(content=b"club newsletter", filename="newsletter.pdf"):
+    return SimpleNamespace(filename=filename, stream=io.BytesIO(content))
+
+
+def test_references_are_released_down_to_deletion(tmp_path):
+    store = UploadStore(str(tmp_path))
+    path = store.store(_upload(), references=2)
+    assert store.store(_upload(), references=1) == path
+
+    store.release(path, 2)
+    assert os.path.exists(path)
+    store.release(path)
+    assert not os.path.exists(os.path.dirname(path))
+
+
+def test_reset_after_restart_deletes_attachments_of_lost_sends(tmp_path):
+    store = UploadStore(str(tmp_path))
+    path = store.store(_upload(), references=3)
+    store.release(path)
+    (tmp_path / ".upload-interrupted").write_bytes(b"partial")
+
+    # A new process: the two sends still holding references are gone
+    restarted = UploadStore(str(tmp_path))
+    assert restarted.reset() == 1
+    assert not os.path.exists(os.path.dirname(path))
+    assert sorted(os.listdir(tmp_path)) == [".refs.db"]
+
+    # A new upload of the same content starts from a clean count
+    path = restarted.store(_upload(), references=1)
+    restarted.release(path)
+    assert not os.path.exists(os.path.dirname(path))
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from typing import Optional
+
+from werkzeug.utils import secure_filename
+
+# Size of the chunks read from the incoming upload stream while hashing
+CHUNK_SIZE = 1024 * 1024
+
+_BLOB_DIR = re.compile(r"[0-9a-f]{64}")
+
+
+class UploadStore:
+    """Content-addressed store for broadcast attachments.
+
+    Files are stored under ``<root>/<sha256>/<filename>`` so identical uploads
+    share one copy on disk, and the original filename (which the bridge uses
+    to pick the media type and document title) is preserved. Each pending
+    send holds a reference on the blob; the blob directory is removed when
+    the last reference is released.
+
+    Reference counts live in a small SQLite database inside the upload
+    folder, so acquiring and releasing stay correct across worker threads.
+    The sends holding them only live in memory, though, so the backend
+    calls ``reset`` when it starts.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self.db_path = os.path.join(self.root, '.refs.db')
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    digest TEXT PRIMARY KEY,
+                    refcount INTEGER NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, which serialises
+        # refcount changes and the matching file operations across processes.
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def reset(self) -> int:
+        """Forget every reference and delete every stored file; returns how many were deleted.
+
+        For startup: the queued and scheduled sends that held references
+        were lost with the previous process, so none of them will be released.
+        """
+        removed = 0
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM blobs")
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if _BLOB_DIR.fullmatch(name) and os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+                elif name.startswith('.upload-'):
+                    # Left behind by an upload interrupted mid-stream
+                    os.remove(path)
+        return removed
+
+    def _blob_dir(self, digest: str) -> str:
+        return os.path.join(self.root, digest)
+
+    def store(self, file_obj, references: int) -> Optional[str]:
+        """Save an uploaded file and take ``references`` references on it.
+
+        The upload is streamed to a temporary file while it is hashed, then
+        moved into place. Returns the absolute path of the stored file, or
+        None if no references were requested.
+        """
+        if references <= 0:
+            return None
+
+        filename = secure_filename(file_obj.filename or '') or 'attachment'
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                stream = file_obj.stream
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    tmp.write(chunk)
+
+            hexdigest = digest.hexdigest()
+            blob_dir = self._blob_dir(hexdigest)
+            final_path = os.path.join(blob_dir, filename)
+
+            with self._transaction() as conn:
+                os.makedirs(blob_dir, exist_ok=True)
+                if not os.path.exists(final_path):
+                    existing = [name for name in os.listdir(blob_dir) if not name.startswith('.')]
+                    if existing:
+                        # Same content under a new name: link to the existing copy
+                        try:
+                            os.link(os.path.join(blob_dir, existing[0]), final_path)
+                        except OSError:
+                            os.replace(tmp_path, final_path)
+                    else:
+                        os.replace(tmp_path, final_path)
+                conn.execute("""
+                    INSERT INTO blobs (digest, refcount) VALUES (?, ?)
+                    ON CONFLICT(digest) DO UPDATE SET refcount = refcount + excluded.refcount
+                """, (hexdigest, references))
+
+            return final_path
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def release(self, file_path: Optional[str], references: int = 1) -> None:
+        """Drop references on a stored file, deleting it once none remain."""
+        if not file_path or references <= 0:
+            return
+
+        digest = os.path.basename(os.path.dirname(os.path.abspath(file_path)))
+        with self._transaction() as conn:
+            row = conn.execute("SELECT refcount FROM blobs WHERE digest = ?", (digest,)).fetchone()
+            if row is None:
+                return
+            remaining = row[0] - references
+            if remaining > 0:
+                conn.execute("UPDATE blobs SET refcount = ? WHERE digest = ?", (remaining, digest))
+                return
+            conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+            shutil.rmtree(self._blob_dir(digest), ignore_errors=True)